@@ -1,11 +1,20 @@
 import Aufblaspruefstand_GUI
+import Bildverarbeitung
 import cv2
+import Kalibrierung
+import Kamerakalibrierung
+import Liveplot
 import logging
 import matplotlib.pyplot as plt
+import Messdatenaufzeichnung
 import numpy as np
 import pandas as pd
-import pyqtgraph as pg
+import Pico_Protokoll
+import Ringpuffer
 import serial
+import time
+import Ventilsteuerung
+import Videoaufzeichnung
 from datetime import datetime
 from pathlib import Path
 from PySide6 import QtWidgets, QtGui, QtCore
@@ -16,17 +25,36 @@ from scipy import signal
 
 # TODO:
 # - Code kommentieren
-# - COM-Port und Videoquelle aus values.ini laden
 # - Standard-values.ini anschliessend ins Repo aufnehmen und dann git mitteilen, die Datei nicht mehr zu tracken
 
 
+def videoquelle_oeffnen(quelle):
+    """
+    Oeffnet die Videoquelle aus values.ini:
+    eine Zahl fuer eine Webcam, 'sim' fuer die simulierte Kamera oder den Pfad einer Videodatei (Wiedergabe in Echtzeit).
+    """
+    if str(quelle).isdigit():
+        return cv2.VideoCapture(int(quelle))
+
+    # Erst bei Bedarf importieren (der Simulator wird im Betrieb am Pruefstand nicht gebraucht)
+    from Simulator.Virtuelle_Kamera import Virtuelle_Kamera
+    return Virtuelle_Kamera(quelle)
+
+
 class Worker_Video(QtCore.QObject):
     finished = QtCore.Signal()
-    signal_change_pixmap = QtCore.Signal(object)
 
-    def __init__(self):
+    def __init__(self, quelle, postfach):
         super().__init__()
         self.run_flag = True
+        self.quelle = quelle
+        self.fps = None
+
+        # Postfach, in dem immer nur das neueste Kamerabild fuer die Bildverarbeitung liegt
+        self.postfach = postfach
+
+        # Videoaufzeichnung im Modus 'roh' (wird von der GUI fuer die Dauer einer Messung gesetzt)
+        self.aufzeichnung = None
 
 
     @QtCore.Slot()
@@ -39,16 +67,27 @@ class Worker_Video(QtCore.QObject):
         # Videosignal holen
         # (standardmaessig wird bei einem PC die USB-Webcam die Videoquelle '0' sein.
         #  Bei Laptops mit integrierter Webcam wird die USB-Webcam die Videoquelle '1' sein.
-        cap = cv2.VideoCapture(0)
+        cap = videoquelle_oeffnen(self.quelle)
 
         # set displayed size of the webcam image/video
         cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
         cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
 
+        # Jedes Bild erhaelt eine fortlaufende Nummer und den Zeitpunkt der Aufnahme
+        index = 0
         while self.run_flag:
             ret, cv_img = cap.read()
+            t_aufnahme = time.monotonic()
+            zeitpunkt = time.time()
             if ret:
-                self.signal_change_pixmap.emit(cv_img)
+                kamerabild = Bildverarbeitung.Kamerabild(cv_img, index, t_aufnahme, zeitpunkt)
+                self.postfach.ablegen(kamerabild)
+                index += 1
+
+                aufzeichnung = self.aufzeichnung
+                if aufzeichnung is not None and aufzeichnung.modus == 'roh':
+                    aufzeichnung.aufnehmen(kamerabild)
 
         # Videosignal trennen
         cap.release()
@@ -60,46 +99,177 @@ class Worker_Video(QtCore.QObject):
         self.run_flag = False
 
 
+class Worker_Bildverarbeitung(QtCore.QObject):
+    finished = QtCore.Signal()
+    signal_neues_ergebnis = QtCore.Signal()
+
+    def __init__(self, video_width, video_height, parameter, postfach_bild, postfach_ergebnis, anzeige_fps=30, messmodus='kontur',
+                 kamerakalibrierung=None):
+        super().__init__()
+        self.run_flag = True
+        self.bildverarbeitung = Bildverarbeitung.Bildverarbeitung(video_width, video_height, messmodus, kamerakalibrierung)
+
+        # Das Anzeigebild wird auf die Groesse des image_label verkleinert und hoechstens anzeige_fps mal pro Sekunde
+        # erzeugt (0: jedes Bild), die Bildverarbeitung (Durchmesser) laeuft unabhaengig davon mit voller Aufloesung und Bildrate
+        self.anzeige_groesse = (video_width, video_height)
+        self.dt_anzeige = 1/anzeige_fps if anzeige_fps > 0 else 0
+        self.t_letzte_anzeige = 0
+
+        # Einstellungen der GUI (HSV-Bereich, min. Flaeche, anzuzeigendes Bild).
+        # Die GUI ersetzt das dict bei jeder Aenderung als Ganzes, daher ist keine Sperre notwendig.
+        self.parameter = parameter
+
+        # Es wird immer nur das neueste Kamerabild verarbeitet und das neueste Ergebnis an die GUI gegeben
+        self.postfach_bild = postfach_bild
+        self.postfach_ergebnis = postfach_ergebnis
+
+        # Videoaufzeichnung im Modus 'roi' (wird von der GUI fuer die Dauer einer Messung gesetzt)
+        self.aufzeichnung = None
+
+        # Neuester Durchmesser und Zeitpunkt des zuletzt verarbeiteten Kamerabildes (Lebenszeichen fuer den Watchdog, auch ohne
+        # erkannten Ballon) fuer die Ventilsteuerung (Ringpuffer.Letzter_Wert, werden von der GUI fuer die Dauer einer Messung gesetzt)
+        self.letzter_durchmesser = None
+        self.letztes_bild = None
+
+        # Aufzeichnung des Durchmessers jedes verarbeiteten Kamerabildes (Ringpuffer mit Zeitpunkt, Durchmesser und Zyklus,
+        # Funktion, die den Zyklus liefert), wird von der GUI fuer die Dauer einer Messung gesetzt und per Timer geleert
+        self.durchmesser_aufzeichnung = None
+
+
+    @QtCore.Slot()
+    def Start(self):
+        while self.run_flag:
+            kamerabild = self.postfach_bild.abholen(timeout=0.1)
+            if kamerabild is None:
+                continue
+
+            parameter = self.parameter
+            ergebnis = self.bildverarbeitung.verarbeiten(kamerabild.bild, parameter)
+            ergebnis.index = kamerabild.index
+            ergebnis.t_aufnahme = kamerabild.t_aufnahme
+            ergebnis.zeitpunkt = kamerabild.zeitpunkt
+            ergebnis.t_verarbeitet = time.monotonic()
+
+            aufzeichnung = self.aufzeichnung
+            if aufzeichnung is not None and aufzeichnung.modus == 'roi':
+                aufzeichnung.aufnehmen(kamerabild, ergebnis.fenster)
+
+            # Bei mehreren Konturen den groessten Durchmesser an die Ventilsteuerung geben (sicherer gegen Ueberdehnung)
+            letzter_durchmesser = self.letzter_durchmesser
+            if letzter_durchmesser is not None and ergebnis.durchmesser:
+                letzter_durchmesser.setzen(ergebnis.zeitpunkt, max(ergebnis.durchmesser))
+            letztes_bild = self.letztes_bild
+            if letztes_bild is not None:
+                letztes_bild.setzen(ergebnis.zeitpunkt, len(ergebnis.durchmesser))
+            durchmesser_aufzeichnung = self.durchmesser_aufzeichnung
+            if durchmesser_aufzeichnung is not None and ergebnis.durchmesser:
+                puffer, zyklus_ausgabe = durchmesser_aufzeichnung
+                puffer.schreiben([ergebnis.zeitpunkt], [max(ergebnis.durchmesser)], [zyklus_ausgabe()])
+
+            # Das Anzeigebild nur erzeugen, falls es faellig ist, und in ein QImage konvertieren
+            # (im Gegensatz zu QPixmap ist das ausserhalb des GUI-Threads erlaubt, BGR wird ohne Umwandlung uebernommen)
+            ergebnis.qt_img = None
+            jetzt = time.monotonic()
+            if jetzt - self.t_letzte_anzeige >= self.dt_anzeige:
+                self.t_letzte_anzeige = jetzt
+                ergebnis.anzeige = Bildverarbeitung.anzeigebild_erzeugen(ergebnis, parameter['bild_index'], self.anzeige_groesse)
+                h, w, ch = ergebnis.anzeige.shape
+                bytes_per_line = ch * w
+                ergebnis.qt_img = QtGui.QImage(ergebnis.anzeige.data, w, h, bytes_per_line, QtGui.QImage.Format_BGR888)
+
+            # Die GUI nur benachrichtigen, falls sie das vorherige Ergebnis bereits abgeholt hat,
+            # ansonsten holt sie mit der noch ausstehenden Benachrichtigung direkt das neueste Ergebnis ab
+            if not self.postfach_ergebnis.ablegen(ergebnis):
+                self.signal_neues_ergebnis.emit()
+
+        self.finished.emit()
+
+    def Stop(self):
+        self.run_flag = False
+
+
 class Worker_Druck(QtCore.QObject):
     finished = QtCore.Signal()
-    signal_zeit_druck = QtCore.Signal(object, float)
+    signal_tariert = QtCore.Signal(float)
 
-    def __init__(self, port):
+    def __init__(self, port, kalibrierung, anzahl_tara, puffer, letzter_druck, ventilbefehle):
         super().__init__()
         self.run_flag = True
 
-        # Werte zur Konvertierung des seriellen Signals von Volt in mbar definieren
-        self.v_in = 3.3                   # input voltage in V
-        self.v_0  = self.v_in/10          # voltage at  0psi (10% of v_in)
-        self.v_10 = self.v_in-self.v_0    # voltage at 10psi (90% of v_in)
+        # Ringpuffer (Zeitpunkt in s seit Epoche, Druck in mbar), der von der GUI per Timer geleert wird,
+        # und neuester Druck fuer die Ventilsteuerung
+        self.puffer = puffer
+        self.letzter_druck = letzter_druck
+
+        # Quittungen der Ventilbefehle werden mit den Messwerten empfangen und hier weitergegeben
+        self.ventilbefehle = ventilbefehle
+
+        # Kalibrierung zur Umrechnung der Rohwerte in mbar und Anzahl der Messwerte, ueber die zu Beginn
+        # der Nullpunkt bestimmt wird (0 -> nicht tarieren)
+        self.kalibrierung = kalibrierung
+        self.anzahl_tara = anzahl_tara
+        self.max_tara = 20  # mbar, groessere Nullpunktverschiebungen werden nicht uebernommen
+
+        # Decoder fuer die binaeren Pakete des Pi Pico und Abbildung der Pico-Zeitstempel auf die Uhr des PCs
+        self.decoder = Pico_Protokoll.Paketdecoder()
+        self.uhr = Pico_Protokoll.Uhrsynchronisation()
+        self.logger = logging.getLogger('./')
 
 
     @QtCore.Slot()
     def Start(self):
+        # Bis zur Tarierung werden die Messwerte gesammelt und erst danach (tariert) weitergegeben
+        tariert = (self.anzahl_tara == 0)
+        tara_werte = []
+        tara_zeiten = []
+
         while self.run_flag:
-            # read 16bit serial value, convert to string as UTF-8, rstrip newline-character and ...
-            try:
-                # convert to int
-                sensorVal = int(str(ser.readline(), 'UTF-8').rstrip('\n'))
-            except ValueError:
-                # convert to float
-                sensorVal = float(str(ser.readline(), 'UTF-8').rstrip('\n'))
+            # alle bereits empfangenen Bytes (mind. jedoch ein Paket) lesen und die enthaltenen Pakete entpacken
+            daten = ser.read(max(ser.in_waiting, Pico_Protokoll.PAKET_GROESSE))
+
+            # Zeitpunkt des Empfangs festhalten
+            t_empfang = time.time()
+
+            verlorene_pakete = self.decoder.verlorene_pakete
+            sensorVals, t_pico_us = self.decoder.verarbeiten(daten)
+
+            if self.decoder.verlorene_pakete > verlorene_pakete:
+                self.logger.warning(f'{self.decoder.verlorene_pakete-verlorene_pakete} Druckpaket(e) verloren (insgesamt {self.decoder.verlorene_pakete}).')
+
+            # Zeitpunkt des Schaltens (Pico) auf die Uhr des PCs abbilden, solange die Uhrsynchronisation noch nicht laeuft: NaN
+            for nr, befehl, ventil_offen, t_geschaltet_us in self.decoder.quittungen_abholen():
+                t_geschaltet = self.uhr.host_zeit(t_geschaltet_us/1e6) if self.uhr.versatz is not None else np.nan
+                self.ventilbefehle.quittung(nr, t_geschaltet, t_empfang)
 
-            # Zeitpunkt der Messung festhalten
-            t_druck = datetime.now()
+            if len(sensorVals) == 0:
+                continue
 
-            # convert 16bit integer to Volt
-            voltage = sensorVal*self.v_in/(2**16)
+            # Zeitpunkte der Messung: Zeitstempel des Pico, abgebildet auf die Uhr des PCs
+            t_pico = t_pico_us/1e6
+            self.uhr.beobachtung(t_pico[-1], t_empfang)
+            t_druck = self.uhr.host_zeit(t_pico)
 
-            # convert Volt to psi (0.1*v_in == v_0 == 0psi ; 0.9*v_in == v_10 == 10psi)
-            m = 10/(self.v_10-self.v_0)
-            b = -self.v_0*m
-            p_psi = m*voltage + b
+            # Nullpunkt bestimmen, sobald genuegend Messwerte vorliegen
+            if not tariert:
+                tara_werte.append(sensorVals)
+                tara_zeiten.append(t_druck)
+                sensorVals = np.concatenate(tara_werte)
+                t_druck = np.concatenate(tara_zeiten)
+                if len(sensorVals) < self.anzahl_tara:
+                    continue
 
-            # convert psi to mbar
-            p_mbar = 68.9476*p_psi
+                tara = self.kalibrierung.tarieren(sensorVals[:self.anzahl_tara])
+                if abs(tara) > self.max_tara:
+                    self.logger.warning(f'Nullpunktverschiebung von {tara:.2f} mbar ist unplausibel und wird nicht uebernommen.')
+                    self.kalibrierung.tara = 0.0
+                tariert = True
+                self.signal_tariert.emit(self.kalibrierung.tara)
 
-            self.signal_zeit_druck.emit(t_druck, p_mbar)
+            # Rohwerte blockweise ueber die Kalibrierung in mbar umrechnen
+            p_mbar = self.kalibrierung.umrechnen(sensorVals)
+
+            self.puffer.schreiben(t_druck, p_mbar)
+            self.letzter_druck.setzen(t_druck[-1], p_mbar[-1])
 
         self.finished.emit()
 
@@ -107,6 +277,45 @@ class Worker_Druck(QtCore.QObject):
         self.run_flag = False
 
 
+class Worker_Ventil(QtCore.QObject):
+    finished = QtCore.Signal()
+
+    def __init__(self, ventilsteuerung, ventilbefehle, letzter_druck, letzter_durchmesser, letztes_bild, takt=0.02):
+        super().__init__()
+        self.run_flag = True
+        self.ventilsteuerung = ventilsteuerung
+        self.ventilbefehle = ventilbefehle
+        self.letzter_druck = letzter_druck
+        self.letzter_durchmesser = letzter_durchmesser
+        self.letztes_bild = letztes_bild
+        self.takt = takt   # s
+
+
+    @QtCore.Slot()
+    def Start(self):
+        # Die Steuerung laeuft im festen Takt, unabhaengig von Kamera und GUI
+        t_geplant = time.monotonic()
+        while self.run_flag:
+            verspaetung = time.monotonic() - t_geplant
+            self.ventilsteuerung.schritt(time.time(), self.letzter_druck.lesen(), self.letzter_durchmesser.lesen(), verspaetung,
+                                         self.letztes_bild.lesen())
+            self.ventilbefehle.pruefen(time.time())
+
+            # Verpasste Takte (z.B. System ausgelastet) nicht nachholen
+            t_geplant = max(t_geplant + self.takt, time.monotonic())
+            time.sleep(max(0, t_geplant - time.monotonic()))
+
+        # Magnetventil am Ende der Messung schliessen und kurz auf die Quittung warten (ggf. mit Wiederholung)
+        self.ventilsteuerung.beenden(time.time())
+        t_ende = time.monotonic() + 0.5
+        while self.ventilbefehle.pruefen(time.time()) and time.monotonic() < t_ende:
+            time.sleep(self.takt)
+        self.finished.emit()
+
+    def Stop(self):
+        self.run_flag = False
+
+
 class Logger_QTextEdit(logging.Handler, QtCore.QObject):
     class Emitter(QtCore.QObject):
         signal_appendPlainText = QtCore.Signal(object)
@@ -177,32 +386,74 @@ class DieseApp(QtWidgets.QMainWindow, Aufblaspruefstand_GUI.Ui_MainWindow):
         self.pushButtonMessungBeenden.clicked.connect(self.Messung_beenden)
         self.pushButtonBildWechseln.clicked.connect(self.Bild_wechseln)
         self.pushButtonScreenshot.clicked.connect(self.Screenshot_speichern)
+        for slider in [self.hMinSlider, self.hMaxSlider, self.sMinSlider, self.sMaxSlider, self.vMinSlider, self.vMaxSlider, self.minAreaSlider]:
+            slider.valueChanged.connect(self.Parameter_Bildverarbeitung_aktualisieren)
 
         # Werte Video
+        self.videoquelle = self.settings.value('videoquelle', '0')  # Webcam-Index, 'sim' oder Pfad zu einer Videodatei
         self.video_width = 640
         self.video_height = 480
         self.image_label.resize(self.video_width, self.video_height)
+        self.anzeige_fps = self.settings.value('anzeige_fps', 30, type=int)  # max. Bildrate der Anzeige (nicht der Messung)
+        self.messmodus = self.settings.value('messmodus', 'kontur')  # Bestimmung der Breite, siehe Bildverarbeitung.MESSMODI
+        self.latenzen = Bildverarbeitung.Latenzstatistik()  # Aufnahme -> verarbeitet -> angezeigt je Kamerabild
+        self.videoaufzeichnung = self.settings.value('videoaufzeichnung', 'aus')  # siehe Videoaufzeichnung.MODI
+        self.aufzeichnung = None
+
+        # Druck und Durchmesser werden waehrend der Messung laufend geschrieben (siehe Messdatenaufzeichnung.py)
+        self.messdaten_druck = None
+        self.messdaten_durchmesser = None
+        self.t_letzte_statusmeldung = 0
+
+        # Kalibrierung der Kamera (Verzeichnung) laden (Dateiname in values.ini unter 'kamera' setzen, leer: ohne Korrektur)
+        self.kamera = self.settings.value('kamera', '')
+        self.kamerakalibrierung = None
+        if self.kamera:
+            try:
+                self.kamerakalibrierung = Kamerakalibrierung.Kamerakalibrierung.laden(self.kamera)
+                self.logger.info(f'Kamerakalibrierung fuer {self.kamera} geladen (Rueckprojektionsfehler {self.kamerakalibrierung.rms} Pixel).')
+            except FileNotFoundError:
+                self.logger.warning(f'Keine Kamerakalibrierung fuer {self.kamera} gefunden, die Verzeichnung wird nicht korrigiert.')
         self.thread_video = None
-        self.time_last_diameter_query = datetime.now()
+        self.thread_bild = None
         self.save_img = False  # Flag, ob Screenshot gespeichert werden soll
 
-        # Liste fuer Bilder und Index des anzuzeigenden Bildes (original, gefiltert) initialisieren
-        self.imgs = [None, None]
+        # Index des anzuzeigenden Bildes (original, gefiltert) initialisieren
         self.img_index = 0
 
-        # setup aruco marker
-        self.aruco_params = cv2.aruco.DetectorParameters()
-        self.aruco_dict = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_50)
-
         # Werte Druckmessung
-        self.port = 'COM6'  # serieller Port (Pi Pico)
+        self.port = self.settings.value('port', 'COM6')  # serieller Port (Pi Pico oder Simulator.Virtueller_Pico)
         self.thread_druck = None
-        self.dt_serial = 0.1  # Zeitdifferenz zwischen zwei Eingaengen des Druckmesssignals der seriellen Schnittstelle
-
-        # serielle Schnittstelle verbinden und Magnetventil schliessen
+        self.dauer_tara = 0.5  # Sekunden, ueber die zu Beginn der Messung der Nullpunkt des Drucks bestimmt wird
+        self.dt_gui_druck = 50  # ms, Intervall, in dem die GUI die neuen Druck- und Durchmessermesswerte aus den Ringpuffern abholt
+        self.dt_gui_plot = 100  # ms, Intervall, in dem die Plots neu gezeichnet werden
+
+        # Ventilsteuerung: Takt und Timeout des Watchdogs (Ventil schliessen, falls Druck oder Durchmesser veraltet sind)
+        self.ventil_takt = self.settings.value('ventil_takt', 20, type=int)  # ms
+        self.ventil_timeout = self.settings.value('ventil_timeout', 500, type=int)  # ms
+        # Ventil mit Vorhalt schliessen (Vorhersage des Durchmessers aus dD/dt und der gemessenen Latenz der Ventilbefehle)
+        self.ventil_vorhersage = self.settings.value('ventil_vorhersage', True, type=bool)
+        self.thread_ventil = None
+
+        # Kalibrierung des Druckmessumformers laden (Dateiname in values.ini unter 'drucksensor' setzen)
+        drucksensor = self.settings.value('drucksensor', 'Standard')
+        try:
+            self.kalibrierung = Kalibrierung.Druckkalibrierung.laden(drucksensor)
+            self.logger.info(f'Kalibrierung fuer Drucksensor {drucksensor} geladen.')
+        except FileNotFoundError:
+            self.kalibrierung = Kalibrierung.Druckkalibrierung.standard()
+            if drucksensor != 'Standard':
+                self.logger.warning(f'Keine Kalibrierung fuer Drucksensor {drucksensor} gefunden, verwende Standardkalibrierung.')
+
+        # Abtastrate (Messwerte pro Sekunde) und Dezimierung (gemittelte ADC-Wandlungen je Messwert) des Pi Pico
+        self.abtastrate = self.settings.value('abtastrate', 100, type=int)
+        self.dezimierung = self.settings.value('dezimierung', 16, type=int)
+
+        # serielle Schnittstelle verbinden, Magnetventil schliessen und Abtastung konfigurieren
         global ser
         ser = serial.Serial(self.port, 9600)
         ser.write(b'c')
+        ser.write(f'r{self.abtastrate}\nd{self.dezimierung}\n'.encode())
 
         # GraphicsLayoutWidget fuer Plot in der GUI
         label_styles = {'color':'r', 'font-size':'12pt'}
@@ -215,12 +466,20 @@ class DieseApp(QtWidgets.QMainWindow, Aufblaspruefstand_GUI.Ui_MainWindow):
         self.plotitem_p_over_t.setLabel('left', 'Druck / mbar', **label_styles)
         self.plotitem_d_over_t.setLabel('left', 'Durchmesser / mm', **label_styles)
         self.plotitem_d_over_t.setLabel('bottom', 'Versuchslaufzeit / s', **label_styles)
-        self.scatterplotitem_p_over_t = pg.ScatterPlotItem(size=10, brush=pg.mkBrush(0, 86, 148, 120))
-        self.scatterplotitem_d_over_t = pg.ScatterPlotItem(size=10, brush=pg.mkBrush(0, 86, 148, 120))
-        self.plotitem_p_over_t.addItem(self.scatterplotitem_p_over_t)
-        self.plotitem_d_over_t.addItem(self.scatterplotitem_d_over_t)
-        self.plotdataitem_p_over_t = self.plotitem_p_over_t.plot()
-        self.plotdataitem_d_over_t = self.plotitem_d_over_t.plot()
+        # Kurven mit Min/Max-Dezimierung, damit das Zeichnen auch bei langen Messungen gleich schnell bleibt (siehe Liveplot.py)
+        self.liveplot_p_over_t = Liveplot.Liveplot(self.plotitem_p_over_t)
+        self.liveplot_d_over_t = Liveplot.Liveplot(self.plotitem_d_over_t)
+
+        # Timer, der die Druckmesswerte in festem Takt aus dem Ringpuffer abholt
+        self.timer_druck = QtCore.QTimer(self)
+        self.timer_druck.setInterval(self.dt_gui_druck)
+        self.timer_druck.timeout.connect(self.Druckpuffer_leeren)
+        self.timer_druck.timeout.connect(self.Durchmesserpuffer_leeren)
+
+        # Timer, der die Plots gesammelt in festem Takt neu zeichnet (nicht bei jedem neuen Messwert)
+        self.timer_plot = QtCore.QTimer(self)
+        self.timer_plot.setInterval(self.dt_gui_plot)
+        self.timer_plot.timeout.connect(self.Plots_zeichnen)
 
         # Interaktion mit der GUI aktivieren
         self.interaktion_aktivieren()
@@ -266,6 +525,10 @@ class DieseApp(QtWidgets.QMainWindow, Aufblaspruefstand_GUI.Ui_MainWindow):
         self.logger.info(f'S = [{self.sMinSlider.value()}, {self.sMaxSlider.value()}]')
         self.logger.info(f'V = [{self.vMinSlider.value()}, {self.vMaxSlider.value()}]')
         self.logger.info(f'min. Area = {self.minAreaSlider.value()}')
+        self.logger.info(f'Abtastrate Druck = {self.abtastrate} Hz (Dezimierung {self.dezimierung})')
+        self.logger.info(f'Messmodus Durchmesser = {self.messmodus}')
+        self.logger.info(f'Drucksensor = {self.kalibrierung.sensor}')
+        self.logger.info(f'Videoaufzeichnung = {self.videoaufzeichnung}')
 
         # Durchmesserwerte loggen
         tmp_str = ''
@@ -274,47 +537,85 @@ class DieseApp(QtWidgets.QMainWindow, Aufblaspruefstand_GUI.Ui_MainWindow):
         tmp_str = tmp_str.rstrip(', ')
         self.logger.info(f'Durchmesserzyklen: [{tmp_str}]')
 
-        # Werte fuer automatisches Oeffnen/Schliessen des Magnetventils initialisieren
-        self.aufblasen = True
-        self.entlueften_beendet = False
-        self.zyklus = 0
-        self.zeit_ende_entlueften = datetime.now()
-        self.verzoegerung_aufblasen = 2  # Sekunden
-        self.diameter_written = False
+        self.logger.info(f'Ventilsteuerung: Takt {self.ventil_takt} ms, Timeout Watchdog {self.ventil_timeout} ms, '
+                         f'Vorhersage {"ein" if self.ventil_vorhersage else "aus"}')
 
-        # Magnetventil oeffnen
-        ser.write(b'o')
+        # Messreihen fuer Druck und Durchmesser mit Zyklus (spaltenweise numpy-Arrays, Zeitpunkte in ns seit Epoche)
+        self.t_start_ns = int(Ringpuffer.zeitpunkte_ns(self.time_start.timestamp()))
+        self.messreihe_druck = Ringpuffer.Messreihe({'zeitpunkt': np.int64, 'druck': np.float32}, kapazitaet=60*self.abtastrate)
+        self.messreihe_durchmesser = Ringpuffer.Messreihe({'zeitpunkt': np.int64, 'durchmesser': np.float32, 'zyklus': np.int32})
 
-        # initialize lists for time, pressure, diameter and cycle
-        self.time_pressure = []
-        self.time_diameter = []
-        self.pressure = []
-        self.diameter = []
-        self.cycle = []
+        # Ringpuffer fuer die Druckmessung (Platz fuer 10 Minuten Messwerte, falls die GUI ins Stocken geraet)
+        self.puffer_druck = Ringpuffer.Ringpuffer(600*self.abtastrate)
+        self.verworfen_druck = 0
+
+        # Ringpuffer fuer den Durchmesser jedes verarbeiteten Kamerabildes (Zeitpunkt, Durchmesser, Zyklus; 10 Minuten bei 120 fps)
+        self.puffer_durchmesser = Ringpuffer.Ringpuffer(600*120, spalten=3)
+        self.verworfen_durchmesser = 0
+
+        # Neuester Druck, Durchmesser und zuletzt verarbeitetes Kamerabild fuer die Ventilsteuerung, die das Magnetventil
+        # automatisch oeffnet und schliesst
+        letzter_druck = Ringpuffer.Letzter_Wert()
+        letzter_durchmesser = Ringpuffer.Letzter_Wert()
+        letztes_bild = Ringpuffer.Letzter_Wert()
+        self.ventilbefehle = Ventilsteuerung.Ventilbefehle(ser.write)
+        self.ventilsteuerung = Ventilsteuerung.Ventilsteuerung(self.zyklen_durchmesser, self.ventilbefehle.senden, timeout=self.ventil_timeout/1000,
+                                                               vorhersage=self.ventil_vorhersage, aktorlatenz=self.ventilbefehle.latenz)
 
         # Worker und Thread initialisieren (jeweils ohne 'parent', Quelle: https://stackoverflow.com/a/33453124)
-        self.worker_druck = Worker_Druck(self.port)
+        self.worker_druck = Worker_Druck(self.port, self.kalibrierung, int(self.dauer_tara*self.abtastrate), self.puffer_druck, letzter_druck,
+                                         self.ventilbefehle)
         self.thread_druck = QtCore.QThread()
+        self.worker_ventil = Worker_Ventil(self.ventilsteuerung, self.ventilbefehle, letzter_druck, letzter_durchmesser, letztes_bild,
+                                           self.ventil_takt/1000)
+        self.thread_ventil = QtCore.QThread()
 
         # Worker dem Thread hinzufuegen
         self.worker_druck.moveToThread(self.thread_druck)
+        self.worker_ventil.moveToThread(self.thread_ventil)
 
         # Signale von Workern und Threads mit Slots (Funktionen) verknuepfen
         self.worker_druck.finished.connect(self.thread_druck.quit)   # Wenn Worker das Signal 'finished' sendet, wird der Thread beendet
         self.worker_druck.finished.connect(lambda: self.logger.info('Worker finished'))
-        self.worker_druck.signal_zeit_druck.connect(lambda t_druck, p_mbar: self.update_lists_and_plot_p_over_t(t_druck, p_mbar))
+        self.worker_druck.signal_tariert.connect(self.Nullpunkt_tariert)
         self.thread_druck.started.connect(self.worker_druck.Start)  # Wenn Thread gestartet wird, wird im Worker die Funktion 'Start' ausgefuehrt
         self.thread_druck.finished.connect(self.Thread_druck_deaktivieren)   # Wenn Thread beendet ist, wird die Funktion 'Thread_druck_deaktivieren' ausgefuehrt
+        self.worker_ventil.finished.connect(self.thread_ventil.quit)
+        self.thread_ventil.started.connect(self.worker_ventil.Start)
+        self.thread_ventil.finished.connect(self.Thread_ventil_deaktivieren)
 
         # Plotdaten der Auswertung leeren
-        self.scatterplotitem_p_over_t.clear()
-        self.scatterplotitem_d_over_t.clear()
+        self.liveplot_p_over_t.leeren()
+        self.liveplot_d_over_t.leeren()
+
+        # Latenzen der Bildverarbeitung waehrend der Messung aufzeichnen
+        self.latenzen.starten()
+
+        # Messwerte waehrend der Messung laufend schreiben (eigene Threads, nach einem Abbruch wiederherstellbar)
+        self.messdaten_druck = Messdatenaufzeichnung.Messdatenaufzeichnung(self.outdir+'Druck.npy', Messdatenaufzeichnung.DTYPE_DRUCK)
+        self.messdaten_durchmesser = Messdatenaufzeichnung.Messdatenaufzeichnung(self.outdir+'Durchmesser.npy',
+                                                                               Messdatenaufzeichnung.DTYPE_DURCHMESSER, blockgroesse=100)
+
+        # Kamerabilder waehrend der Messung aufzeichnen (eigener Thread, siehe Videoaufzeichnung.py)
+        if self.videoaufzeichnung != 'aus':
+            self.aufzeichnung = Videoaufzeichnung.Videoaufzeichnung(self.outdir, self.videoaufzeichnung, self.worker_video.fps or 30)
+            self.worker_video.aufzeichnung = self.aufzeichnung
+            self.worker_bild.aufzeichnung = self.aufzeichnung
+
+        # Zaehler der Postfaecher merken, um am Ende die waehrend der Messung verworfenen Bilder auszugeben
+        self.postfach_zaehler_start = (self.postfach_bild.abgelegt, self.postfach_bild.ueberschrieben, self.postfach_ergebnis.ueberschrieben)
 
         # Interaktion mit der GUI deaktivieren
         self.interaktion_deaktivieren()
 
-        # Thread starten
+        # Threads und Timer starten (das Magnetventil oeffnet die Ventilsteuerung erst nach der Nullpunktbestimmung)
+        self.worker_bild.letzter_durchmesser = letzter_durchmesser
+        self.worker_bild.letztes_bild = letztes_bild
+        self.worker_bild.durchmesser_aufzeichnung = (self.puffer_durchmesser, self.ventilsteuerung.zyklus_ausgabe)
+        self.thread_ventil.start()
         self.thread_druck.start()
+        self.timer_druck.start()
+        self.timer_plot.start()
 
 
     def Messung_beenden(self):
@@ -324,22 +625,110 @@ class DieseApp(QtWidgets.QMainWindow, Aufblaspruefstand_GUI.Ui_MainWindow):
             if reply == QtWidgets.QMessageBox.No:
                 return
 
+        # Zuerst die Ventilsteuerung beenden (schliesst das Magnetventil), damit der Watchdog nicht auf die endende Messung reagiert
+        # (auf das Ende warten, damit auch diese Entscheidung in Ventil.txt steht)
+        self.worker_ventil.Stop()
+        self.thread_ventil.quit()
+        self.thread_ventil.wait(1000)
+        self.worker_bild.letzter_durchmesser = None
+        self.worker_bild.letztes_bild = None
+        self.worker_bild.durchmesser_aufzeichnung = None
+        # Stop() setzt nur ein Flag: auf das Ende des Threads warten, damit die letzten Messwerte im Puffer liegen
         self.worker_druck.Stop()
-
-        # Pandas DataFrames anlegen und speichern
+        if self.thread_druck is not None:
+            self.thread_druck.quit()
+            if not self.thread_druck.wait(2000):
+                self.logger.warning('Druckmessung nicht rechtzeitig beendet')
+
+        # Timer anhalten, die restlichen Druck- und Durchmessermesswerte abholen und ein letztes Mal zeichnen
+        self.timer_druck.stop()
+        self.timer_plot.stop()
+        self.Druckpuffer_leeren()
+        self.Durchmesserpuffer_leeren()
+        self.Plots_zeichnen()
+        # Videoaufzeichnung beenden (die noch wartenden Bilder werden geschrieben)
+        if self.aufzeichnung is not None:
+            self.worker_video.aufzeichnung = None
+            self.worker_bild.aufzeichnung = None
+            self.aufzeichnung.beenden()
+            if self.aufzeichnung.fehler_oeffnen:
+                self.logger.error(f'Videoaufzeichnung: {self.aufzeichnung.outfile_video} konnte nicht geoeffnet werden, '
+                                  f'{self.aufzeichnung.nicht_geschrieben} Bilder nicht gespeichert')
+            self.logger.info(f'Videoaufzeichnung: {self.aufzeichnung.geschrieben} Bilder in {self.aufzeichnung.outfile_video} gespeichert, '
+                             f'{self.aufzeichnung.verworfen} verworfen (Festplatte zu langsam)')
+            self.aufzeichnung = None
+
+        self.logger.info(f'Druckmesswerte: {self.puffer_druck.erzeugt} erzeugt, {self.puffer_druck.verbraucht} verarbeitet, '
+                         f'{self.puffer_druck.verworfen} verworfen')
+        bilder = self.postfach_bild.abgelegt - self.postfach_zaehler_start[0]
+        bilder_verworfen = self.postfach_bild.ueberschrieben - self.postfach_zaehler_start[1]
+        ergebnisse_verworfen = self.postfach_ergebnis.ueberschrieben - self.postfach_zaehler_start[2]
+        self.logger.info(f'Kamerabilder: {bilder} aufgenommen, {bilder_verworfen} nicht verarbeitet (Bildverarbeitung zu langsam), '
+                         f'{ergebnisse_verworfen} verarbeitet, aber nicht angezeigt')
+        if self.kamerakalibrierung is not None and not self.worker_bild.bildverarbeitung.entzerrung_aktiv:
+            self.logger.warning(f'Kamerakalibrierung {self.kamera} nicht angewendet, da sie fuer eine andere Bildgroesse '
+                                f'({self.kamerakalibrierung.bildgroesse[0]}x{self.kamerakalibrierung.bildgroesse[1]}) erstellt wurde.')
+        self.latenzen.beenden()
+        self.logger.info(f'Latenzen der Bildverarbeitung: {self.latenzen.zusammenfassung()}')
+        massstab = self.worker_bild.bildverarbeitung.massstab
+        if massstab.pixel_mm_ratio is not None:
+            self.logger.info(f'Massstab: {massstab.pixel_mm_ratio:.4f} Pixel/mm (Konfidenz {massstab.konfidenz:.2f}), '
+                             f'{massstab.erkennungen} Markersuchen, davon {massstab.bewegungen} wegen Bewegung im Bild')
+        self.logger.info(f'Ventilsteuerung: {len(self.ventilsteuerung.protokoll)} Entscheidungen in {self.ventilsteuerung.schritte} Takten '
+                         f'(max. Verspaetung {self.ventilsteuerung.verspaetung_max*1000:.1f} ms), Watchdog {self.ventilsteuerung.watchdog_ausloesungen}x ausgeloest')
+        self.logger.info(f'Latenz Ventilbefehle (Entscheidung bis Schalten): {self.ventilbefehle.histogramm()}')
+        self.logger.info(f'Ventilsteuerung: {self.ventilsteuerung.zusammenfassung()}')
+        self.logger.info(f'Uhrsynchronisation Pi Pico: Drift {self.worker_druck.uhr.drift*1e6:.1f} ppm, '
+                         f'verlorene Druckpakete: {self.worker_druck.decoder.verlorene_pakete}')
+
+        # Laufende Aufzeichnung der Messwerte abschliessen, Druck.txt und Durchmesser.txt werden im Hintergrund erzeugt
+        # (waehrenddessen wird die Messung ausgewertet, gewartet wird erst am Ende)
         outfile_druck = self.outdir + 'Druck.txt'
-        self.df_druck = pd.DataFrame({'Zeitpunkt Messung': self.time_pressure, 'Druck / mbar': self.pressure})
-        self.df_druck.to_csv(outfile_druck, sep=';', encoding='utf-8', index=False, header=True)
-        self.logger.info(f'Speichere aufgezeichnete Druckmessung in {outfile_druck} ab.')
-
         outfile_durchmesser = self.outdir + 'Durchmesser.txt'
-        self.df_durchmesser = pd.DataFrame({'Zeitpunkt Messung': self.time_diameter, 'Durchmesser / mm': self.diameter, 'Zyklus': self.cycle})
-        self.df_durchmesser.to_csv(outfile_durchmesser, sep=';', encoding='utf-8', index=False, header=True)
-        self.logger.info(f'Speichere aufgezeichnete Durchmessermessung in {outfile_durchmesser} ab.')
+        self.messdaten_druck.beenden(outfile_druck)
+        self.messdaten_durchmesser.beenden(outfile_durchmesser)
+
+        # Pandas DataFrames fuer die Auswertung anlegen (Zeitpunkte wie in den Dateien in lokaler Zeit)
+        self.df_druck = pd.DataFrame({'Zeitpunkt Messung': Ringpuffer.lokalzeit(self.messreihe_druck['zeitpunkt']),
+                                      'Druck / mbar': self.messreihe_druck['druck']})
+        self.df_durchmesser = pd.DataFrame({'Zeitpunkt Messung': Ringpuffer.lokalzeit(self.messreihe_durchmesser['zeitpunkt']),
+                                            'Durchmesser / mm': self.messreihe_durchmesser['durchmesser'],
+                                            'Zyklus': self.messreihe_durchmesser['zyklus']})
+        self.logger.info(f'Messreihen: {len(self.messreihe_druck)} Druck- und {len(self.messreihe_durchmesser)} Durchmessermesswerte, '
+                         f'{(self.messreihe_druck.nbytes + self.messreihe_durchmesser.nbytes)/2**20:.1f} MiB')
+
+        outfile_ventil = self.outdir + 'Ventil.txt'
+        df_ventil = pd.DataFrame(list(self.ventilsteuerung.protokoll), columns=Ventilsteuerung.PROTOKOLL_SPALTEN)
+        df_ventil['Zeitpunkt'] = [datetime.fromtimestamp(t) for t in df_ventil['Zeitpunkt']]
+        df_ventil.to_csv(outfile_ventil, sep=';', encoding='utf-8', index=False, header=True)
+        self.logger.info(f'Speichere Entscheidungen der Ventilsteuerung in {outfile_ventil} ab.')
+
+        outfile_befehle = self.outdir + 'Ventilbefehle.txt'
+        df_befehle = pd.DataFrame(self.ventilbefehle.spalten(), columns=Ventilsteuerung.BEFEHL_SPALTEN)
+        df_befehle['Zeitpunkt Entscheidung'] = [datetime.fromtimestamp(t) for t in df_befehle['Zeitpunkt Entscheidung']]
+        df_befehle[['Latenz geschaltet / ms', 'Latenz quittiert / ms']] *= 1000
+        df_befehle.to_csv(outfile_befehle, sep=';', encoding='utf-8', index=False, header=True)
+        self.logger.info(f'Speichere Latenzen der Ventilbefehle in {outfile_befehle} ab.')
+
+        outfile_latenz = self.outdir + 'Latenz.txt'
+        index, zeitpunkt, latenz_verarbeitet, latenz_angezeigt = self.latenzen.spalten()
+        df_latenz = pd.DataFrame({'Bildnummer': index.astype(int), 'Zeitpunkt Aufnahme': [datetime.fromtimestamp(t) for t in zeitpunkt],
+                                  'Latenz verarbeitet / ms': latenz_verarbeitet, 'Latenz angezeigt / ms': latenz_angezeigt})
+        df_latenz.to_csv(outfile_latenz, sep=';', encoding='utf-8', index=False, header=True)
+        self.logger.info(f'Speichere Latenzen der Bildverarbeitung in {outfile_latenz} ab.')
 
         # Messung auswerten
         self.Messung_auswerten()
 
+        for messdaten, outfile in ((self.messdaten_druck, outfile_druck), (self.messdaten_durchmesser, outfile_durchmesser)):
+            messdaten.warten()
+            if messdaten.fehler:
+                self.logger.error(f'Messdatenaufzeichnung: {outfile} unvollstaendig, siehe {messdaten.datei}')
+            else:
+                self.logger.info(f'Speichere {messdaten.geschrieben} Messwerte in {outfile} ab ({messdaten.bloecke} Bloecke in {messdaten.datei}).')
+        self.messdaten_druck = None
+        self.messdaten_durchmesser = None
+
         # Interaktion mit der GUI aktivieren
         self.interaktion_aktivieren()
 
@@ -354,7 +743,11 @@ class DieseApp(QtWidgets.QMainWindow, Aufblaspruefstand_GUI.Ui_MainWindow):
     def Messung_auswerten(self):
         # Hier werden die Messungen zeitlich verknuepft, und zwar immer die zeitlich nahe liegendsten Druck- und Durchmessermessungen.
         # Es werden die Zeitstempel des erst genannten DataFrames beibehalten (hier: self.df_druck).
-        df_merged = pd.merge_asof(self.df_druck, self.df_durchmesser, on='Zeitpunkt Messung', direction='nearest')
+        # Die Zeitstempel der Druckmessung stammen vom Pi Pico (Zeitpunkt der Aufnahme) und koennen sich durch die
+        # laufende Uhrsynchronisation zwischen zwei Bloecken minimal ueberschneiden, daher wird vorher sortiert.
+        df_druck = self.df_druck.sort_values('Zeitpunkt Messung', ignore_index=True)
+        df_durchmesser = self.df_durchmesser.sort_values('Zeitpunkt Messung', ignore_index=True)
+        df_merged = pd.merge_asof(df_druck, df_durchmesser, on='Zeitpunkt Messung', direction='nearest')
 
         # Von allen Zeitstempeln wird der erste Zeitstempel abgezogen, um die Versuchslaufzeit zu berechnen.
         # Anschliessend wird die Versuchslaufzeit in Sekunden umgewandelt.
@@ -366,9 +759,10 @@ class DieseApp(QtWidgets.QMainWindow, Aufblaspruefstand_GUI.Ui_MainWindow):
         durchmesser = df_merged['Durchmesser / mm'].to_numpy()
 
         # Butterworth-Filter anwenden, um Druck- und Durchmessermessung zu glaetten
+        # (die Zeilen von df_merged folgen den Druckmessungen, also der fest eingestellten Abtastrate des Pi Pico)
         bw_ord = 3
         bw_fc = 0.15
-        b, a = signal.butter(bw_ord, bw_fc, 'low', analog=False, fs=10)
+        b, a = signal.butter(bw_ord, bw_fc, 'low', analog=False, fs=self.abtastrate)
         w, h = signal.freqs(b, a)
         druck_gefiltert = signal.filtfilt(b, a, druck)
         durchmesser_gefiltert = signal.filtfilt(b, a, durchmesser)
@@ -379,6 +773,8 @@ class DieseApp(QtWidgets.QMainWindow, Aufblaspruefstand_GUI.Ui_MainWindow):
         outfile_auswertung_txt = self.outdir + 'Auswertung.txt'
         df_merged.to_csv(outfile_auswertung_txt, sep=';', encoding='utf-8', index=False, header=True)
         self.logger.info(f'Speichere Daten der Auswertung in {outfile_auswertung_txt} ab.')
+        # Zusaetzlich binaer fuer die Auswertungsskripte (siehe Messdatenaufzeichnung.laden)
+        Messdatenaufzeichnung.tabelle_speichern(df_merged, self.outdir + 'Auswertung.npy')
 
         blue = '#1f77b4'
         orange = '#ff7f0e'
@@ -414,177 +810,149 @@ class DieseApp(QtWidgets.QMainWindow, Aufblaspruefstand_GUI.Ui_MainWindow):
             self.logger.error(f'Plot der Auswertung (fuer Infomonitor) konnte nicht gespeichert werden:\n{e}')
 
 
+    def Nullpunkt_tariert(self, tara):
+        # Das Magnetventil oeffnet die Ventilsteuerung mit dem ersten tarierten Druckwert
+        self.logger.info(f'Nullpunkt Druck tariert: {tara:.2f} mbar')
+
+
     def Screenshot_speichern(self):
         # Flag, ob Screenshot des naechsten Webcam-Bildes gespeichert werden soll
         self.save_img = True
 
 
-    def update_lists_and_plot_p_over_t(self, t_druck, p_mbar):
-        # Plot aktualisieren
-        dt = (t_druck - self.time_start).total_seconds()
-        self.scatterplotitem_p_over_t.addPoints(x=[dt], y=[p_mbar])
+    def Druckpuffer_leeren(self):
+        # Alle seit dem letzten Aufruf erzeugten Druckmesswerte auf einmal abholen
+        t_druck, p_mbar = self.puffer_druck.lesen()
+
+        # Verworfene Messwerte melden (passiert nur, wenn die GUI laenger nicht reagiert hat)
+        if self.puffer_druck.verworfen > self.verworfen_druck:
+            self.logger.warning(f'{self.puffer_druck.verworfen-self.verworfen_druck} Druckmesswerte verworfen (Ringpuffer voll).')
+            self.verworfen_druck = self.puffer_druck.verworfen
+
+        if len(t_druck) > 0:
+            self.update_lists_and_plot_p_over_t(Ringpuffer.zeitpunkte_ns(t_druck), p_mbar)
+
+
+    def update_lists_and_plot_p_over_t(self, t_ns, p_mbar):
+        # Plot aktualisieren (t_ns und p_mbar enthalten jeweils einen ganzen Block von Messwerten)
+        dt = (t_ns - self.t_start_ns) / 1e9
+        self.liveplot_p_over_t.anhaengen(dt, p_mbar)
 
-        # Werte zum spaeteren Herausschreiben sichern
-        self.time_pressure.append(t_druck)
-        self.pressure.append(p_mbar)
+        # Werte fuer die Auswertung sichern und laufend schreiben
+        self.messreihe_druck.anhaengen(zeitpunkt=t_ns, druck=p_mbar)
+        self.messdaten_druck.anhaengen(Ringpuffer.lokalzeit(t_ns), p_mbar)
 
 
-    def update_plot_d_over_t(self, dt, d):
-        self.scatterplotitem_d_over_t.addPoints(x=[dt], y=[d])
+    def Durchmesserpuffer_leeren(self):
+        # Alle seit dem letzten Aufruf gemessenen Durchmesser (einer je verarbeitetem Kamerabild) auf einmal abholen
+        t_durchmesser, durchmesser, zyklus = self.puffer_durchmesser.lesen()
+
+        if self.puffer_durchmesser.verworfen > self.verworfen_durchmesser:
+            self.logger.warning(f'{self.puffer_durchmesser.verworfen-self.verworfen_durchmesser} Durchmessermesswerte verworfen (Ringpuffer voll).')
+            self.verworfen_durchmesser = self.puffer_durchmesser.verworfen
+
+        if len(t_durchmesser) > 0:
+            self.update_lists_and_plot_d_over_t(Ringpuffer.zeitpunkte_ns(t_durchmesser), durchmesser, zyklus.astype(np.int32))
+
+
+    def update_lists_and_plot_d_over_t(self, t_ns, durchmesser, zyklus):
+        # Plot aktualisieren (Zeitpunkt ist die Aufnahme des Kamerabildes, nicht dessen Auswertung)
+        dt = (t_ns - self.t_start_ns) / 1e9
+        self.liveplot_d_over_t.anhaengen(dt, durchmesser)
+
+        # Werte fuer die Auswertung sichern und laufend schreiben, Zyklus von der Ventilsteuerung
+        # (-1 zwischen Ende des Entlueftens und dem naechsten Aufblasen --> hilfreich fuer spaetere Auswertung)
+        self.messreihe_durchmesser.anhaengen(zeitpunkt=t_ns, durchmesser=durchmesser, zyklus=zyklus)
+        self.messdaten_durchmesser.anhaengen(Ringpuffer.lokalzeit(t_ns), durchmesser, zyklus)
+
+
+    def Plots_zeichnen(self):
+        self.liveplot_p_over_t.zeichnen()
+        self.liveplot_d_over_t.zeichnen()
 
 
     def Thread_druck_deaktivieren(self):
         self.thread_druck = None
 
 
+    def Thread_ventil_deaktivieren(self):
+        self.thread_ventil = None
+
+
     def Bild_wechseln(self):
         if self.img_index == 0:
             self.img_index = 1
         elif self.img_index == 1:
             self.img_index = 0
 
+        self.Parameter_Bildverarbeitung_aktualisieren()
+
+
+    def Parameter_Bildverarbeitung(self):
+        return {'hsv_min': [self.hMinSlider.value(), self.sMinSlider.value(), self.vMinSlider.value()],
+                'hsv_max': [self.hMaxSlider.value(), self.sMaxSlider.value(), self.vMaxSlider.value()],
+                'min_area': self.minAreaSlider.value(),
+                'bild_index': self.img_index}
+
+
+    def Parameter_Bildverarbeitung_aktualisieren(self):
+        # Die Einstellungen werden als neues dict an den Worker uebergeben (siehe Worker_Bildverarbeitung)
+        if self.thread_bild is not None:
+            self.worker_bild.parameter = self.Parameter_Bildverarbeitung()
+
 
     def Video_starten(self):
-        # Worker und Thread initialisieren (jeweils ohne 'parent', Quelle: https://stackoverflow.com/a/33453124)
-        self.worker_video = Worker_Video()
+        # Worker und Threads initialisieren (jeweils ohne 'parent', Quelle: https://stackoverflow.com/a/33453124)
+        # Die Kamerabilder werden in einem eigenen Thread verarbeitet, die GUI zeigt nur noch das Ergebnis an.
+        # Zwischen den Threads wird jeweils nur das neueste Bild bzw. Ergebnis weitergegeben (Postfach mit einem Platz),
+        # sodass sich bei einer langsamen Verarbeitung keine Bilder aufstauen.
+        self.postfach_bild = Ringpuffer.Postfach()
+        self.postfach_ergebnis = Ringpuffer.Postfach()
+        self.worker_video = Worker_Video(self.videoquelle, self.postfach_bild)
         self.thread_video = QtCore.QThread()
+        self.worker_bild = Worker_Bildverarbeitung(self.video_width, self.video_height, self.Parameter_Bildverarbeitung(),
+                                                   self.postfach_bild, self.postfach_ergebnis, self.anzeige_fps, self.messmodus,
+                                                   self.kamerakalibrierung)
+        self.thread_bild = QtCore.QThread()
 
         # Worker dem Thread hinzufuegen
         self.worker_video.moveToThread(self.thread_video)
+        self.worker_bild.moveToThread(self.thread_bild)
 
         # Signale von Workern und Threads mit Slots (Funktionen) verknuepfen
         self.worker_video.finished.connect(self.thread_video.quit)   # Wenn Worker das Signal 'finished' sendet, wird der Thread beendet
         self.worker_video.finished.connect(lambda: self.logger.info('Worker finished'))
-        self.worker_video.signal_change_pixmap.connect(lambda cv_img: self.update_image(cv_img))
+        self.worker_bild.finished.connect(self.thread_bild.quit)
+        self.worker_bild.signal_neues_ergebnis.connect(self.update_image)
+        self.thread_bild.started.connect(self.worker_bild.Start)
         self.thread_video.started.connect(self.worker_video.Start)  # Wenn Thread gestartet wird, wird im Worker die Funktion 'Start' ausgefuehrt
         self.thread_video.started.connect(lambda: self.logger.info('Video gestartet.'))
         self.thread_video.finished.connect(self.Thread_video_deaktivieren)   # Wenn Thread beendet ist, wird die Funktion 'Thread_video_deaktivieren' ausgefuehrt
 
-        # Thread starten
+        # Threads starten
+        self.thread_bild.start()
         self.thread_video.start()
 
 
-    def update_image(self, cv_img):
-        self.imgs[0] = cv2.cvtColor(cv_img, cv2.COLOR_BGR2RGB)
-        cv_img_hsv = cv2.cvtColor(cv_img, cv2.COLOR_BGR2HSV)
-
-        hsv_min = np.array([self.hMinSlider.value(), self.sMinSlider.value(), self.vMinSlider.value()])
-        hsv_max = np.array([self.hMaxSlider.value(), self.sMaxSlider.value(), self.vMaxSlider.value()])
-
-        color_mask = cv2.inRange(cv_img_hsv, hsv_min, hsv_max)
-        self.imgs[1] = cv2.bitwise_and(self.imgs[0], self.imgs[0], mask=color_mask)
-
-        # detect aruco markers in current webcam image
-        corners, ids, _ = cv2.aruco.detectMarkers(self.imgs[0], self.aruco_dict, parameters=self.aruco_params)
+    def update_image(self):
+        """
+        Zeigt das im Worker_Bildverarbeitung verarbeitete Bild an und wertet den gemessenen Durchmesser aus.
+        """
+        ergebnis = self.postfach_ergebnis.abholen()
+        if ergebnis is None:
+            return
 
-        # draw polygon around aruco markers
-        int_corners = np.intp(corners)
-        cv2.polylines(self.imgs[self.img_index], int_corners, True, (0, 255, 0), 2)
+        # Das bereits im Worker erzeugte QImage anzeigen (nur falls die Anzeige faellig war)
+        t_angezeigt = None
+        if ergebnis.qt_img is not None:
+            self.image_label.setPixmap(QtGui.QPixmap.fromImage(ergebnis.qt_img))
+            t_angezeigt = time.monotonic()
 
-        try:
-            # calculate the length of the polygon around the first detected aruco marker
-            aruco_perimeter = cv2.arcLength(corners[0], True)  # in pixels
-
-            # translate pixels to mm
-            # (since the aruco marker is a square of side length 50mm, the length of the surrounding polygon must be 200mm)
-            pixel_mm_ratio = aruco_perimeter / 200
-
-            # calculate center of polygon and widths of aruco marker and display a text
-            x, y = corners[0][0].mean(axis=0)
-            s1, s2 = self.calc_aruco_widths(corners[0][0])
-            cv2.putText(self.imgs[self.img_index], f'ID: {ids[0][0]}', (int(x), int(y)), cv2.FONT_HERSHEY_PLAIN, 1, (0, 255, 0), 1)
-            cv2.putText(self.imgs[self.img_index], f'[pixel] {s1:.2f} x {s2:.2f}', (int(x), int(y)-30), cv2.FONT_HERSHEY_PLAIN, 1, (0, 255, 0), 1)
-            cv2.putText(self.imgs[self.img_index], f'[mm] {s1/pixel_mm_ratio:.2f} x {s2/pixel_mm_ratio:.2f}', (int(x), int(y)-15), cv2.FONT_HERSHEY_PLAIN, 1, (0, 255, 0), 1)
-
-        # if currently no aruco marker is detected in the webcam image, corners[0] will throw an IndexError
-        except IndexError:
-            # Warnung anzeigen, dass aktuell kein Aruco-Marker detektiert wurde
-            cv2.putText(self.imgs[self.img_index], 'Kein Aruco-Marker gefunden!', (int(self.video_width/10), int(self.video_height/2)), cv2.FONT_HERSHEY_PLAIN, 2, (255, 0, 0), 3)
-
-        # detect contours, conversion to grayscale is necessary for findContours
-        img_gray = cv2.cvtColor(self.imgs[1], cv2.COLOR_BGR2GRAY)
-        contours, _ = cv2.findContours(img_gray, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        for c in contours:
-            area = cv2.contourArea(c)
-            if area >= self.minAreaSlider.value():
-                rect = cv2.minAreaRect(c)
-                (x, y), (w, h), angle = rect
-                box = cv2.boxPoints(rect)
-                box = np.intp(box)
-                cv2.polylines(self.imgs[self.img_index], [box], True, (255, 0, 0), 2)
-                cv2.putText(self.imgs[self.img_index], f'[pixel] width: {w:.1f}, height: {h:.1f}', (int(x), int(y)+15), cv2.FONT_HERSHEY_PLAIN, 1, (255, 0, 0), 1)
-                try:
-                    durchmesser = w/pixel_mm_ratio
-                    cv2.putText(self.imgs[self.img_index], f'[mm] width: {durchmesser:.2f}, height: {h/pixel_mm_ratio:.2f}', (int(x), int(y)+30), cv2.FONT_HERSHEY_PLAIN, 1, (255, 0, 0), 1)
-
-                    # Vorsicht: Das Originalbild sollte mit HSV so eingestellt sein, dass nur EINE Box (naemlich um den Luftballon) gezeichnet wird.
-                    # Sonst werden naemlich die Weiten mehrerer Objekte geplottet!
-                    if self.messung_aktiv:
-
-                        # Der Durchmesser soll im gleichen Takt gemessen werden, wie der Druck, also alle self.dt_serial Sekunden
-                        now = datetime.now()
-                        if (now-self.time_last_diameter_query).total_seconds() >= self.dt_serial:
-                            # Plot aktualisieren
-                            dt = (now - self.time_start).total_seconds()
-                            self.update_plot_d_over_t(dt, durchmesser)
-
-                            # Werte zum spaeteren Herausschreiben sichern
-                            self.time_diameter.append(now)
-                            self.diameter.append(durchmesser)
-
-                            self.time_last_diameter_query = datetime.now()
-
-                            # Flag speichern, ob akt. Durchmesser herausgeschrieben wurde,
-                            # um weiter unten auch den Zyklus herausschreiben zu koennen
-                            self.diameter_written = True
-                        else:
-                            self.diameter_written = False
-
-                        # Feststellen, ob Magnetventil geoeffnet/geschlossen werden soll
-                        # Falls Durchmesser beim Aufblasen 4x hintereinander ueber den Solldurchmesser des akt. Zyklus anwaechst, Magnetventil schliessen --> entlueften
-                        if (self.aufblasen and all([x >= self.zyklen_durchmesser[self.zyklus] for x in self.diameter[-4:]])):
-                            ser.write(b'c')
-                            self.aufblasen = False
-                            self.entlueften_beendet = False
-                        # Falls Druck beim Entlueften unter 5 mbar faellt, Magnetventil oeffnen --> aufblasen
-                        elif (not(self.aufblasen) and (self.pressure[-1] < 5)):
-                            # Den Zeitpunkt des erstmaligen Betretens der Bedingung (<5 mbar) festhalten
-                            if (not self.entlueften_beendet):
-                                self.zeit_ende_entlueften = now
-                                self.entlueften_beendet = True
-
-                            # Erst nach der Verzoegerungszeit wieder erneut aufblasen,
-                            # aber nur, falls die geforderten Zyklen noch nicht alle durchlaufen wurden
-                            if (((now-self.zeit_ende_entlueften).total_seconds() >= self.verzoegerung_aufblasen) and (self.zyklus < len(self.zyklen_durchmesser)-1)):
-                                ser.write(b'o')
-                                self.aufblasen = True
-                                self.zyklus += 1
-
-                        # Falls der Durchmesser herausgeschrieben wurde, auch den akt. Zyklus herausschreiben
-                        if self.diameter_written:
-                            # Falls Aufblas- bzw. Entlueftungszyklus aktiv, speichere Zykluszahl,
-                            # ansonsten schreibe -1 --> hilfreich fuer spaetere Auswertung
-                            # Falls Aufblaszyklus aktiv
-                            if self.aufblasen:
-                                self.cycle.append(self.zyklus)
-                            else:
-                                # Falls Entlueftungszyklus aktiv, aber noch nicht beendet
-                                if (self.aufblasen == self.entlueften_beendet):
-                                    self.cycle.append(self.zyklus)
-                                else:
-                                    self.cycle.append(-1)
-
-                except UnboundLocalError:
-                    # if pixel_mm_ratio is not present, pass
-                    pass
-
-        # Das Bild in ein QImage konvertieren
-        h, w, ch = self.imgs[self.img_index].shape
-        bytes_per_line = ch * w
-        qt_img = QtGui.QImage(self.imgs[self.img_index].data, w, h, bytes_per_line, QtGui.QImage.Format_RGB888)
-        #qt_img = qt_img.scaled(self.video_width, self.video_height, QtCore.Qt.KeepAspectRatio)
-        self.image_label.setPixmap(QtGui.QPixmap.fromImage(qt_img))
+        # Latenzen erfassen und einmal pro Sekunde in der Statusleiste anzeigen
+        self.latenzen.hinzufuegen(ergebnis, t_angezeigt)
+        if t_angezeigt is not None and t_angezeigt - self.t_letzte_statusmeldung >= 1:
+            self.statusbar.showMessage(f'Latenz {self.latenzen.zusammenfassung(self.latenzen.fenster)}')
+            self.t_letzte_statusmeldung = t_angezeigt
 
         # Das Bild abspeichern
         if self.save_img:
@@ -592,25 +960,16 @@ class DieseApp(QtWidgets.QMainWindow, Aufblaspruefstand_GUI.Ui_MainWindow):
             Path('./Screenshots/').mkdir(exist_ok=True)
 
             outfile_img = f'./Screenshots/Screenshot_{datetime.now().strftime("%Y_%m_%d__%H_%M_%S")}.png'
-            cv2.imwrite(outfile_img, cv2.cvtColor(self.imgs[self.img_index], cv2.COLOR_RGB2BGR))  # Anmerkung: Bild muss als BGR (nicht RGB) vorliegen
+            cv2.imwrite(outfile_img, Bildverarbeitung.anzeigebild_erzeugen(ergebnis, self.img_index))  # volle Aufloesung, BGR
             self.logger.info(f'Speichere Screenshot unter {outfile_img} ab.')
 
             # Flag zuruecksetzen
             self.save_img = False
 
 
-    def calc_aruco_widths(self, c):
-        x0, y0 = c[0]
-        x1, y1 = c[1]
-        x2, y2 = c[2]
-        x3, y3 = c[3]
-        wx = 0.5*np.sqrt( (x0+x3-x1-x2)**2 + (y0+y3-y1-y2)**2 )
-        wy = 0.5*np.sqrt( (x0+x1-x2-x3)**2 + (y0+y1-y2-y3)**2 )
-        return wx, wy
-
-
     def Thread_video_deaktivieren(self):
         self.thread_video = None
+        self.thread_bild = None
 
 
     def interaktion_aktivieren(self):
@@ -670,9 +1029,22 @@ class DieseApp(QtWidgets.QMainWindow, Aufblaspruefstand_GUI.Ui_MainWindow):
         # Feststellen, ob ein Thread aktiv ist
         if self.thread_video is not None and self.thread_video.isRunning():
             self.worker_video.Stop()
+            self.worker_bild.Stop()
             #self.thread_video.requestInterruption()    # Dieser Request muss im Worker explizit verarbeitet werden
         if self.thread_druck is not None and self.thread_druck.isRunning():
             self.thread_druck.requestInterruption()
+        if self.thread_ventil is not None and self.thread_ventil.isRunning():
+            # Auf das Ende warten, bevor weiter unten die serielle Schnittstelle geschlossen wird
+            self.worker_ventil.Stop()
+            self.thread_ventil.quit()
+            self.thread_ventil.wait(1000)
+
+        # Bei laufender Messung die bisherigen Messwerte noch schreiben (Druck.txt und Durchmesser.txt lassen sich dann
+        # mit Messdatenaufzeichnung.py erzeugen)
+        for messdaten in (self.messdaten_druck, self.messdaten_durchmesser):
+            if messdaten is not None:
+                messdaten.beenden()
+                messdaten.warten(5)
 
         # TODO: AskYesNo, ob eingestellte Werte beim Beenden gespeichert werden sollen
         self.settings.setValue('h_min', self.hMinSlider.value())
@@ -682,6 +1054,17 @@ class DieseApp(QtWidgets.QMainWindow, Aufblaspruefstand_GUI.Ui_MainWindow):
         self.settings.setValue('v_min', self.vMinSlider.value())
         self.settings.setValue('v_max', self.vMaxSlider.value())
         self.settings.setValue('area_min', self.minAreaSlider.value())
+        self.settings.setValue('port', self.port)
+        self.settings.setValue('videoquelle', self.videoquelle)
+        self.settings.setValue('anzeige_fps', self.anzeige_fps)
+        self.settings.setValue('messmodus', self.messmodus)
+        self.settings.setValue('kamera', self.kamera)
+        self.settings.setValue('videoaufzeichnung', self.videoaufzeichnung)
+        self.settings.setValue('abtastrate', self.abtastrate)
+        self.settings.setValue('dezimierung', self.dezimierung)
+        self.settings.setValue('ventil_takt', self.ventil_takt)
+        self.settings.setValue('ventil_timeout', self.ventil_timeout)
+        self.settings.setValue('ventil_vorhersage', self.ventil_vorhersage)
 
         # serielle Schnittstelle schliessen
         ser.close()
@@ -2,28 +2,28 @@ import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
 from scipy import signal
+import Messdatenaufzeichnung
 
 
 data_dir = './Messungen/2023_03_17__11_12_12/'   # '/' AM ENDE!
 
-# Daten einlesen.
-# Wichtig: Die Spalten in beiden Dateien, die den Zeitstempel der Messungen enthalten, muessen gleich heissen!
-# Damit die Zeitstempel richtig erkannt werden, wird die entsprechende Spalte mit parse_dates bearbeitet.
-df_druck = pd.read_csv(data_dir+'Druck.txt', sep=';', decimal='.', header=0, parse_dates=['Zeitpunkt Messung'])
-df_durchmesser = pd.read_csv(data_dir+'Durchmesser.txt', sep=';', decimal=',', header=0, parse_dates=['Zeitpunkt Messung'])
+# Daten einlesen (als .npy ohne Kopie, siehe Messdatenaufzeichnung.laden; zu Druck.txt bzw. Durchmesser.txt wird die .npy
+# beim ersten Oeffnen erzeugt). Die Zeitstempel liegen bereits als datetime64 vor und muessen nicht mehr geparst werden.
+messung_druck = Messdatenaufzeichnung.laden(data_dir+'Druck.txt')
+messung_durchmesser = Messdatenaufzeichnung.laden(data_dir+'Durchmesser.txt')
 
-# Da die Durchmesser ggf. vom dtype "object" sind, werden hier vorsichtshalber beide Spalten in float umgewandelt.
-df_druck['Druck / mbar'] = df_druck['Druck / mbar'].astype(float)
-df_durchmesser['Durchmesser / mm'] = df_durchmesser['Durchmesser / mm'].astype(float)
+# Wichtig: Die Spalten in beiden DataFrames, die den Zeitstempel der Messungen enthalten, muessen gleich heissen!
+df_druck = pd.DataFrame({'Zeitpunkt Messung': messung_druck['zeitpunkt'], 'Druck / mbar': messung_druck['druck']})
+df_durchmesser = pd.DataFrame({'Zeitpunkt Messung': messung_durchmesser['zeitpunkt'],
+                               'Durchmesser / mm': messung_durchmesser['durchmesser']})
 
 print(df_druck)
 print(df_durchmesser)
 
-print(df_druck.dtypes)
-print(df_durchmesser.dtypes)
-
 # Hier werden die Messungen zeitlich verknuepft, und zwar immer die zeitlich nahe liegendsten Druck- und Durchmessermessungen.
 # Es werden die Zeitstempel des erst genannten DataFrames beibehalten (hier: df_druck).
+df_druck = df_druck.sort_values('Zeitpunkt Messung', ignore_index=True)
+df_durchmesser = df_durchmesser.sort_values('Zeitpunkt Messung', ignore_index=True)
 df_merged = pd.merge_asof(df_druck, df_durchmesser, on='Zeitpunkt Messung', direction='nearest')
 print(df_merged)
 
@@ -37,10 +37,13 @@ zeit = df_merged['Versuchslaufzeit / s'].to_numpy()
 druck = df_merged['Druck / mbar'].to_numpy()
 durchmesser = df_merged['Durchmesser / mm'].to_numpy()
 
+# Abtastfrequenz aus dem mittleren Abstand der Druckmessungen bestimmen
+fs = 1/np.median(np.diff(zeit))
+
 # Butterworth-Filter anwenden, um Druck- und Durchmessermessung zu glaetten
 bw_ord = 3
 bw_fc = 0.15
-b, a = signal.butter(bw_ord, bw_fc, 'low', analog=False, fs=5)
+b, a = signal.butter(bw_ord, bw_fc, 'low', analog=False, fs=fs)
 w, h = signal.freqs(b, a)
 druck_gefiltert = signal.filtfilt(b, a, druck)
 durchmesser_gefiltert = signal.filtfilt(b, a, durchmesser)
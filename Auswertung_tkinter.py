@@ -5,7 +5,9 @@ from matplotlib.backend_bases import key_press_handler
 import matplotlib.pyplot as plt
 import pandas as pd
 import tkinter as tk
+from pathlib import Path
 from scipy import signal
+import Messdatenaufzeichnung
 
 
 class Application:
@@ -16,30 +18,22 @@ class Application:
         self.win.geometry('1700x1200')
         self.win.protocol('WM_DELETE_WINDOW', self.destructor)
 
-        # Read data
-        self.infile = tk.filedialog.askopenfilename(title='Auswertung.txt öffnen', initialdir='./')
-        df = pd.read_csv(self.infile, sep=';', decimal='.', header=0)
-
-        # Save data in separate lists
-        self.time_orig = df['Versuchslaufzeit / s'].to_list()
-        self.pressure_orig = df['Druck / mbar'].to_list()
-        self.diameter_orig = df['Durchmesser / mm'].to_list()
-        if 'Zyklus' in df:
-            self.cycle_orig = df['Zyklus'].to_list()
+        # Read data (Auswertung.txt oder Auswertung.npy, die Daten werden ohne Kopie aus der .npy gelesen,
+        # siehe Messdatenaufzeichnung.laden)
+        self.infile = tk.filedialog.askopenfilename(title='Auswertung.txt öffnen', initialdir='./',
+                                                    filetypes=[('Auswertung', '*.txt *.npy'), ('Alle Dateien', '*')])
+        daten = Messdatenaufzeichnung.laden(self.infile)
+
+        # Spalten als Ansichten auf die Datei
+        self.time_orig = daten['versuchslaufzeit']
+        self.pressure_orig = daten['druck']
+        self.diameter_orig = daten['durchmesser']
+        if 'zyklus' in daten.dtype.names:
+            self.cycle_orig = daten['zyklus']
         else:
             self.cycle_orig = None
 
-        # Kopien der Daten anlegen, in denen die Ausreisser entfernt werden sollen.
-        # .copy() ist notwendig, da sonst die Originallisten bearbeitet werden
-        self.time = self.time_orig.copy()
-        self.pressure_raw = self.pressure_orig.copy()
-        self.diameter_raw = self.diameter_orig.copy()
-        if self.cycle_orig:
-            self.cycle_raw = self.cycle_orig.copy()
-        else:
-            self.cycle_raw = None
-
-        # Daten zu Durchmesser-Ausreissern entfernen
+        # Daten ohne die Durchmesser-Ausreisser (nur diese werden kopiert)
         self.ausreisser_entfernen()
 
         # Define axis labels
@@ -63,12 +57,8 @@ class Application:
         self.rahmen1.pack(side='left', fill=tk.X, expand=True)
 
         # Indices of cycle starts with different load amplitudes -> different coloring
-        if self.cycle_raw:
-            self.start_cycles = [0]
-            for i in range(1, len(self.cycle_raw)):
-                if (self.cycle_raw[i] != self.cycle_raw[i-1]):
-                    self.start_cycles.append(i)
-
+        if self.cycle_raw is not None:
+            self.start_cycles = [0] + (np.flatnonzero(np.diff(self.cycle_raw)) + 1).tolist()
             self.start_cycles.append(len(self.cycle_raw))
         else:
             self.start_cycles = [0, len(self.time)]  # min. [0, len(self.time)]
@@ -76,11 +66,11 @@ class Application:
         # create sliders for butterworth filter
         self.bw_ord_init = 3
         self.bw_fc_init = 0.12  # < sampling_freq/2 (!)
-        self.bw_fs_init = 10  # Hz, sampling frequency
+        self.bw_fs_init = max(1, round(1/np.median(np.diff(self.time_orig))))  # Hz, sampling frequency (aus den Messdaten)
         self.bw_fs = tk.IntVar()
         self.bw_ord = tk.IntVar()
         self.bw_fc = tk.DoubleVar()
-        self.slider_bw_fs = tk.Scale(self.rahmen1, label='sampl. freq', orient='horizontal', from_=1, to=20, resolution=1, variable=self.bw_fs, command=lambda x: self.update_plot())
+        self.slider_bw_fs = tk.Scale(self.rahmen1, label='sampl. freq', orient='horizontal', from_=1, to=max(20, 2*self.bw_fs_init), resolution=1, variable=self.bw_fs, command=lambda x: self.update_plot())
         self.slider_bw_ord = tk.Scale(self.rahmen1, label='bw_ord', orient='horizontal', from_=1, to=6, resolution=1, variable=self.bw_ord, command=lambda x: self.update_plot())
         self.slider_bw_fc = tk.Scale(self.rahmen1, label='bw_fc', orient='horizontal', from_=0.02, to=self.bw_fs_init/2-0.02, resolution=0.02, variable=self.bw_fc, command=lambda x: self.update_plot())
         self.slider_bw_fs.set(self.bw_fs_init)
@@ -226,7 +216,7 @@ class Application:
         # filtered/smoothed data, colored per load amplitude
         for i in range(len(self.start_cycles)-1):
             # "-1"-cycles will be white, all other cycles will have a different color
-            if self.cycle_raw:
+            if self.cycle_raw is not None:
                 tmp_cycle = self.cycle_raw[self.start_cycles[i]]
                 if tmp_cycle != -1:
                     color = self.colors[tmp_cycle+1]  # +1, weil Liste mit Farben mit tab:blue beginnt, was bereits fuer die ungefilterte Kurve benutzt wird
@@ -286,45 +276,57 @@ class Application:
         In den Daten tauchten bislang maximal zwei Ausreisser hintereinander auf.
         Der Code sollte allerdings auch bei mehreren aufeinanderfolgenden Ausreissern funktionieren.
         """
+        d = self.diameter_orig
+
+        # Vergleich jedes Wertes mit dem Mittelwert seiner beiden linken Nachbarn fuer alle Werte auf einmal (direkt auf der
+        # Ansicht der Datei, ohne Kopie in Python-Floats): Ist der rechte Wert mehr als 3% groesser, ist er ein Ausreisser.
+        # Nur als Ausreisser markieren, falls Durchmesser ueber Schwellwert liegt.
+        # (dies soll False-Positives -hauptsaechlich zu Beginn der Messung- beheben)
+        # (ein niedriger Schwellwert sollte unkritisch sein, da Ausreisser aufgrund der staerkeren Reflektionen erst bei groesseren Durchmesser auftauchen)
+        verdaechtig = np.zeros(len(d), dtype=bool)
+        verdaechtig[2:] = (d[2:] / ((d[:-2] + d[1:-1]) / 2) - 1 > 0.03) & (d[1:-1] >= 70)
+
+        # Direkt nach einem Ausreisser muss statt mit den direkten Nachbarn mit den naechsten Werten links davon verglichen
+        # werden, die keine Ausreisser sind. Nur diese wenigen Stellen werden einzeln nachgerechnet.
         ausreisser_indices = []
-
-        # Liste mit Durchmessern vom zweiten bis zum vorletzten Eintrag durchlaufen
-        # und dabei immer einen Wert "nach links" und einen Wert "nach rechts" anschauen.
-        for i in range(1, len(self.diameter_raw)-1):
-
-            ind_mid   = i
-            ind_right = i+1
-
-            # Falls aktueller Index in Liste mit zu loeschenden Indizes ist (Ausreisser),
-            # nach dem naechsten Index nach links suchen, der kein Ausreisser ist
-            while ind_mid in ausreisser_indices:
+        ausreisser = set()
+        kandidaten = np.flatnonzero(verdaechtig)
+        i_rechts = 2
+        while i_rechts < len(d):
+            if i_rechts-1 not in ausreisser and i_rechts-2 not in ausreisser:
+                # Keine Ausreisser unter den linken Nachbarn: das Ergebnis des Vergleichs oben gilt bis zum naechsten Kandidaten
+                k = np.searchsorted(kandidaten, i_rechts)
+                if k == len(kandidaten):
+                    break
+                i_rechts = int(kandidaten[k])
+                ausreisser_indices.append(i_rechts)
+                ausreisser.add(i_rechts)
+                i_rechts += 1
+                continue
+
+            ind_mid = i_rechts-1
+            while ind_mid in ausreisser:
                 ind_mid -= 1
-
-            # Falls linker Index in Liste mit zu loeschenden Indizes ist (Ausreisser),
-            # nach dem naechsten Index nach links suchen, der kein Ausreisser ist
             ind_left = ind_mid-1
-            while ind_left in ausreisser_indices:
+            while ind_left in ausreisser:
                 ind_left -= 1
+            if d[i_rechts] / ((d[ind_left] + d[ind_mid]) / 2) - 1 > 0.03 and d[ind_mid] >= 70:
+                ausreisser_indices.append(i_rechts)
+                ausreisser.add(i_rechts)
+            i_rechts += 1
+
+        # Ausreisser ueber eine Maske entfernen (dabei entstehen Kopien der Originaldaten, ohne Ausreisser bleiben es Ansichten)
+        maske = slice(None)
+        if ausreisser_indices:
+            maske = np.ones(len(d), dtype=bool)
+            maske[ausreisser_indices] = False
+        self.time = self.time_orig[maske]
+        self.pressure_raw = self.pressure_orig[maske]
+        self.diameter_raw = self.diameter_orig[maske]
+        self.cycle_raw = self.cycle_orig[maske] if self.cycle_orig is not None else None
 
-            # Feststellen, ob der rechte Index mehr als 3% groesser als der Mittelwert des
-            # linken und mittleren (aktuellen) Wertes ist
-            if (-1 + self.diameter_raw[ind_right]/np.mean([self.diameter_raw[ind_left], self.diameter_raw[ind_mid]]) > 0.03):
-                # Nur als Ausreisser markieren, falls Durchmesser ueber Schwellwert liegt.
-                # (dies soll False-Positives -hauptsaechlich zu Beginn der Messung- beheben)
-                # (ein niedriger Schwellwert sollte unkritisch sein, da Ausreisser aufgrund der staerkeren Reflektionen erst bei groesseren Durchmesser auftauchen)
-                if self.diameter_raw[ind_mid] >= 70:
-                    ausreisser_indices.append(ind_right)
-
-        # Ausreisser in absteigender Reihenfolge aus der Liste loeschen,
-        # da sonst die Indizes verschoben und falsche Werte geloescht werden wuerden
         print('Die folgenden Indizes (Werte in der Mitte) wurden als Ausreisser detektiert und geloescht:')
         for i in reversed(ausreisser_indices):
-            del self.diameter_raw[i]
-            del self.pressure_raw[i]
-            if self.cycle_raw:
-                del self.cycle_raw[i]
-            del self.time[i]
-
             try:
                 print(f'Index {i-1},{i},{i+1}: {self.diameter_orig[i-1]:.2f}, {self.diameter_orig[i]:.2f}, {self.diameter_orig[i+1]:.2f}')
             except IndexError:
@@ -332,13 +334,13 @@ class Application:
 
 
     def save_plot_and_data(self):
-        outfile_pdf = self.infile.replace('.txt', f'__ohneAusreisser__bw_ord_{self.slider_bw_ord.get()}__bw_fc_{self.slider_bw_fc.get():.2f}__bw_fs_{self.slider_bw_fs.get()}.pdf')
+        outfile_pdf = str(Path(self.infile).with_suffix('')) + f'__ohneAusreisser__bw_ord_{self.slider_bw_ord.get()}__bw_fc_{self.slider_bw_fc.get():.2f}__bw_fs_{self.slider_bw_fs.get()}.pdf'
         plt.savefig(outfile_pdf, format='pdf', bbox_inches='tight')
         print(f'Speichere Plot unter {outfile_pdf} ab.')
 
         # Daten zum Plot speichern
         outfile_txt = outfile_pdf.replace('.pdf', '.txt')
-        if self.cycle_raw:
+        if self.cycle_raw is not None:
             df_neu = pd.DataFrame({'Druck / mbar': self.pressure_raw,
                                 'Durchmesser / mm': self.diameter_raw,
                                 'Zyklus': self.cycle_raw,
@@ -352,6 +354,7 @@ class Application:
                                 'Druck (geglaettet) / mbar': self.pressure_filtered,
                                 'Durchmesser (geglaettet) / mm': self.diameter_filtered})
         df_neu.to_csv(outfile_txt, sep=';', encoding='utf-8', index=False, header=True)
+        Messdatenaufzeichnung.tabelle_speichern(df_neu, outfile_txt.replace('.txt', '.npy'))
         print(f'Speichere Daten der Auswertung in {outfile_txt} ab.')
         tk.messagebox.showinfo(title='Output', message=f'Speichere Daten der Auswertung in {outfile_txt} ab.')
 
@@ -0,0 +1,98 @@
+"""
+Vergleich der Messmodi der Bildverarbeitung (Bildverarbeitung.MESSMODI) an aufgezeichneten Bildern:
+Rechenzeit je Bild und Wiederholgenauigkeit der gemessenen Breite in Pixeln.
+
+Die Bilder werden vorab eingelesen, sodass beide Modi dieselben Bilder verarbeiten und das Dekodieren nicht mitgemessen wird.
+Die Wiederholgenauigkeit wird aus den Differenzen aufeinanderfolgender Bilder bestimmt (std/sqrt(2)),
+setzt also voraus, dass sich der Ballon von Bild zu Bild nur wenig aendert.
+
+Aufruf (aus dem Hauptordner des Repos):
+    python Benchmark_Durchmesser.py ./Messungen/.../Video.mp4 [--bilder 300] [--ohne-roi]
+    python Benchmark_Durchmesser.py sim --rauschen 6
+Die HSV-Grenzen und die min. Flaeche werden aus der values.ini der App gelesen, falls vorhanden.
+"""
+
+import argparse
+import configparser
+import time
+import cv2
+import numpy as np
+import Bildverarbeitung
+
+
+def parameter_laden(datei):
+    """
+    Einstellungen der Schieberegler aus der values.ini (QSettings, Abschnitt 'General'), sonst Werte fuer den Simulator.
+    """
+    parameter = {'hsv_min': [35, 50, 50], 'hsv_max': [85, 255, 255], 'min_area': 500, 'bild_index': 0}
+    ini = configparser.ConfigParser()
+    if ini.read(datei) and 'General' in ini:
+        werte = ini['General']
+        try:
+            parameter['hsv_min'] = [int(werte['h_min']), int(werte['s_min']), int(werte['v_min'])]
+            parameter['hsv_max'] = [int(werte['h_max']), int(werte['s_max']), int(werte['v_max'])]
+            parameter['min_area'] = int(werte['area_min'])
+        except KeyError:
+            pass
+    return parameter
+
+
+def bilder_laden(quelle, anzahl, rauschen):
+    if quelle == 'sim':
+        from Simulator.Virtuelle_Kamera import Virtuelle_Kamera
+        cap = Virtuelle_Kamera('sim', fps=0)
+    else:
+        cap = cv2.VideoCapture(quelle)
+
+    rng = np.random.default_rng(0)
+    bilder = []
+    while len(bilder) < anzahl:
+        ret, img = cap.read()
+        if not ret:
+            break
+        if rauschen > 0:
+            img = np.clip(img + rng.normal(0, rauschen, img.shape), 0, 255).astype(np.uint8)
+        bilder.append(img)
+    cap.release()
+    return bilder
+
+
+def messen(bilder, parameter, messmodus, ohne_roi):
+    bildverarbeitung = Bildverarbeitung.Bildverarbeitung(messmodus=messmodus)
+    zeiten = []
+    breiten = []
+    for img in bilder:
+        if ohne_roi:
+            bildverarbeitung.roi_tracker.zuruecksetzen()
+        t0 = time.perf_counter()
+        ergebnis = bildverarbeitung.verarbeiten(img, parameter)
+        zeiten.append(time.perf_counter() - t0)
+        breiten.append(ergebnis.breiten[0] if len(ergebnis.breiten) == 1 else np.nan)
+    return np.array(zeiten)*1000, np.array(breiten)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Vergleich der Messmodi der Bildverarbeitung (Rechenzeit, Wiederholgenauigkeit).')
+    parser.add_argument('quelle', help="Videodatei oder 'sim' (Simulator.Virtuelle_Kamera)")
+    parser.add_argument('--bilder', type=int, default=300, help='Anzahl der Bilder')
+    parser.add_argument('--rauschen', type=float, default=0, help='zusaetzliches Bildrauschen (Standardabweichung in Grauwerten)')
+    parser.add_argument('--ohne-roi', action='store_true', help='in jedem Bild im ganzen Bild suchen (ohne ROI_Tracker)')
+    parser.add_argument('--values', default='./values.ini', help='values.ini mit den Einstellungen der Schieberegler')
+    args = parser.parse_args()
+
+    parameter = parameter_laden(args.values)
+    bilder = bilder_laden(args.quelle, args.bilder, args.rauschen)
+    print(f'{len(bilder)} Bilder ({bilder[0].shape[1]}x{bilder[0].shape[0]}), HSV {parameter["hsv_min"]} - {parameter["hsv_max"]}, '
+          f'min. Flaeche {parameter["min_area"]}' + (', ohne ROI' if args.ohne_roi else ''))
+
+    print(f'{"Modus":8s} {"t Mittel":>9s} {"t Median":>9s} {"t 95%":>9s} {"Breite":>9s} {"Wiederh.":>9s} {"Ausfaelle":>9s}')
+    for messmodus in Bildverarbeitung.MESSMODI:
+        zeiten, breiten = messen(bilder, parameter, messmodus, args.ohne_roi)
+        gueltig = breiten[~np.isnan(breiten)]
+        wiederholgenauigkeit = np.std(np.diff(gueltig))/np.sqrt(2) if len(gueltig) > 2 else np.nan
+        print(f'{messmodus:8s} {zeiten.mean():7.2f}ms {np.median(zeiten):7.2f}ms {np.percentile(zeiten, 95):7.2f}ms '
+              f'{np.mean(gueltig):7.2f}px {wiederholgenauigkeit:7.3f}px {len(breiten)-len(gueltig):9d}')
+
+
+if __name__ == '__main__':
+    main()
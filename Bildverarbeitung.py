@@ -0,0 +1,590 @@
+"""
+Bildverarbeitung des Aufblaspruefstands: Farbfilterung (HSV), Erkennung des Aruco-Markers (Massstab)
+und Bestimmung des Ballondurchmessers.
+
+Die Verarbeitung laeuft im Worker_Bildverarbeitung (eigener Thread) und liefert je Kamerabild ein Ergebnis,
+das die GUI nur noch anzeigen und auswerten muss.
+"""
+
+import time
+import cv2
+import numpy as np
+
+
+# Verfahren zur Bestimmung der Breite des Ballons:
+# 'kontur': Breite des minAreaRect der Kontur in voller Aufloesung (ganze Pixel)
+# 'kanten': Suche des Ballons in einer verkleinerten Bildpyramide, anschliessend Messung der linken und rechten Kante
+#           entlang einiger Bildzeilen in voller Aufloesung mit Subpixel-Genauigkeit
+MESSMODI = ('kontur', 'kanten')
+
+# Farben der Markierungen (BGR, wie das Kamerabild)
+GRUEN = (0, 255, 0)
+ROT = (0, 0, 255)
+GELB = (0, 255, 255)
+
+
+class Kamerabild:
+    """
+    Kamerabild (BGR) mit fortlaufender Bildnummer und dem Zeitpunkt der Aufnahme (im Worker_Video direkt nach dem Einlesen).
+    """
+
+    def __init__(self, bild, index, t_aufnahme, zeitpunkt):
+        self.bild = bild
+        self.index = index
+        self.t_aufnahme = t_aufnahme   # time.monotonic(), fuer die Latenzen
+        self.zeitpunkt = zeitpunkt     # time.time() zum selben Zeitpunkt, fuer die Zuordnung zu den Druckmesswerten
+
+
+class Ergebnis:
+    """
+    Ergebnis der Verarbeitung eines Kamerabildes.
+    """
+
+    def __init__(self):
+        self.index = None              # Bildnummer, Zeitpunkte der Aufnahme (siehe Kamerabild) und Ende der Verarbeitung
+        self.t_aufnahme = None
+        self.zeitpunkt = None
+        self.t_verarbeitet = None
+        self.rohbild = None            # verarbeitetes Kamerabild (BGR, keine Kopie)
+        self.maske = None              # Farbmaske innerhalb des Suchfensters (im Modus 'kanten' verkleinert)
+        self.fenster = None            # Suchfenster (x0, y0, x1, y1)
+        self.anzeige = None            # verkleinertes Anzeigebild (BGR) inkl. Markierungen, nur falls es angezeigt wird
+        self.durchmesser = []          # Breiten (mm) aller Konturen >= min. Flaeche, nur falls ein Massstab vorliegt
+        self.breiten = []              # Breiten (Pixel) aller Konturen >= min. Flaeche
+        self.boxen = []                # minAreaRect aller Konturen >= min. Flaeche: ((x, y), (w, h), angle)
+        self.pixel_mm_ratio = None     # Massstab aus dem Aruco-Marker (Pixel je mm)
+        self.marker = None             # (Ecken, ID) des ersten erkannten Aruco-Markers
+        self.konfidenz = 0.0           # Vertrauen in den Massstab (0..1)
+        self.overlay = []              # Markierungen fuer das Anzeigebild (Koordinaten im Kamerabild)
+
+
+def calc_aruco_widths(c):
+    x0, y0 = c[0]
+    x1, y1 = c[1]
+    x2, y2 = c[2]
+    x3, y3 = c[3]
+    wx = 0.5*np.sqrt( (x0+x3-x1-x2)**2 + (y0+y3-y1-y2)**2 )
+    wy = 0.5*np.sqrt( (x0+x1-x2-x3)**2 + (y0+y1-y2-y3)**2 )
+    return wx, wy
+
+
+def overlay_zeichnen(img, overlay, faktor=1.0):
+    """
+    Zeichnet die Markierungen eines Ergebnisses in ein Bild, das um 'faktor' gegenueber dem Kamerabild skaliert ist.
+    Eintraege: ('linie', punkte, farbe, dicke) oder ('text', text, position, zeile, groesse, farbe, dicke)
+    Die Position wird skaliert, der senkrechte Versatz 'zeile' (Pixel) und die Schrift nicht, damit der Text lesbar bleibt.
+    """
+    for element in overlay:
+        if element[0] == 'linie':
+            _, punkte, farbe, dicke = element
+            if faktor != 1.0:
+                punkte = [np.intp(np.round(np.asarray(p)*faktor)) for p in punkte]
+            cv2.polylines(img, punkte, True, farbe, dicke)
+        elif element[0] == 'text':
+            _, text, position, zeile, groesse, farbe, dicke = element
+            position = (int(position[0]*faktor), int(position[1]*faktor) + zeile)
+            cv2.putText(img, text, position, cv2.FONT_HERSHEY_PLAIN, groesse, farbe, dicke)
+
+
+def anzeigebild_erzeugen(ergebnis, bild_index, groesse=None):
+    """
+    Erzeugt das anzuzeigende Bild (BGR) inkl. Markierungen: Original (bild_index 0) oder gefiltertes Bild (1).
+    Das Kamerabild wird einmal auf 'groesse' (Breite, Hoehe) verkleinert (Seitenverhaeltnis bleibt erhalten),
+    erst danach wird gefiltert und gezeichnet. Mit groesse=None entsteht das Bild in voller Aufloesung (Screenshot).
+    """
+    h, w = ergebnis.rohbild.shape[:2]
+    faktor = 1.0 if groesse is None else min(groesse[0]/w, groesse[1]/h, 1.0)
+    if faktor < 1.0:
+        bild = cv2.resize(ergebnis.rohbild, (round(w*faktor), round(h*faktor)), interpolation=cv2.INTER_AREA)
+    else:
+        bild = ergebnis.rohbild.copy()
+
+    if bild_index == 1:
+        # gefiltertes Bild: nur die Pixel der Maske innerhalb des Suchfensters, sonst schwarz
+        x0, y0, x1, y1 = ergebnis.fenster
+        maske = np.zeros((h, w), dtype=np.uint8)
+        if ergebnis.maske.shape != (y1-y0, x1-x0):
+            maske[y0:y1, x0:x1] = cv2.resize(ergebnis.maske, (x1-x0, y1-y0), interpolation=cv2.INTER_NEAREST)
+        else:
+            maske[y0:y1, x0:x1] = ergebnis.maske
+        if faktor < 1.0:
+            maske = cv2.resize(maske, (bild.shape[1], bild.shape[0]), interpolation=cv2.INTER_NEAREST)
+        bild = cv2.bitwise_and(bild, bild, mask=maske)
+
+    overlay_zeichnen(bild, ergebnis.overlay, faktor)
+    return bild
+
+
+class Latenzstatistik:
+    """
+    Latenzen der Bildverarbeitung je Kamerabild in ms: Aufnahme -> verarbeitet und Aufnahme -> angezeigt
+    (NaN, falls das Ergebnis nicht angezeigt wurde). Wird nur im GUI-Thread befuellt.
+    Ohne Aufzeichnung werden nur die letzten 'fenster' Bilder fuer die Live-Anzeige behalten.
+    """
+
+    def __init__(self, fenster=300):
+        self.fenster = fenster
+        self.aufzeichnen = False
+        self.zeilen = []
+
+
+    def starten(self):
+        self.zeilen = []
+        self.aufzeichnen = True
+
+
+    def beenden(self):
+        self.aufzeichnen = False
+
+
+    def hinzufuegen(self, ergebnis, t_angezeigt=None):
+        verarbeitet = (ergebnis.t_verarbeitet - ergebnis.t_aufnahme)*1000
+        angezeigt = np.nan if t_angezeigt is None else (t_angezeigt - ergebnis.t_aufnahme)*1000
+        self.zeilen.append((ergebnis.index, ergebnis.zeitpunkt, verarbeitet, angezeigt))
+        if not self.aufzeichnen and len(self.zeilen) > 2*self.fenster:
+            del self.zeilen[:-self.fenster]
+
+
+    def spalten(self):
+        """
+        Gibt (Bildnummern, Zeitpunkte der Aufnahme (s seit Epoche), Latenz verarbeitet, Latenz angezeigt) als Arrays zurueck.
+        """
+        if len(self.zeilen) == 0:
+            return tuple(np.empty(0) for _ in range(4))
+        return tuple(np.array(spalte) for spalte in zip(*self.zeilen))
+
+
+    def zusammenfassung(self, letzte=None):
+        """
+        Median und 95%-Quantil der Latenzen (der letzten 'letzte' Bilder) als Text.
+        """
+        zeilen = np.array([z[2:] for z in self.zeilen[-letzte if letzte else 0:]], dtype=float).reshape(-1, 2)
+        texte = []
+        for name, werte in (('Aufnahme->verarbeitet', zeilen[:, 0]), ('Aufnahme->angezeigt', zeilen[:, 1])):
+            werte = werte[~np.isnan(werte)]
+            if len(werte) > 0:
+                texte.append(f'{name} {np.median(werte):.0f} ms (95%: {np.percentile(werte, 95):.0f} ms)')
+        return ', '.join(texte)
+
+
+class Segmentierung:
+    """
+    Farbfilterung im HSV-Farbraum mit dem Bereich der Schieberegler der GUI.
+    Die Grenzen werden nur bei einer Aenderung der Schieberegler neu angelegt, die Maske entsteht direkt aus dem
+    Kamerabild (BGR). Das gefilterte Vorschaubild wird erst beim Anzeigen erzeugt (anzeigebild_erzeugen).
+    (Eine Zuordnungstabelle ueber alle 2^24 BGR-Farben liefert dieselbe Maske, ist durch die zufaelligen
+    Speicherzugriffe aber ca. 3x langsamer als cvtColor und inRange.)
+    """
+
+    def __init__(self):
+        self.bereich = None
+        self.hsv_min = None
+        self.hsv_max = None
+
+
+    def einstellen(self, hsv_min, hsv_max):
+        bereich = (tuple(hsv_min), tuple(hsv_max))
+        if bereich != self.bereich:
+            self.bereich = bereich
+            self.hsv_min = np.array(hsv_min, dtype=np.uint8)
+            self.hsv_max = np.array(hsv_max, dtype=np.uint8)
+
+
+    def maske(self, cv_img):
+        return cv2.inRange(cv2.cvtColor(cv_img, cv2.COLOR_BGR2HSV), self.hsv_min, self.hsv_max)
+
+
+class ROI_Tracker:
+    """
+    Verfolgt den Bildbereich (region of interest), in dem sich der Ballon befindet.
+    Farbfilterung und Konturensuche laufen dann nur in einem Fenster um die zuletzt gefundenen Konturen.
+    Der Rand um die Konturen waechst mit der Groesse des Ballons und mit dessen Wachstum je Bild.
+    Wird im Fenster nichts gefunden oder beruehrt eine Kontur den Fensterrand, wird im ganzen Bild gesucht.
+    """
+
+    def __init__(self, rand=0.25, rand_min=40):
+        self.rand = rand            # Rand relativ zur Groesse der Konturen
+        self.rand_min = rand_min    # minimaler Rand in Pixeln
+        self.roi = None             # (x0, y0, x1, y1) oder None fuer das ganze Bild
+        self.letzte_groesse = None
+
+
+    def zuruecksetzen(self):
+        self.roi = None
+        self.letzte_groesse = None
+
+
+    def fenster(self, shape):
+        if self.roi is None:
+            return (0, 0, shape[1], shape[0])
+        return self.roi
+
+
+    @staticmethod
+    def abgeschnitten(rechtecke, fenster, shape):
+        """
+        Prueft, ob eine Kontur am Rand des Fensters liegt (ausser, dieser ist zugleich der Bildrand).
+        """
+        x0, y0, x1, y1 = fenster
+        for rect in rechtecke:
+            punkte = cv2.boxPoints(rect)
+            (xmin, ymin), (xmax, ymax) = punkte.min(axis=0), punkte.max(axis=0)
+            if ((xmin <= x0+1 and x0 > 0) or (ymin <= y0+1 and y0 > 0) or
+                    (xmax >= x1-2 and x1 < shape[1]) or (ymax >= y1-2 and y1 < shape[0])):
+                return True
+        return False
+
+
+    def aktualisieren(self, rechtecke, shape):
+        if not rechtecke:
+            self.zuruecksetzen()
+            return
+
+        punkte = np.concatenate([cv2.boxPoints(rect) for rect in rechtecke])
+        (xmin, ymin), (xmax, ymax) = punkte.min(axis=0), punkte.max(axis=0)
+        groesse = max(xmax-xmin, ymax-ymin)
+
+        # Rand abhaengig von der Groesse und dem Wachstum seit dem letzten Bild
+        wachstum = 0 if self.letzte_groesse is None else max(0, groesse-self.letzte_groesse)
+        rand = max(self.rand_min, self.rand*groesse) + 2*wachstum
+        self.letzte_groesse = groesse
+
+        self.roi = (max(0, int(xmin-rand)), max(0, int(ymin-rand)),
+                    min(shape[1], int(xmax+rand)+1), min(shape[0], int(ymax+rand)+1))
+
+
+class Massstab:
+    """
+    Massstab (Pixel je mm) aus dem Aruco-Marker, der fest am Pruefstand angebracht ist.
+    Der Marker wird nicht in jedem Bild gesucht, sondern nur alle 'intervall' Sekunden (solange weniger als
+    'mindestanzahl' Messungen vorliegen alle 'intervall_suche' Sekunden) und sofort, falls sich das Bild im Bereich des Markers veraendert
+    (Kamera bewegt oder Marker verdeckt). Der Massstab ist der Median der letzten Messungen ohne Ausreisser.
+    Bei einer Bewegung der Kamera werden die bisherigen Messungen verworfen.
+    """
+
+    def __init__(self, intervall=2.0, intervall_suche=0.25, anzahl=15, mindestanzahl=5, ausreisser=0.03, bewegung_schwelle=12):
+        self.intervall = intervall
+        self.intervall_suche = intervall_suche
+        self.anzahl = anzahl                        # Anzahl der Messungen fuer den Median
+        self.mindestanzahl = mindestanzahl          # Anzahl der Messungen fuer volles Vertrauen
+        self.ausreisser = ausreisser                # max. relative Abweichung vom Median
+        self.bewegung_schwelle = bewegung_schwelle  # mittlere Grauwertaenderung im Bereich des Markers
+
+        self.aruco_params = cv2.aruco.DetectorParameters()
+        self.aruco_dict = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_50)
+
+        self.zuruecksetzen()
+
+
+    def zuruecksetzen(self):
+        self.messungen = []
+        self.pixel_mm_ratio = None
+        self.konfidenz = 0.0
+        self.marker = None          # (Ecken, ID) der letzten erfolgreichen Erkennung
+        self.ausschnitt = None      # Bereich (x0, y0, x1, y1) des Markers bei der letzten erfolgreichen Erkennung
+        self.referenz = None        # (Ausschnitt, Grauwerte) zur Erkennung von Bewegungen
+        self.t_erkennung = None
+        self.fehlversuche = 0
+
+        # Zaehler fuer Diagnosezwecke
+        self.erkennungen = 0
+        self.bewegungen = 0
+
+
+    def aktualisieren(self, cv_img, t=None, entzerrung=None):
+        """
+        Sucht den Marker im Kamerabild (BGR), falls dies faellig ist. Gibt zurueck, ob gesucht wurde.
+        Mit einer Kamerakalibrierung ('entzerrung') wird der Massstab aus den entzerrten Ecken bestimmt.
+        """
+        t = time.monotonic() if t is None else t
+        intervall = self.intervall if len(self.messungen) >= self.mindestanzahl else self.intervall_suche
+        faellig = self.t_erkennung is None or t - self.t_erkennung >= intervall
+
+        if not faellig and self.bewegung(cv_img):
+            self.bewegungen += 1
+            faellig = True
+        if not faellig:
+            return False
+
+        self.t_erkennung = t
+        self.erkennungen += 1
+        corners, ids, _ = cv2.aruco.detectMarkers(cv_img, self.aruco_dict, parameters=self.aruco_params)
+
+        if len(corners) == 0:
+            # Marker verdeckt oder nicht im Bild: letzter Massstab bleibt gueltig, das Vertrauen sinkt
+            self.fehlversuche += 1
+            self.marker = None
+            self.referenz = None
+            self.konfidenz_berechnen()
+            return True
+
+        ecken = corners[0][0]
+        self.fehlversuche = 0
+        self.marker = (ecken, ids[0][0])
+
+        # Ausschnitt um den Marker als Referenz fuer die Bewegungserkennung merken
+        (x0, y0), (x1, y1) = np.intp(ecken.min(axis=0)), np.intp(ecken.max(axis=0))
+        x0, y0 = max(0, x0), max(0, y0)
+        ausschnitt = (x0, y0, x1+1, y1+1)
+        if self.ausschnitt is not None and np.abs(np.subtract(ausschnitt, self.ausschnitt)).max() > 2:
+            # Marker an anderer Stelle -> Kamera wurde bewegt, alte Messungen verwerfen
+            self.messungen = []
+        self.ausschnitt = ausschnitt
+        self.referenz = (ausschnitt, self.graustufen(cv_img, ausschnitt))
+
+        # since the aruco marker is a square of side length 50mm, the length of the surrounding polygon must be 200mm
+        ecken_massstab = ecken if entzerrung is None else entzerrung.punkte_entzerren(ecken)
+        ratio = cv2.arcLength(ecken_massstab.reshape(-1, 1, 2), True) / 200
+        if len(self.messungen) >= 3 and abs(ratio/np.median(self.messungen) - 1) > self.ausreisser:
+            self.konfidenz_berechnen()
+            return True   # Ausreisser
+        self.messungen = (self.messungen + [ratio])[-self.anzahl:]
+        self.pixel_mm_ratio = float(np.median(self.messungen))
+        self.konfidenz_berechnen()
+        return True
+
+
+    @staticmethod
+    def graustufen(cv_img, ausschnitt):
+        x0, y0, x1, y1 = ausschnitt
+        return cv2.cvtColor(cv_img[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+
+
+    def bewegung(self, cv_img):
+        """
+        Prueft, ob sich das Bild im Bereich des Markers seit der letzten Erkennung veraendert hat.
+        """
+        if self.referenz is None:
+            return False
+        ausschnitt, referenz = self.referenz
+        aktuell = self.graustufen(cv_img, ausschnitt)
+        if aktuell.shape != referenz.shape:
+            return True
+        return cv2.absdiff(aktuell, referenz).mean() > self.bewegung_schwelle
+
+
+    def konfidenz_berechnen(self):
+        if self.pixel_mm_ratio is None:
+            self.konfidenz = 0.0
+            return
+        # Anzahl der Messungen, deren Streuung und fehlgeschlagene Erkennungen seit der letzten Messung
+        anteil = min(1.0, len(self.messungen)/self.mindestanzahl)
+        streuung = np.std(self.messungen)/self.pixel_mm_ratio if len(self.messungen) > 1 else self.ausreisser/2
+        self.konfidenz = anteil * max(0.0, 1 - streuung/self.ausreisser) * 0.5**self.fehlversuche
+
+
+class Bildverarbeitung:
+    def __init__(self, video_width=640, video_height=480, messmodus='kontur', kamerakalibrierung=None):
+        self.video_width = video_width
+        self.video_height = video_height
+
+        # Verfahren zur Bestimmung der Breite (siehe MESSMODI)
+        if messmodus not in MESSMODI:
+            raise ValueError(f'Unbekannter Messmodus {messmodus}, moeglich sind {MESSMODI}')
+        self.messmodus = messmodus
+        self.pyramidenstufen = 2    # Modus 'kanten': Suche des Ballons in 1/4 der Aufloesung
+        self.scanlinien = 9         # Modus 'kanten': Anzahl der Bildzeilen, in denen die Kanten gemessen werden
+
+        # Verzeichnung des Objektivs (Kamerakalibrierung), korrigiert werden nur die gemessenen Punkte
+        self.kamerakalibrierung = kamerakalibrierung
+        self.entzerrung_aktiv = False
+
+        # Farbfilterung und Suchfenster fuer den Ballon
+        self.segmentierung = Segmentierung()
+        self.roi_tracker = ROI_Tracker()
+        self.letzte_parameter = None
+
+        # Massstab aus dem Aruco-Marker
+        self.massstab = Massstab()
+
+
+    def verarbeiten(self, cv_img, parameter, t=None):
+        """
+        Verarbeitet ein Kamerabild (BGR).
+        parameter: dict mit 'hsv_min', 'hsv_max' (je [h, s, v]), 'min_area' und 'bild_index' (0: original, 1: gefiltert)
+        t: Zeitpunkt der Aufnahme in Sekunden fuer den Massstab (None: jetzt; bei aufgezeichneten Videos angeben)
+        Das Anzeigebild wird hier nicht erzeugt, sondern nur die Markierungen (ergebnis.overlay) gesammelt.
+        """
+        ergebnis = Ergebnis()
+        overlay = ergebnis.overlay
+
+        # Nach einer Aenderung der Einstellungen wieder im ganzen Bild suchen
+        if parameter is not self.letzte_parameter:
+            self.segmentierung.einstellen(parameter['hsv_min'], parameter['hsv_max'])
+            self.roi_tracker.zuruecksetzen()
+            self.letzte_parameter = parameter
+
+        # Konturen zunaechst nur im Suchfenster suchen, falls dort nichts (vollstaendig) gefunden wird, im ganzen Bild
+        vollbild = (0, 0, cv_img.shape[1], cv_img.shape[0])
+        stufen = self.pyramidenstufen if self.messmodus == 'kanten' else 0
+        fenster = self.roi_tracker.fenster(cv_img.shape)
+        rechtecke, konturen, color_mask = self.konturen_suchen(cv_img, parameter, fenster, stufen)
+        if fenster != vollbild and (not rechtecke or self.roi_tracker.abgeschnitten(rechtecke, fenster, cv_img.shape)):
+            fenster = vollbild
+            rechtecke, konturen, color_mask = self.konturen_suchen(cv_img, parameter, fenster, stufen)
+        self.roi_tracker.aktualisieren(rechtecke, cv_img.shape)
+
+        # Fuer das Anzeigebild merken (wird erst bei Bedarf erzeugt, siehe anzeigebild_erzeugen)
+        ergebnis.rohbild = cv_img
+        ergebnis.maske = color_mask
+        ergebnis.fenster = fenster
+        if fenster != vollbild:
+            x0, y0, x1, y1 = fenster
+            overlay.append(('linie', [np.array([[x0, y0], [x1-1, y0], [x1-1, y1-1], [x0, y1-1]])], GELB, 1))
+
+        # Kamerakalibrierung nur verwenden, falls sie zur Bildgroesse passt
+        self.entzerrung_aktiv = self.kamerakalibrierung is not None and self.kamerakalibrierung.passend(cv_img.shape)
+        entzerrung = self.kamerakalibrierung if self.entzerrung_aktiv else None
+
+        # Massstab aus dem Aruco-Marker (der Marker wird nur bei Bedarf gesucht)
+        self.massstab.aktualisieren(cv_img, t=t, entzerrung=entzerrung)
+        ergebnis.pixel_mm_ratio = self.massstab.pixel_mm_ratio
+        ergebnis.konfidenz = self.massstab.konfidenz
+        ergebnis.marker = self.massstab.marker
+
+        if ergebnis.marker is not None:
+            # draw polygon around aruco marker, calculate center of polygon and widths of aruco marker and display a text
+            ecken, marker_id = ergebnis.marker
+            overlay.append(('linie', [np.intp(ecken)], GRUEN, 2))
+            x, y = ecken.mean(axis=0)
+            s1, s2 = calc_aruco_widths(ecken)
+            overlay.append(('text', f'ID: {marker_id}', (int(x), int(y)), 0, 1, GRUEN, 1))
+            overlay.append(('text', f'[pixel] {s1:.2f} x {s2:.2f}', (int(x), int(y)), -30, 1, GRUEN, 1))
+            overlay.append(('text', f'[mm] {s1/ergebnis.pixel_mm_ratio:.2f} x {s2/ergebnis.pixel_mm_ratio:.2f}', (int(x), int(y)), -15, 1, GRUEN, 1))
+            overlay.append(('text', f'Konfidenz: {ergebnis.konfidenz:.2f}', (int(x), int(y)), 15, 1, GRUEN, 1))
+        elif ergebnis.pixel_mm_ratio is not None:
+            # Marker aktuell nicht erkannt, der letzte Massstab wird weiter verwendet
+            overlay.append(('text', f'Aruco-Marker verdeckt, Massstab {ergebnis.pixel_mm_ratio:.3f} px/mm (Konfidenz: {ergebnis.konfidenz:.2f})',
+                            (int(self.video_width/10), int(self.video_height/10)), 0, 1, ROT, 1))
+        else:
+            # Warnung anzeigen, dass aktuell kein Aruco-Marker detektiert wurde
+            overlay.append(('text', 'Kein Aruco-Marker gefunden!', (int(self.video_width/10), int(self.video_height/2)), 0, 2, ROT, 3))
+
+        for rect, kontur in zip(rechtecke, konturen):
+            (x, y), (w, h), angle = rect
+            ergebnis.boxen.append(rect)
+            box = np.intp(cv2.boxPoints(rect))
+            overlay.append(('linie', [box], ROT, 2))
+
+            if self.messmodus == 'kontur' and entzerrung is not None:
+                # Breite aus der entzerrten Kontur (Markierungen bleiben im unkorrigierten Bild)
+                _, (w, h), _ = cv2.minAreaRect(entzerrung.punkte_entzerren(kontur))
+            elif self.messmodus == 'kanten':
+                kanten = self.kanten_messen(cv_img, rect, entzerrung)
+                if kanten is not None:
+                    w, punkte = kanten
+                    overlay.append(('linie', [np.intp(np.round([[px, py-4], [px, py+4]])) for px, py in punkte], GELB, 1))
+
+            ergebnis.breiten.append(w)
+            overlay.append(('text', f'[pixel] width: {w:.1f}, height: {h:.1f}', (int(x), int(y)), 15, 1, ROT, 1))
+
+            if ergebnis.pixel_mm_ratio is not None:
+                durchmesser = w/ergebnis.pixel_mm_ratio
+                ergebnis.durchmesser.append(durchmesser)
+                overlay.append(('text', f'[mm] width: {durchmesser:.2f}, height: {h/ergebnis.pixel_mm_ratio:.2f}', (int(x), int(y)), 30, 1, ROT, 1))
+
+        return ergebnis
+
+
+    def konturen_suchen(self, cv_img, parameter, fenster, stufen=0):
+        """
+        Farbfilterung und Konturensuche im Fenster (x0, y0, x1, y1), das zuvor 'stufen' mal mit pyrDown halbiert wird.
+        Gibt die minAreaRect und Konturen (N x 2) aller Konturen >= min. Flaeche (in Koordinaten des ganzen Bildes)
+        und die Farbmaske des Fensters zurueck.
+        """
+        x0, y0, x1, y1 = fenster
+        teil = cv_img[y0:y1, x0:x1]
+        for _ in range(stufen):
+            teil = cv2.pyrDown(teil)
+        color_mask = self.segmentierung.maske(teil)
+
+        # detect contours (die Maske ist bereits ein Binaerbild)
+        contours, _ = cv2.findContours(color_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        # Koordinaten der verkleinerten Maske auf das ganze Bild umrechnen (Pixel i entspricht (i+0.5)*f-0.5)
+        f = 2**stufen
+        rechtecke = []
+        konturen = []
+        for c in contours:
+            area = cv2.contourArea(c) * f**2
+            if area >= parameter['min_area']:
+                (x, y), (w, h), angle = cv2.minAreaRect(c)
+                rechtecke.append((((x+0.5)*f-0.5+x0, (y+0.5)*f-0.5+y0), (w*f, h*f), angle))
+                konturen.append((c.reshape(-1, 2).astype(np.float32)+0.5)*f-0.5 + (x0, y0))
+        return rechtecke, konturen, color_mask
+
+
+    def kanten_messen(self, cv_img, rect, entzerrung=None):
+        """
+        Misst die horizontale Breite des Ballons (Pixel) in voller Aufloesung entlang einiger Bildzeilen um die Mitte von 'rect'.
+        Jede Zeile wird auf die Gerade zwischen Hintergrundfarbe (Enden der Zeile) und Ballonfarbe (Mitte der Zeile)
+        projiziert, die Kanten liegen beim Wert 0.5 (linear interpoliert, also mit Subpixel-Genauigkeit).
+        Durch die Quadrate der Sehnenlaengen ueber der Zeile wird eine Parabel gelegt (exakt fuer Kreis und Ellipse),
+        deren Maximum ist die Breite. Mit einer Kamerakalibrierung ('entzerrung') werden die Kantenpunkte vorher entzerrt.
+        Gibt (Breite, Kantenpunkte im unkorrigierten Bild) oder None zurueck.
+        """
+        bild_hoehe, bild_breite = cv_img.shape[:2]
+        punkte = cv2.boxPoints(rect)
+        (xmin, ymin), (xmax, ymax) = punkte.min(axis=0), punkte.max(axis=0)
+        xc, yc = rect[0]
+
+        # Ausschnitt der Zeilen (mit Rand, da die Grobsuche nur auf wenige Pixel genau ist)
+        rand = max(8, 0.1*(xmax-xmin))
+        xa, xb = int(max(0, xmin-rand)), int(min(bild_breite, xmax+rand+1))
+        zeilen = np.unique(np.clip(np.round(yc + np.linspace(-0.25, 0.25, self.scanlinien)*(ymax-ymin)), 0, bild_hoehe-1).astype(int))
+        streifen = cv_img[zeilen, xa:xb].astype(np.float32)
+        if streifen.shape[1] < 8:
+            return None
+
+        # Referenzfarben: Ballon in der Mitte, Hintergrund links und rechts ausserhalb des groben Rechtecks
+        n_rand = max(2, int(rand/2))
+        mitte = int(xc) - xa
+        halb = max(1, int(0.1*(xmax-xmin)))
+        ballon = streifen[:, mitte-halb:mitte+halb+1].reshape(-1, 3).mean(axis=0)
+
+        linien = []
+        for seite, hintergrund in (('links', streifen[:, :n_rand]), ('rechts', streifen[:, -n_rand:])):
+            hintergrund = hintergrund.reshape(-1, 3).mean(axis=0)
+            richtung = ballon - hintergrund
+            if richtung @ richtung < 100:
+                return None   # kein ausreichender Kontrast
+            wert = (streifen - hintergrund) @ richtung / (richtung @ richtung)
+            linien.append(cv2.GaussianBlur(wert, (5, 1), 0))
+        links, rechts = linien
+
+        kantenpunkte = []
+        y_sehnen = []
+        sehnen = []
+        for k, y in enumerate(zeilen):
+            # linke Kante: erster Wert >= 0.5 von aussen, rechte Kante: letzter Wert >= 0.5
+            innen_links = np.flatnonzero(links[k, :mitte+1] >= 0.5)
+            innen_rechts = np.flatnonzero(rechts[k, mitte:] >= 0.5) + mitte
+            if len(innen_links) == 0 or len(innen_rechts) == 0:
+                continue
+            i, j = innen_links[0], innen_rechts[-1]
+            if i == 0 or j == streifen.shape[1]-1:
+                continue   # Kante liegt ausserhalb des Ausschnitts
+            x_links = i-1 + (0.5-links[k, i-1])/(links[k, i]-links[k, i-1])
+            x_rechts = j + (rechts[k, j]-0.5)/(rechts[k, j]-rechts[k, j+1])
+            kantenpunkte += [(xa+x_links, y), (xa+x_rechts, y)]
+            y_sehnen.append(y)
+            sehnen.append(x_rechts-x_links)
+
+        if len(sehnen) == 0:
+            return None
+
+        y_sehnen = np.array(y_sehnen, dtype=float)
+        sehnen = np.array(sehnen)
+        if entzerrung is not None:
+            # Sehnen zwischen den entzerrten Kantenpunkten (die Zeilen sind danach nicht mehr exakt waagrecht)
+            entzerrt = entzerrung.punkte_entzerren(kantenpunkte).reshape(-1, 2, 2)
+            sehnen = np.linalg.norm(entzerrt[:, 1] - entzerrt[:, 0], axis=1)
+            y_sehnen = entzerrt[:, :, 1].mean(axis=1)
+            yc = y_sehnen.mean()
+        breite_max = sehnen.max()
+        if len(sehnen) >= 3:
+            a, b, c = np.polyfit(y_sehnen - yc, sehnen**2, 2)
+            y_scheitel = -b/(2*a) if a < 0 else None
+            if y_scheitel is not None and abs(y_scheitel) <= (ymax-ymin)/2:
+                breite_max = np.sqrt(c - b**2/(4*a))
+        return breite_max, kantenpunkte
@@ -0,0 +1,117 @@
+"""
+Kalibrierung der Druckmessumformer.
+
+Eine Kalibrierung besteht aus einer Tabelle von Stuetzstellen (Rohwert des Pi Pico -> Druck in mbar).
+Daraus wird einmalig eine Tabelle mit einem Druckwert fuer jeden der 2**16 moeglichen Rohwerte erzeugt,
+sodass die Umrechnung eines ganzen Blocks von Rohwerten nur noch ein einziger Array-Zugriff ist.
+Zwischen den Stuetzstellen wird linear interpoliert, ausserhalb mit der Steigung des ersten/letzten Abschnitts extrapoliert.
+
+Die Kalibrierungen werden je Sensor als JSON-Datei im Ordner ./Kalibrierung/ gespeichert, z.B.:
+
+    python Kalibrierung.py Sensor_A 6554:0 32768:344.74 58982:689.48
+"""
+
+import argparse
+import json
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+
+
+KALIBRIERUNG_ORDNER = './Kalibrierung/'
+
+ROHWERT_MAX = 2**16
+PSI_IN_MBAR = 68.9476
+
+
+class Druckkalibrierung:
+    def __init__(self, sensor, rohwerte, drucke):
+        rohwerte = np.asarray(rohwerte, dtype=float)
+        drucke = np.asarray(drucke, dtype=float)
+        if len(rohwerte) < 2 or len(rohwerte) != len(drucke):
+            raise ValueError('Eine Kalibrierung benoetigt mindestens zwei Stuetzstellen (Rohwert, Druck).')
+
+        reihenfolge = np.argsort(rohwerte)
+        self.sensor = sensor
+        self.rohwerte = rohwerte[reihenfolge]
+        self.drucke = drucke[reihenfolge]
+        if np.any(np.diff(self.rohwerte) <= 0):
+            raise ValueError('Die Rohwerte der Stuetzstellen muessen verschieden sein.')
+
+        # Nullpunktverschiebung (wird zu Beginn einer Messung per tarieren() bestimmt)
+        self.tara = 0.0
+
+        # Umrechnungstabelle fuer alle moeglichen Rohwerte erzeugen
+        x = np.arange(ROHWERT_MAX, dtype=float)
+        self.tabelle = np.interp(x, self.rohwerte, self.drucke)
+        m0 = (self.drucke[1]-self.drucke[0]) / (self.rohwerte[1]-self.rohwerte[0])
+        m1 = (self.drucke[-1]-self.drucke[-2]) / (self.rohwerte[-1]-self.rohwerte[-2])
+        unten = x < self.rohwerte[0]
+        oben = x > self.rohwerte[-1]
+        self.tabelle[unten] = self.drucke[0] + m0*(x[unten]-self.rohwerte[0])
+        self.tabelle[oben] = self.drucke[-1] + m1*(x[oben]-self.rohwerte[-1])
+
+
+    @classmethod
+    def standard(cls, v_in=3.3):
+        """
+        Ratiometrischer Druckmessumformer 0-10 psi: 0.1*v_in == 0 psi, 0.9*v_in == 10 psi.
+        (entspricht der bisher fest im Code hinterlegten Umrechnung)
+        """
+        v_0 = v_in/10
+        v_10 = v_in - v_0
+        rohwerte = [v_0/v_in*ROHWERT_MAX, v_10/v_in*ROHWERT_MAX]
+        drucke = [0, 10*PSI_IN_MBAR]
+        return cls('Standard', rohwerte, drucke)
+
+
+    @classmethod
+    def laden(cls, sensor, ordner=KALIBRIERUNG_ORDNER):
+        with open(Path(ordner) / f'{sensor}.json', encoding='utf-8') as f:
+            daten = json.load(f)
+        punkte = np.array(daten['punkte'], dtype=float)
+        return cls(daten['sensor'], punkte[:, 0], punkte[:, 1])
+
+
+    def speichern(self, ordner=KALIBRIERUNG_ORDNER):
+        Path(ordner).mkdir(parents=True, exist_ok=True)
+        outfile = Path(ordner) / f'{self.sensor}.json'
+        daten = {'sensor': self.sensor,
+                 'datum': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                 'punkte': [[float(r), float(p)] for r, p in zip(self.rohwerte, self.drucke)]}
+        with open(outfile, 'w', encoding='utf-8') as f:
+            json.dump(daten, f, indent=2)
+        return outfile
+
+
+    def umrechnen(self, rohwerte):
+        """
+        Rechnet einen Block von Rohwerten (uint16) in Druecke in mbar um (abzgl. Tara).
+        """
+        return self.tabelle[rohwerte] - self.tara
+
+
+    def tarieren(self, rohwerte):
+        """
+        Setzt den Nullpunkt auf den mittleren Druck der uebergebenen Rohwerte (z.B. bei entluefteter Probe).
+        Gibt die ermittelte Nullpunktverschiebung in mbar zurueck.
+        """
+        self.tara = float(np.mean(self.tabelle[rohwerte]))
+        return self.tara
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Kalibrierung eines Druckmessumformers anlegen.')
+    parser.add_argument('sensor', help='Name des Sensors (Dateiname der Kalibrierung)')
+    parser.add_argument('punkte', nargs='+', help='Stuetzstellen als Rohwert:Druck_in_mbar')
+    parser.add_argument('--ordner', default=KALIBRIERUNG_ORDNER)
+    args = parser.parse_args()
+
+    rohwerte, drucke = zip(*[[float(x) for x in p.split(':')] for p in args.punkte])
+    kalibrierung = Druckkalibrierung(args.sensor, rohwerte, drucke)
+    outfile = kalibrierung.speichern(args.ordner)
+    print(f'Speichere Kalibrierung unter {outfile} ab.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""
+Kalibrierung der Kamera (Verzeichnung des Objektivs).
+
+Grosse Ballons reichen bis an den Bildrand, wo die Verzeichnung den gemessenen Durchmesser verfaelscht.
+Die Kamera wird daher einmalig mit einem Schachbrett oder einem ChArUco-Board kalibriert (Kameramatrix und
+Verzeichnungskoeffizienten). In der Bildverarbeitung werden dann nicht die ganzen Bilder entzerrt, sondern nur
+die gemessenen Punkte (Kontur bzw. Kanten des Ballons, Ecken des Aruco-Markers) mit undistortPoints korrigiert.
+Fuer ganze Bilder bzw. Bildausschnitte werden die Karten von initUndistortRectifyMap einmalig beim ersten Gebrauch erzeugt.
+
+Die Kalibrierungen werden je Kamera als JSON-Datei im Ordner ./Kamerakalibrierung/ gespeichert
+(Auswahl in der App ueber 'kamera' in values.ini), z.B.:
+
+    python Kamerakalibrierung.py Webcam_Pruefstand --bilder ./Kalibrierbilder/*.png --spalten 9 --zeilen 6 --feldgroesse 25
+    python Kamerakalibrierung.py Webcam_Pruefstand --videoquelle 0 --muster charuco --spalten 7 --zeilen 5 --feldgroesse 30
+"""
+
+import argparse
+import glob
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+import cv2
+import numpy as np
+
+
+KAMERAKALIBRIERUNG_ORDNER = './Kamerakalibrierung/'
+
+MUSTER = ('schachbrett', 'charuco')
+
+
+class Kamerakalibrierung:
+    def __init__(self, kamera, kamera_matrix, verzerrung, bildgroesse, rms=None):
+        self.kamera = kamera
+        self.kamera_matrix = np.asarray(kamera_matrix, dtype=np.float64).reshape(3, 3)
+        self.verzerrung = np.asarray(verzerrung, dtype=np.float64).ravel()
+        self.bildgroesse = (int(bildgroesse[0]), int(bildgroesse[1]))   # (Breite, Hoehe)
+        self.rms = rms   # mittlerer Rueckprojektionsfehler der Kalibrierung in Pixeln
+
+        # Karten fuer remap (erst bei Bedarf erzeugen)
+        self.karte_x = None
+        self.karte_y = None
+
+
+    @classmethod
+    def laden(cls, kamera, ordner=KAMERAKALIBRIERUNG_ORDNER):
+        with open(Path(ordner) / f'{kamera}.json', encoding='utf-8') as f:
+            daten = json.load(f)
+        return cls(daten['kamera'], daten['kamera_matrix'], daten['verzerrung'], daten['bildgroesse'], daten.get('rms'))
+
+
+    def speichern(self, ordner=KAMERAKALIBRIERUNG_ORDNER):
+        Path(ordner).mkdir(parents=True, exist_ok=True)
+        outfile = Path(ordner) / f'{self.kamera}.json'
+        daten = {'kamera': self.kamera,
+                 'datum': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                 'bildgroesse': list(self.bildgroesse),
+                 'kamera_matrix': self.kamera_matrix.tolist(),
+                 'verzerrung': self.verzerrung.tolist(),
+                 'rms': self.rms}
+        with open(outfile, 'w', encoding='utf-8') as f:
+            json.dump(daten, f, indent=2)
+        return outfile
+
+
+    def passend(self, shape):
+        """
+        Prueft, ob die Kalibrierung zur Groesse des Kamerabildes passt.
+        """
+        return (shape[1], shape[0]) == self.bildgroesse
+
+
+    def punkte_entzerren(self, punkte):
+        """
+        Rechnet Bildpunkte (N x 2, Pixel) in Pixelkoordinaten des entzerrten Bildes um (gleiche Kameramatrix).
+        """
+        punkte = np.asarray(punkte, dtype=np.float64).reshape(-1, 1, 2)
+        entzerrt = cv2.undistortPoints(punkte, self.kamera_matrix, self.verzerrung, P=self.kamera_matrix)
+        return entzerrt.reshape(-1, 2).astype(np.float32)
+
+
+    def karten_erzeugen(self):
+        if self.karte_x is None:
+            self.karte_x, self.karte_y = cv2.initUndistortRectifyMap(self.kamera_matrix, self.verzerrung, None, self.kamera_matrix,
+                                                                     self.bildgroesse, cv2.CV_32FC1)
+        return self.karte_x, self.karte_y
+
+
+    def bild_entzerren(self, cv_img, fenster=None):
+        """
+        Entzerrt das ganze Bild oder nur den Ausschnitt 'fenster' (x0, y0, x1, y1, in Koordinaten des entzerrten Bildes).
+        """
+        karte_x, karte_y = self.karten_erzeugen()
+        if fenster is not None:
+            x0, y0, x1, y1 = fenster
+            karte_x, karte_y = karte_x[y0:y1, x0:x1], karte_y[y0:y1, x0:x1]
+        return cv2.remap(cv_img, karte_x, karte_y, cv2.INTER_LINEAR)
+
+
+class Mustererkennung:
+    """
+    Findet die Eckpunkte eines Schachbretts (innere Ecken spalten x zeilen) bzw. eines ChArUco-Boards
+    (spalten x zeilen Felder, DICT_4X4_50) und gibt die zugehoerigen Punkte in mm zurueck.
+    """
+
+    def __init__(self, muster, spalten, zeilen, feldgroesse):
+        self.muster = muster
+        self.groesse = (spalten, zeilen)
+        if muster == 'schachbrett':
+            gitter = np.mgrid[0:spalten, 0:zeilen].T.reshape(-1, 2)
+            self.objektpunkte = np.hstack((gitter*feldgroesse, np.zeros((len(gitter), 1)))).astype(np.float32)
+        elif muster == 'charuco':
+            aruco_dict = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_50)
+            self.board = cv2.aruco.CharucoBoard(self.groesse, feldgroesse, 0.75*feldgroesse, aruco_dict)
+            self.detektor = cv2.aruco.CharucoDetector(self.board)
+        else:
+            raise ValueError(f'Unbekanntes Muster {muster}, moeglich sind {MUSTER}')
+
+
+    def erkennen(self, cv_img):
+        """
+        Gibt (Objektpunkte, Bildpunkte) oder None zurueck, falls das Muster nicht (ausreichend) erkannt wurde.
+        """
+        grau = cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY)
+        if self.muster == 'schachbrett':
+            gefunden, ecken = cv2.findChessboardCorners(grau, self.groesse)
+            if not gefunden:
+                return None
+            ecken = cv2.cornerSubPix(grau, ecken, (11, 11), (-1, -1),
+                                     (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001))
+            return self.objektpunkte, ecken
+
+        ecken, ids, _, _ = self.detektor.detectBoard(grau)
+        if ids is None or len(ids) < 6:
+            return None
+        objektpunkte, bildpunkte = self.board.matchImagePoints(ecken, ids)
+        return objektpunkte, bildpunkte
+
+
+def kalibrieren(kamera, bilder, mustererkennung):
+    """
+    Kalibriert die Kamera mit den Bildern (BGR), in denen das Muster erkannt wird.
+    """
+    objektpunkte = []
+    bildpunkte = []
+    for img in bilder:
+        punkte = mustererkennung.erkennen(img)
+        if punkte is not None:
+            objektpunkte.append(punkte[0])
+            bildpunkte.append(punkte[1])
+    if len(objektpunkte) < 3:
+        raise ValueError(f'Das Muster wurde nur in {len(objektpunkte)} Bildern erkannt, benoetigt werden mindestens 3 (besser 15-20).')
+
+    bildgroesse = (bilder[0].shape[1], bilder[0].shape[0])
+    rms, kamera_matrix, verzerrung, _, _ = cv2.calibrateCamera(objektpunkte, bildpunkte, bildgroesse, None, None)
+    return Kamerakalibrierung(kamera, kamera_matrix, verzerrung, bildgroesse, rms), len(objektpunkte)
+
+
+def bilder_aufnehmen(quelle, mustererkennung, anzahl, abstand=1.0):
+    """
+    Nimmt Bilder der Videoquelle auf, in denen das Muster erkannt wird (hoechstens ein Bild je 'abstand' Sekunden).
+    Das Muster sollte dabei in verschiedenen Lagen und insbesondere auch an den Bildraendern gezeigt werden.
+    """
+    cap = cv2.VideoCapture(int(quelle) if str(quelle).isdigit() else quelle)
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+    bilder = []
+    t_letztes = 0
+    while len(bilder) < anzahl:
+        ret, img = cap.read()
+        if not ret:
+            break
+        if time.monotonic() - t_letztes >= abstand and mustererkennung.erkennen(img) is not None:
+            bilder.append(img)
+            t_letztes = time.monotonic()
+            print(f'Bild {len(bilder)}/{anzahl} aufgenommen')
+    cap.release()
+    return bilder
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Kamera mit Schachbrett oder ChArUco-Board kalibrieren.')
+    parser.add_argument('kamera', help='Name der Kamera (Dateiname der Kalibrierung)')
+    parser.add_argument('--bilder', nargs='+', help='Bilddateien des Musters (alternativ --videoquelle)')
+    parser.add_argument('--videoquelle', help='Webcam-Index oder Videodatei, aus der Bilder aufgenommen werden')
+    parser.add_argument('--anzahl', type=int, default=20, help='Anzahl der Bilder bei --videoquelle')
+    parser.add_argument('--muster', choices=MUSTER, default='schachbrett')
+    parser.add_argument('--spalten', type=int, default=9, help='Schachbrett: innere Ecken je Zeile, ChArUco: Felder je Zeile')
+    parser.add_argument('--zeilen', type=int, default=6, help='Schachbrett: innere Ecken je Spalte, ChArUco: Felder je Spalte')
+    parser.add_argument('--feldgroesse', type=float, default=25, help='Kantenlaenge eines Feldes in mm')
+    parser.add_argument('--vorschau', help='Bilddatei, in die das erste Bild entzerrt gespeichert wird')
+    parser.add_argument('--ordner', default=KAMERAKALIBRIERUNG_ORDNER)
+    args = parser.parse_args()
+
+    mustererkennung = Mustererkennung(args.muster, args.spalten, args.zeilen, args.feldgroesse)
+    if args.videoquelle is not None:
+        bilder = bilder_aufnehmen(args.videoquelle, mustererkennung, args.anzahl)
+    else:
+        dateien = [datei for muster in (args.bilder or []) for datei in sorted(glob.glob(muster))]
+        bilder = [cv2.imread(datei) for datei in dateien]
+    if len(bilder) == 0:
+        parser.error('Keine Bilder angegeben oder aufgenommen.')
+
+    kalibrierung, anzahl = kalibrieren(args.kamera, bilder, mustererkennung)
+    print(f'Muster in {anzahl} von {len(bilder)} Bildern erkannt, Rueckprojektionsfehler {kalibrierung.rms:.3f} Pixel')
+
+    outfile = kalibrierung.speichern(args.ordner)
+    print(f'Speichere Kalibrierung unter {outfile} ab.')
+
+    if args.vorschau:
+        cv2.imwrite(args.vorschau, kalibrierung.bild_entzerren(bilder[0]))
+        print(f'Speichere entzerrtes Bild unter {args.vorschau} ab.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+"""
+Katalog aller Messungen im Archiv (./Messungen/JJJJ_MM_TT__hh_mm_ss/) als SQLite-Datenbank.
+
+Je Messung werden Startzeitpunkt, Durchmesserzyklen, Einstellungen der Bildverarbeitung (aus Log.txt), Anzahl der
+Messwerte, max. Druck, max. Durchmesser und die vorhandenen Dateien gespeichert. Beim Aktualisieren werden nur neue
+oder geaenderte Ordner (Groesse und Aenderungszeitpunkt der Dateien) neu eingelesen, geloeschte Ordner werden entfernt.
+Die Messwerte werden bevorzugt aus Druck.npy und Durchmesser.npy gelesen (ohne Kopie, siehe Messdatenaufzeichnung.py).
+
+Verwendung in Skripten (z.B. fuer die Auswertung mehrerer Messungen):
+
+    katalog = Katalog.Katalog()
+    katalog.aktualisieren()
+    for messung in katalog.suchen(von='2023-03-01', durchmesser=150, druck_min=40):
+        print(messung['ordner'], messung['druck_max'])
+
+Kommandozeile (zuerst aktualisieren, dann suchen):
+
+    python Katalog.py --von 2023-03-01 --durchmesser 150
+    python Katalog.py --sql "SELECT ordner, druck_max FROM messungen WHERE min_area > 500"
+"""
+
+import argparse
+import json
+import logging
+import re
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+
+ORDNERFORMAT = '%Y_%m_%d__%H_%M_%S'
+DATEIEN = ('Log.txt', 'Druck.npy', 'Druck.txt', 'Durchmesser.npy', 'Durchmesser.txt', 'Auswertung.npy', 'Auswertung.txt',
+           'Auswertung.pdf', 'Ventil.txt', 'Ventilbefehle.txt', 'Latenz.txt', 'Video.avi')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messungen (
+    ordner TEXT PRIMARY KEY,
+    start TEXT,
+    zyklen_durchmesser TEXT,
+    anzahl_zyklen INTEGER,
+    h_min INTEGER, h_max INTEGER, s_min INTEGER, s_max INTEGER, v_min INTEGER, v_max INTEGER,
+    min_area INTEGER,
+    messmodus TEXT,
+    anzahl_druck INTEGER,
+    anzahl_durchmesser INTEGER,
+    druck_max REAL,
+    durchmesser_max REAL,
+    dauer REAL,
+    dateien TEXT,
+    signatur TEXT,
+    indiziert TEXT
+);
+CREATE INDEX IF NOT EXISTS messungen_start ON messungen (start);
+CREATE TABLE IF NOT EXISTS zyklen (
+    ordner TEXT REFERENCES messungen (ordner) ON DELETE CASCADE,
+    zyklus INTEGER,
+    durchmesser REAL
+);
+CREATE INDEX IF NOT EXISTS zyklen_durchmesser ON zyklen (durchmesser);
+CREATE INDEX IF NOT EXISTS zyklen_ordner ON zyklen (ordner);
+"""
+
+
+def log_auswerten(datei):
+    """
+    Liest Einstellungen und Durchmesserzyklen aus Log.txt einer Messung (fehlende Angaben bleiben None).
+    """
+    eintrag = {'zyklen_durchmesser': None, 'h_min': None, 'h_max': None, 's_min': None, 's_max': None, 'v_min': None,
+               'v_max': None, 'min_area': None, 'messmodus': None}
+    if not Path(datei).exists():
+        return eintrag
+    with open(datei, encoding='utf-8', errors='replace') as f:
+        for zeile in f:
+            treffer = re.search(r' - ([HSV]) = \[(\d+), (\d+)\]', zeile)
+            if treffer:
+                kanal = treffer.group(1).lower()
+                eintrag[f'{kanal}_min'] = int(treffer.group(2))
+                eintrag[f'{kanal}_max'] = int(treffer.group(3))
+                continue
+            treffer = re.search(r' - min\. Area = (\d+)', zeile)
+            if treffer:
+                eintrag['min_area'] = int(treffer.group(1))
+                continue
+            treffer = re.search(r' - Messmodus Durchmesser = (\w+)', zeile)
+            if treffer:
+                eintrag['messmodus'] = treffer.group(1)
+                continue
+            treffer = re.search(r' - Durchmesserzyklen: \[(.*)\]', zeile)
+            if treffer and eintrag['zyklen_durchmesser'] is None:
+                eintrag['zyklen_durchmesser'] = [float(d) for d in treffer.group(1).split(',') if d.strip()]
+    return eintrag
+
+
+def spalte_lesen(messordner, name, feld, spalte):
+    """
+    Zeitpunkte und Werte einer Messgroesse aus <name>.npy (ohne Kopie) oder <name>.txt. None, falls nicht vorhanden.
+    """
+    npy = messordner / f'{name}.npy'
+    txt = messordner / f'{name}.txt'
+    try:
+        if npy.exists():
+            daten = np.load(npy, mmap_mode='r')
+            return daten['zeitpunkt'], daten[feld]
+        if txt.exists():
+            df = pd.read_csv(txt, sep=';', usecols=['Zeitpunkt Messung', spalte])
+            werte = df[spalte]
+            if not pd.api.types.is_numeric_dtype(werte):
+                werte = pd.to_numeric(werte.str.replace(',', '.'))   # aeltere Dateien mit Dezimalkomma
+            return pd.to_datetime(df['Zeitpunkt Messung']).to_numpy(), werte.to_numpy()
+    except (ValueError, KeyError, OSError) as e:
+        logging.getLogger('./').warning(f'Katalog: {name} in {messordner} kann nicht gelesen werden:\n{e}')
+    return None
+
+
+class Katalog:
+    def __init__(self, datei='./Messungen/Katalog.sqlite', archiv='./Messungen/'):
+        self.datei = str(datei)
+        self.archiv = Path(archiv)
+        self.logger = logging.getLogger('./')
+        Path(self.datei).parent.mkdir(parents=True, exist_ok=True)
+        self.verbindung = sqlite3.connect(self.datei)
+        self.verbindung.row_factory = sqlite3.Row
+        self.verbindung.execute('PRAGMA foreign_keys = ON')
+        self.verbindung.executescript(SCHEMA)
+
+
+    def schliessen(self):
+        self.verbindung.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.schliessen()
+
+
+    @staticmethod
+    def signatur(messordner):
+        """
+        Groesse und Aenderungszeitpunkt aller Dateien des Ordners (aendert sich, sobald eine Datei hinzukommt oder sich aendert).
+        """
+        dateien = sorted((datei.name, datei.stat().st_size, datei.stat().st_mtime_ns) for datei in messordner.iterdir() if datei.is_file())
+        return json.dumps(dateien)
+
+
+    def aktualisieren(self):
+        """
+        Liest neue und geaenderte Messungen des Archivs ein und entfernt geloeschte. Gibt (neu eingelesen, unveraendert,
+        entfernt) zurueck.
+        """
+        bekannt = {zeile['ordner']: zeile['signatur'] for zeile in self.verbindung.execute('SELECT ordner, signatur FROM messungen')}
+        vorhanden = set()
+        eingelesen = 0
+        for messordner in sorted(self.archiv.iterdir()) if self.archiv.exists() else []:
+            try:
+                datetime.strptime(messordner.name, ORDNERFORMAT)
+            except ValueError:
+                continue   # kein Ordner einer Messung (z.B. die Datenbank selbst)
+            if not messordner.is_dir():
+                continue
+            vorhanden.add(messordner.name)
+            signatur = self.signatur(messordner)
+            if bekannt.get(messordner.name) == signatur:
+                continue
+            self.einlesen(messordner, signatur)
+            eingelesen += 1
+
+        entfernt = [ordner for ordner in bekannt if ordner not in vorhanden]
+        with self.verbindung:
+            self.verbindung.executemany('DELETE FROM messungen WHERE ordner = ?', [(ordner,) for ordner in entfernt])
+        return eingelesen, len(vorhanden) - eingelesen, len(entfernt)
+
+
+    def einlesen(self, messordner, signatur=None):
+        eintrag = log_auswerten(messordner / 'Log.txt')
+        zyklen = eintrag['zyklen_durchmesser'] or []
+        eintrag['ordner'] = messordner.name
+        eintrag['start'] = datetime.strptime(messordner.name, ORDNERFORMAT).isoformat(sep=' ')
+        eintrag['zyklen_durchmesser'] = json.dumps(zyklen)
+        eintrag['anzahl_zyklen'] = len(zyklen)
+        eintrag['dateien'] = ','.join(name for name in DATEIEN if (messordner / name).exists())
+        eintrag['signatur'] = signatur or self.signatur(messordner)
+        eintrag['indiziert'] = datetime.now().isoformat(sep=' ', timespec='seconds')
+
+        eintrag['anzahl_druck'] = eintrag['anzahl_durchmesser'] = 0
+        eintrag['druck_max'] = eintrag['durchmesser_max'] = eintrag['dauer'] = None
+        dauer = []
+        for name, feld, spalte in (('Druck', 'druck', 'Druck / mbar'), ('Durchmesser', 'durchmesser', 'Durchmesser / mm')):
+            messung = spalte_lesen(messordner, name, feld, spalte)
+            if messung is None or len(messung[0]) == 0:
+                continue
+            zeitpunkte, werte = messung
+            eintrag[f'anzahl_{feld}'] = len(werte)
+            eintrag[f'{feld}_max'] = float(np.nanmax(werte)) if not np.all(np.isnan(werte)) else None
+            dauer.append((zeitpunkte.max() - zeitpunkte.min()) / np.timedelta64(1, 's'))
+        if dauer:
+            eintrag['dauer'] = float(max(dauer))
+
+        spalten = list(eintrag)
+        with self.verbindung:
+            self.verbindung.execute(f'INSERT OR REPLACE INTO messungen ({", ".join(spalten)}) VALUES ({", ".join("?"*len(spalten))})',
+                                    [eintrag[spalte] for spalte in spalten])
+            self.verbindung.execute('DELETE FROM zyklen WHERE ordner = ?', (messordner.name,))
+            self.verbindung.executemany('INSERT INTO zyklen (ordner, zyklus, durchmesser) VALUES (?, ?, ?)',
+                                        [(messordner.name, i, d) for i, d in enumerate(zyklen)])
+
+
+    def suchen(self, von=None, bis=None, durchmesser=None, druck_min=None, durchmesser_min=None, messmodus=None, datei=None):
+        """
+        Messungen, die alle angegebenen Bedingungen erfuellen (sqlite3.Row, aufsteigend nach Start):
+        von/bis: Startzeitpunkt (datetime oder 'JJJJ-MM-TT[ hh:mm:ss]', ein Datum ohne Uhrzeit bei bis einschliesslich
+        des ganzen Tages), durchmesser: mindestens ein Zyklus mit diesem
+        Solldurchmesser in mm, druck_min/durchmesser_min: mindestens dieser max. Druck bzw. max. Durchmesser,
+        messmodus: Messmodus des Durchmessers, datei: Datei muss vorhanden sein (z.B. 'Video.avi').
+        """
+        bedingungen = []
+        parameter = []
+        if von is not None:
+            bedingungen.append('start >= ?')
+            parameter.append(str(von))
+        if bis is not None:
+            if isinstance(bis, str) and len(bis.strip()) == 10:
+                bis = date.fromisoformat(bis.strip())
+            if isinstance(bis, date) and not isinstance(bis, datetime):
+                # Nur ein Datum: alle Messungen, die an diesem Tag starten
+                bedingungen.append('start < ?')
+                parameter.append(str(bis + timedelta(days=1)))
+            else:
+                bedingungen.append('start <= ?')
+                parameter.append(str(bis))
+        if durchmesser is not None:
+            bedingungen.append('ordner IN (SELECT ordner FROM zyklen WHERE abs(durchmesser - ?) < 1e-6)')
+            parameter.append(float(durchmesser))
+        if druck_min is not None:
+            bedingungen.append('druck_max >= ?')
+            parameter.append(float(druck_min))
+        if durchmesser_min is not None:
+            bedingungen.append('durchmesser_max >= ?')
+            parameter.append(float(durchmesser_min))
+        if messmodus is not None:
+            bedingungen.append('messmodus = ?')
+            parameter.append(messmodus)
+        if datei is not None:
+            bedingungen.append("(',' || dateien || ',') LIKE ?")
+            parameter.append(f'%,{datei},%')
+        sql = 'SELECT * FROM messungen'
+        if bedingungen:
+            sql += ' WHERE ' + ' AND '.join(bedingungen)
+        return self.abfrage(sql + ' ORDER BY start', parameter)
+
+
+    def abfrage(self, sql, parameter=()):
+        """
+        Beliebige SQL-Abfrage auf den Tabellen 'messungen' und 'zyklen'.
+        """
+        return self.verbindung.execute(sql, parameter).fetchall()
+
+
+    def messordner(self, zeile):
+        """
+        Pfad zum Ordner einer gefundenen Messung.
+        """
+        return self.archiv / zeile['ordner']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Katalog der Messungen aktualisieren und durchsuchen.')
+    parser.add_argument('--archiv', default='./Messungen/', help='Ordner mit den Messungen')
+    parser.add_argument('--datenbank', help='SQLite-Datei (Standard: Katalog.sqlite im Archiv)')
+    parser.add_argument('--nicht-aktualisieren', action='store_true', help='nur suchen, Archiv nicht einlesen')
+    parser.add_argument('--von', help='Start ab (JJJJ-MM-TT[ hh:mm:ss])')
+    parser.add_argument('--bis', help='Start bis (JJJJ-MM-TT[ hh:mm:ss])')
+    parser.add_argument('--durchmesser', type=float, help='Solldurchmesser eines Zyklus / mm')
+    parser.add_argument('--druck-min', type=float, help='mindestens dieser max. Druck / mbar')
+    parser.add_argument('--durchmesser-min', type=float, help='mindestens dieser max. Durchmesser / mm')
+    parser.add_argument('--messmodus')
+    parser.add_argument('--datei', help='Datei muss vorhanden sein, z.B. Video.avi')
+    parser.add_argument('--sql', help='eigene SQL-Abfrage statt der Suchkriterien')
+    args = parser.parse_args()
+
+    datenbank = args.datenbank or Path(args.archiv) / 'Katalog.sqlite'
+    with Katalog(datenbank, args.archiv) as katalog:
+        if not args.nicht_aktualisieren:
+            t0 = time.perf_counter()
+            eingelesen, unveraendert, entfernt = katalog.aktualisieren()
+            print(f'Katalog aktualisiert: {eingelesen} eingelesen, {unveraendert} unveraendert, {entfernt} entfernt '
+                  f'({time.perf_counter()-t0:.2f} s)')
+
+        t0 = time.perf_counter()
+        if args.sql:
+            zeilen = katalog.abfrage(args.sql)
+        else:
+            zeilen = katalog.suchen(args.von, args.bis, args.durchmesser, args.druck_min, args.durchmesser_min, args.messmodus, args.datei)
+        dauer = time.perf_counter() - t0
+
+        if zeilen:
+            spalten = zeilen[0].keys()
+            if not args.sql:
+                spalten = ['ordner', 'zyklen_durchmesser', 'anzahl_druck', 'anzahl_durchmesser', 'druck_max', 'durchmesser_max', 'dauer']
+            print(pd.DataFrame([[zeile[spalte] for spalte in spalten] for zeile in zeilen], columns=spalten).to_string(index=False))
+        print(f'{len(zeilen)} Messungen gefunden ({dauer*1000:.1f} ms)')
+
+
+if __name__ == '__main__':
+    main()
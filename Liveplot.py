@@ -0,0 +1,168 @@
+"""
+Live-Plot der Messwerte waehrend einer Messung mit konstantem Aufwand je Bild.
+
+Die Messwerte werden beim Anhaengen (vektorisiert, blockweise) auf hoechstens 'max_punkte' Punkte reduziert:
+Je Abschnitt von 'faktor' Messwerten bleiben Minimum und Maximum in zeitlicher Reihenfolge erhalten, Spitzen gehen
+also nicht verloren (MinMaxDezimierung). Ist der vorab angelegte Puffer voll, werden je zwei Abschnitte zusammengefasst
+und der Faktor verdoppelt (amortisiert O(1) je Messwert). Gezeichnet wird per QTimer im festen Takt und nur, wenn
+neue Messwerte vorliegen (Liveplot.zeichnen); die Kurve zeichnet nur den sichtbaren Bereich (clip to view).
+Der Aufwand je Bild haengt damit nur von 'max_punkte' ab, nicht von der Dauer der Messung.
+"""
+
+import numpy as np
+import pyqtgraph as pg
+
+
+class MinMaxDezimierung:
+    def __init__(self, max_punkte=2000):
+        self.max_abschnitte = max_punkte // 2
+
+        # Abgeschlossene Abschnitte: Zeitpunkt und Wert von Minimum und Maximum
+        self.x_min = np.empty(self.max_abschnitte)
+        self.y_min = np.empty(self.max_abschnitte)
+        self.x_max = np.empty(self.max_abschnitte)
+        self.y_max = np.empty(self.max_abschnitte)
+
+        # Ausgabe (je Abschnitt zwei Punkte, dazu der angefangene Abschnitt)
+        self.x = np.empty(2*self.max_abschnitte + 2)
+        self.y = np.empty(2*self.max_abschnitte + 2)
+        self.leeren()
+
+
+    def leeren(self):
+        self.abschnitte = 0
+        self.faktor = 1   # Messwerte je Abschnitt
+        self.teil = None  # angefangener Abschnitt: [Anzahl, x_min, y_min, x_max, y_max]
+        self.anzahl = 0
+        self.geaendert = True
+
+
+    def anhaengen(self, x, y):
+        """
+        Haengt einen Messwert oder einen Block von Messwerten an (x aufsteigend).
+        """
+        x = np.atleast_1d(np.asarray(x, dtype=np.float64))
+        y = np.atleast_1d(np.asarray(y, dtype=np.float64))
+        if len(x) == 0:
+            return
+        self.anzahl += len(x)
+        self.geaendert = True
+
+        # Zuerst den angefangenen Abschnitt auffuellen
+        i = 0
+        if self.teil is not None:
+            i = min(self.faktor - self.teil[0], len(x))
+            self.teil_erweitern(x[:i], y[:i])
+            if self.teil[0] >= self.faktor:
+                _, x_min, y_min, x_max, y_max = self.teil
+                self.teil = None
+                self.abschnitte_anhaengen(np.array([x_min]), np.array([y_min]), np.array([x_max]), np.array([y_max]))
+
+        # Ganze Abschnitte auf einmal
+        f = self.faktor
+        k = (len(x) - i) // f
+        if k > 0:
+            xs = x[i:i+k*f].reshape(k, f)
+            ys = y[i:i+k*f].reshape(k, f)
+            zeilen = np.arange(k)
+            i_min = ys.argmin(axis=1)
+            i_max = ys.argmax(axis=1)
+            self.abschnitte_anhaengen(xs[zeilen, i_min], ys[zeilen, i_min], xs[zeilen, i_max], ys[zeilen, i_max])
+            i += k*f
+
+        # Rest als angefangener Abschnitt
+        if i < len(x):
+            self.teil_erweitern(x[i:], y[i:])
+
+
+    def teil_erweitern(self, x, y):
+        if len(x) == 0:
+            return
+        i_min = y.argmin()
+        i_max = y.argmax()
+        if self.teil is None:
+            self.teil = [len(x), x[i_min], y[i_min], x[i_max], y[i_max]]
+            return
+        self.teil[0] += len(x)
+        if y[i_min] < self.teil[2]:
+            self.teil[1:3] = x[i_min], y[i_min]
+        if y[i_max] > self.teil[4]:
+            self.teil[3:5] = x[i_max], y[i_max]
+
+
+    def abschnitte_anhaengen(self, x_min, y_min, x_max, y_max):
+        n = self.abschnitte
+        if n + len(x_min) <= self.max_abschnitte:
+            self.x_min[n:n+len(x_min)] = x_min
+            self.y_min[n:n+len(x_min)] = y_min
+            self.x_max[n:n+len(x_min)] = x_max
+            self.y_max[n:n+len(x_min)] = y_max
+            self.abschnitte += len(x_min)
+            return
+
+        # Puffer voll: je zwei Abschnitte zusammenfassen, bis alles hineinpasst
+        x_min = np.concatenate((self.x_min[:n], x_min))
+        y_min = np.concatenate((self.y_min[:n], y_min))
+        x_max = np.concatenate((self.x_max[:n], x_max))
+        y_max = np.concatenate((self.y_max[:n], y_max))
+        while len(x_min) > self.max_abschnitte:
+            if len(x_min) % 2:
+                # Ungerade Anzahl: den letzten Abschnitt verdoppeln, er bleibt beim Zusammenfassen unveraendert
+                x_min, y_min, x_max, y_max = (np.append(a, a[-1]) for a in (x_min, y_min, x_max, y_max))
+            links = y_min[0::2] <= y_min[1::2]
+            x_min = np.where(links, x_min[0::2], x_min[1::2])
+            y_min = np.where(links, y_min[0::2], y_min[1::2])
+            links = y_max[0::2] >= y_max[1::2]
+            x_max = np.where(links, x_max[0::2], x_max[1::2])
+            y_max = np.where(links, y_max[0::2], y_max[1::2])
+            self.faktor *= 2
+        n = len(x_min)
+        self.x_min[:n], self.y_min[:n], self.x_max[:n], self.y_max[:n] = x_min, y_min, x_max, y_max
+        self.abschnitte = n
+
+
+    def punkte(self):
+        """
+        Minimum und Maximum je Abschnitt in zeitlicher Reihenfolge (Ansichten auf den vorab angelegten Puffer).
+        """
+        n = self.abschnitte
+        vorher = self.x_min[:n] <= self.x_max[:n]
+        self.x[0:2*n:2] = np.where(vorher, self.x_min[:n], self.x_max[:n])
+        self.x[1:2*n:2] = np.where(vorher, self.x_max[:n], self.x_min[:n])
+        self.y[0:2*n:2] = np.where(vorher, self.y_min[:n], self.y_max[:n])
+        self.y[1:2*n:2] = np.where(vorher, self.y_max[:n], self.y_min[:n])
+        if self.teil is not None:
+            _, x_min, y_min, x_max, y_max = self.teil
+            if x_min > x_max:
+                x_min, y_min, x_max, y_max = x_max, y_max, x_min, y_min
+            self.x[2*n:2*n+2] = x_min, x_max
+            self.y[2*n:2*n+2] = y_min, y_max
+            n += 1
+        return self.x[:2*n], self.y[:2*n]
+
+
+class Liveplot:
+    def __init__(self, plotitem, farbe=(0, 86, 148), max_punkte=2000):
+        self.dezimierung = MinMaxDezimierung(max_punkte)
+        self.kurve = plotitem.plot(pen=pg.mkPen(farbe, width=2))
+        self.kurve.setClipToView(True)
+
+
+    def anhaengen(self, x, y):
+        self.dezimierung.anhaengen(x, y)
+
+
+    def zeichnen(self):
+        """
+        Neue Messwerte zeichnen (fuer den Timer der GUI, ohne neue Messwerte passiert nichts).
+        """
+        if not self.dezimierung.geaendert:
+            return
+        self.dezimierung.geaendert = False
+        x, y = self.dezimierung.punkte()
+        self.kurve.setData(x, y)
+
+
+    def leeren(self):
+        self.dezimierung.leeren()
+        self.zeichnen()
@@ -0,0 +1,285 @@
+"""
+Laufende Aufzeichnung der Messwerte waehrend einer Messung (Druck.npy und Durchmesser.npy im Ordner der Messung).
+
+Die Messwerte werden nicht erst am Ende der Messung geschrieben, sondern in einem eigenen Thread blockweise an eine
+Datei angehaengt (sobald 'blockgroesse' Messwerte vorliegen, spaetestens aber nach 'max_alter' Sekunden). Nach jedem
+Block werden die Datei mit os.fsync auf die Festplatte geschrieben und die Anzahl der Messwerte im Kopf der Datei
+nachgefuehrt. Die Datei ist damit jederzeit eine gueltige .npy-Datei (strukturiertes Array, kann mit
+np.load(..., mmap_mode='r') ohne Kopie geoeffnet werden); nach einem Absturz oder Stromausfall fehlen hoechstens die
+Messwerte seit dem letzten Block.
+
+Am Ende der Messung werden daraus Druck.txt und Durchmesser.txt im bisherigen Format erzeugt (ebenfalls im Thread).
+Nach einem Abbruch stellt der Aufruf als Skript die Dateien einer Messung wieder her:
+
+    python Messdatenaufzeichnung.py ./Messungen/2023_03_17__11_12_12/
+
+Das gleiche Format (ein Feld je Spalte, siehe FELDER) wird auch fuer Auswertung.npy verwendet. laden() oeffnet die
+Dateien fuer die Auswertungsskripte ohne Kopie (zu einer .txt wird die .npy beim ersten Oeffnen erzeugt, danach ist das
+Oeffnen unabhaengig von der Dauer der Messung sofort moeglich). Umwandlung aelterer Messungen in beide Richtungen:
+
+    python Messdatenaufzeichnung.py ./Messungen/2023_03_17__11_12_12/ --nach-npy
+    python Messdatenaufzeichnung.py ./Messungen/2023_03_17__11_12_12/ --ueberschreiben
+"""
+
+import argparse
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+
+# Format der Dateien (Zeitpunkte wie in der GUI als lokale Zeit ohne Zeitzone) und Spaltennamen der .txt-Dateien
+FELDER = {'zeitpunkt': '<M8[us]', 'druck': '<f8', 'durchmesser': '<f8', 'zyklus': '<i4', 'versuchslaufzeit': '<f8',
+          'druck_geglaettet': '<f8', 'durchmesser_geglaettet': '<f8'}
+SPALTEN = {'zeitpunkt': 'Zeitpunkt Messung', 'druck': 'Druck / mbar', 'durchmesser': 'Durchmesser / mm', 'zyklus': 'Zyklus',
+           'versuchslaufzeit': 'Versuchslaufzeit / s', 'druck_geglaettet': 'Druck (geglaettet) / mbar',
+           'durchmesser_geglaettet': 'Durchmesser (geglaettet) / mm'}
+DTYPE_DRUCK = np.dtype([(feld, FELDER[feld]) for feld in ('zeitpunkt', 'druck')])
+DTYPE_DURCHMESSER = np.dtype([(feld, FELDER[feld]) for feld in ('zeitpunkt', 'durchmesser', 'zyklus')])
+
+# Der Kopf der .npy-Datei hat eine feste Laenge, damit die Anzahl der Messwerte ueberschrieben werden kann
+LAENGE_KOPF = 256
+_MAGIC = b'\x93NUMPY\x01\x00'
+
+
+def kopf_erzeugen(dtype, anzahl, laenge=LAENGE_KOPF):
+    kopf = repr({'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (anzahl,)})
+    if len(kopf) >= laenge - len(_MAGIC) - 2:
+        raise ValueError(f'Kopf der .npy-Datei laenger als {laenge} Bytes')
+    kopf = kopf.ljust(laenge - len(_MAGIC) - 2 - 1) + '\n'
+    return _MAGIC + len(kopf).to_bytes(2, 'little') + kopf.encode('latin1')
+
+
+def wiederherstellen(datei):
+    """
+    Schneidet eine (z.B. nach einem Absturz) unvollstaendige Datei auf die Anzahl der Messwerte im Kopf ab. Gibt die
+    Anzahl zurueck. Der Kopf wird erst nach dem fsync der Messwerte nachgefuehrt und ist daher verlaesslich, das Ende der
+    Datei dagegen nicht (nach einem Stromausfall z.B. mit Nullen gefuellt, Zeitpunkt 1970-01-01).
+    """
+    with open(datei, 'r+b') as f:
+        np.lib.format.read_magic(f)
+        anzahl, _, dtype = np.lib.format.read_array_header_1_0(f)
+        anzahl = anzahl[0]
+        anfang = f.tell()
+        daten = os.fstat(f.fileno()).st_size - anfang
+
+        # Mehr Messwerte als in der Datei stehen kann der Kopf nur bei einer beschaedigten Datei angeben
+        if anzahl*dtype.itemsize > daten:
+            anzahl = daten // dtype.itemsize
+            f.seek(0)
+            f.write(kopf_erzeugen(dtype, anzahl, anfang))
+        f.truncate(anfang + anzahl*dtype.itemsize)
+    return anzahl
+
+
+def als_txt(datei, outfile):
+    """
+    Schreibt eine .npy-Datei im bisherigen Format (Druck.txt, Durchmesser.txt bzw. Auswertung.txt).
+    """
+    daten = np.load(datei, mmap_mode='r')
+    df = pd.DataFrame({SPALTEN[name]: daten[name] for name in daten.dtype.names})
+    df.to_csv(outfile, sep=';', encoding='utf-8', index=False, header=True)
+
+    # Die .npy bleibt die neuere Datei, damit laden() sie nicht erneut aus der .txt erzeugt
+    os.utime(datei)
+    return len(df)
+
+
+def tabelle_speichern(df, outfile):
+    """
+    Speichert die bekannten Spalten (siehe SPALTEN) eines DataFrames als .npy-Datei.
+    """
+    felder = [feld for feld, spalte in SPALTEN.items() if spalte in df]
+    daten = np.empty(len(df), dtype=[(feld, FELDER[feld]) for feld in felder])
+    for feld in felder:
+        spalte = df[SPALTEN[feld]]
+        if feld == 'zyklus':
+            spalte = spalte.fillna(-1)   # z.B. nach merge_asof ohne Durchmesser
+        daten[feld] = spalte.to_numpy()
+
+    # Erst vollstaendig schreiben, dann umbenennen (eine vorhandene Datei ist nie halb ueberschrieben)
+    tmpfile = f'{outfile}.tmp'
+    with open(tmpfile, 'wb') as f:
+        np.save(f, daten)
+    os.replace(tmpfile, outfile)
+    return len(daten)
+
+
+def als_npy(datei, outfile):
+    """
+    Wandelt Druck.txt, Durchmesser.txt oder Auswertung.txt in eine .npy-Datei um.
+    Aeltere Dateien mit Dezimalkomma werden ebenfalls gelesen.
+    """
+    df = pd.read_csv(datei, sep=';', header=0)
+    for spalte in df:
+        if spalte == SPALTEN['zeitpunkt']:
+            df[spalte] = pd.to_datetime(df[spalte])
+        elif not pd.api.types.is_numeric_dtype(df[spalte]):
+            df[spalte] = pd.to_numeric(df[spalte].str.replace(',', '.'))
+    return tabelle_speichern(df, outfile)
+
+
+def laden(datei):
+    """
+    Oeffnet Druck, Durchmesser oder Auswertung einer Messung als strukturiertes Array ohne Kopie (np.memmap,
+    Felder siehe FELDER). datei: .npy oder .txt (die .npy daneben wird erzeugt, falls sie fehlt oder aelter ist).
+    """
+    datei = Path(datei)
+    npy = datei.with_suffix('.npy')
+    if datei.suffix != '.npy' and (not npy.exists() or npy.stat().st_mtime < datei.stat().st_mtime):
+        als_npy(datei, npy)
+    return np.load(npy, mmap_mode='r')
+
+
+class Messdatenaufzeichnung:
+    def __init__(self, datei, dtype, blockgroesse=1000, max_alter=2.0):
+        self.datei = str(datei)
+        self.dtype = np.dtype(dtype)
+        self.blockgroesse = blockgroesse
+        self.max_alter = max_alter   # s
+        self.warteschlange = queue.Queue()   # unbegrenzt, Messwerte werden nie verworfen
+        self.outfile_txt = None
+        self.logger = logging.getLogger('./')
+
+        # Zaehler fuer Diagnosezwecke
+        self.angenommen = 0
+        self.geschrieben = 0
+        self.bloecke = 0
+        self.fehler = False
+
+        self.thread = threading.Thread(target=self.schreiben, name=f'Messdatenaufzeichnung {Path(self.datei).name}', daemon=True)
+        self.thread.start()
+
+
+    def anhaengen(self, *spalten):
+        """
+        Uebergibt Messwerte an den Schreib-Thread, ohne zu warten. Je Feld von dtype ein Wert oder ein Array
+        (Zeitpunkte als datetime oder datetime64).
+        """
+        block = np.empty(len(np.atleast_1d(spalten[0])), dtype=self.dtype)
+        for name, spalte in zip(self.dtype.names, spalten):
+            block[name] = spalte
+        self.warteschlange.put(block)
+        self.angenommen += len(block)
+
+
+    def beenden(self, outfile_txt=None):
+        """
+        Schreibt die restlichen Messwerte, schliesst die Datei und erzeugt anschliessend outfile_txt (falls angegeben).
+        Wartet nicht darauf, siehe warten().
+        """
+        self.outfile_txt = outfile_txt
+        self.warteschlange.put(None)
+
+
+    def warten(self, timeout=None):
+        self.thread.join(timeout)
+        return not self.thread.is_alive()
+
+
+    def schreiben(self):
+        try:
+            f = open(self.datei, 'wb')
+        except OSError as e:
+            self.logger.error(f'Messdatenaufzeichnung: {self.datei} kann nicht geschrieben werden:\n{e}')
+            self.fehler = True
+            f = None
+
+        bloecke = []
+        anzahl = 0
+        t_aeltester = None
+        ende = False
+        while not ende:
+            try:
+                timeout = None if t_aeltester is None else max(0.0, t_aeltester + self.max_alter - time.monotonic())
+                block = self.warteschlange.get(timeout=timeout)
+                if block is None:
+                    ende = True
+                else:
+                    bloecke.append(block)
+                    anzahl += len(block)
+                    t_aeltester = t_aeltester or time.monotonic()
+            except queue.Empty:
+                pass
+
+            if bloecke and (ende or anzahl >= self.blockgroesse or time.monotonic() - t_aeltester >= self.max_alter):
+                if f is not None and not self.fehler:
+                    self.block_schreiben(f, np.concatenate(bloecke))
+                bloecke = []
+                anzahl = 0
+                t_aeltester = None
+
+        if f is None:
+            return
+        if self.geschrieben == 0:
+            self.block_schreiben(f, np.empty(0, dtype=self.dtype))   # leere, aber gueltige Datei
+        f.close()
+
+        if self.outfile_txt is not None:
+            try:
+                als_txt(self.datei, self.outfile_txt)
+            except Exception as e:
+                self.logger.error(f'Messdatenaufzeichnung: {self.outfile_txt} konnte nicht erzeugt werden:\n{e}')
+                self.fehler = True
+
+
+    def block_schreiben(self, f, block):
+        try:
+            # Erst die Messwerte, dann die Anzahl im Kopf (so passt der Kopf nie zu mehr Messwerten, als in der Datei stehen)
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                f.write(kopf_erzeugen(self.dtype, 0))
+            f.write(block.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+            f.seek(0)
+            f.write(kopf_erzeugen(self.dtype, self.geschrieben + len(block)))
+            f.flush()
+            os.fsync(f.fileno())
+        except OSError as e:
+            self.logger.error(f'Messdatenaufzeichnung: Fehler beim Schreiben von {self.datei}:\n{e}')
+            self.fehler = True
+            return
+        self.geschrieben += len(block)
+        self.bloecke += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Druck.txt und Durchmesser.txt einer abgebrochenen Messung aus Druck.npy '
+                                                 'und Durchmesser.npy wiederherstellen bzw. .txt-Dateien in .npy umwandeln.')
+    parser.add_argument('messordner', help='Ordner der Messung')
+    parser.add_argument('--ueberschreiben', action='store_true', help='vorhandene .txt-Dateien ueberschreiben')
+    parser.add_argument('--nach-npy', action='store_true', help='Druck.txt, Durchmesser.txt und Auswertung.txt in .npy umwandeln')
+    args = parser.parse_args()
+
+    messordner = Path(args.messordner)
+    if args.nach_npy:
+        for name in ('Druck', 'Durchmesser', 'Auswertung'):
+            datei = messordner / f'{name}.txt'
+            if datei.exists():
+                anzahl = als_npy(datei, datei.with_suffix('.npy'))
+                print(f'{anzahl} Zeilen aus {datei} in {datei.with_suffix(".npy")} gespeichert.')
+        return
+
+    for name in ('Druck', 'Durchmesser', 'Auswertung'):
+        datei = messordner / f'{name}.npy'
+        outfile = messordner / f'{name}.txt'
+        if not datei.exists():
+            if name != 'Auswertung':
+                print(f'{datei} nicht vorhanden.')
+            continue
+        if outfile.exists() and not args.ueberschreiben:
+            print(f'{outfile} bereits vorhanden (--ueberschreiben).')
+            continue
+        if name != 'Auswertung':
+            wiederherstellen(datei)   # nur Druck.npy und Durchmesser.npy werden waehrend der Messung geschrieben
+        anzahl = als_txt(datei, outfile)
+        print(f'{anzahl} Zeilen aus {datei} in {outfile} gespeichert.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""
+Nachauswertung einer Messung mit geaenderten Einstellungen der Bildverarbeitung.
+
+Aus dem aufgezeichneten Video der Messung (Video.avi und Video_Zeitstempel.txt, siehe Videoaufzeichnung.py) wird der
+Durchmesser neu bestimmt (Segmentierung und Massstab aus dem Aruco-Marker wie in der App), z.B. mit anderen HSV-Grenzen
+oder einem anderen Messmodus. Das Video wird dazu in Abschnitte aufgeteilt, die parallel in eigenen Prozessen
+ausgewertet werden. Jeder Prozess springt an den Anfang seines Abschnitts und beginnt mit einer eigenen Bildverarbeitung
+(Suchfenster und Massstab werden je Abschnitt neu bestimmt, der Marker wird im ersten Bild gesucht).
+
+Wie in der App wird der Durchmesser fuer jedes (ausgewertete) Bild des Videos gespeichert.
+Das Ergebnis hat das Format von Durchmesser.txt (Zeitpunkt der Aufnahme, Durchmesser, Zyklus aus der urspruenglichen
+Durchmesser.txt) und wird standardmaessig als Durchmesser_Nachauswertung.txt im Ordner der Messung gespeichert.
+
+Nicht angegebene Einstellungen werden aus Log.txt der Messung uebernommen (sonst aus values.ini), z.B.:
+
+    python Nachauswertung.py ./Messungen/2023_03_17__11_12_12/ --hsv-min 30 60 40 --messmodus kanten
+    python Nachauswertung.py ./Messungen/2023_03_17__11_12_12/ --prozesse 4 --ausgabe Durchmesser.txt
+"""
+
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import cv2
+import numpy as np
+import pandas as pd
+import Bildverarbeitung
+from Benchmark_Durchmesser import parameter_laden
+from Kamerakalibrierung import Kamerakalibrierung
+
+
+def einstellungen_aus_log(datei, parameter):
+    """
+    Uebernimmt HSV-Grenzen, min. Flaeche und Messmodus aus Log.txt einer Messung (soweit vorhanden).
+    Gibt den Messmodus zurueck (None, falls nicht im Log).
+    """
+    messmodus = None
+    if not Path(datei).exists():
+        return messmodus
+    with open(datei, encoding='utf-8', errors='replace') as f:
+        for zeile in f:
+            treffer = re.search(r' - ([HSV]) = \[(\d+), (\d+)\]', zeile)
+            if treffer:
+                i = 'HSV'.index(treffer.group(1))
+                parameter['hsv_min'][i] = int(treffer.group(2))
+                parameter['hsv_max'][i] = int(treffer.group(3))
+                continue
+            treffer = re.search(r' - min\. Area = (\d+)', zeile)
+            if treffer:
+                parameter['min_area'] = int(treffer.group(1))
+                continue
+            treffer = re.search(r' - Messmodus Durchmesser = (\w+)', zeile)
+            if treffer:
+                messmodus = treffer.group(1)
+    return messmodus
+
+
+def abschnitte_aufteilen(anzahl, prozesse, min_laenge=100):
+    """
+    Teilt die Bilder 0..anzahl-1 in Abschnitte (start, ende) auf. Mehrere Abschnitte je Prozess gleichen
+    unterschiedliche Rechenzeiten aus, zu kurze Abschnitte kosten dagegen die Suche im ganzen Bild und den Sprung im Video.
+    """
+    laenge = max(min_laenge, int(np.ceil(anzahl/(4*prozesse))))
+    return [(start, min(start+laenge, anzahl)) for start in range(0, anzahl, laenge)]
+
+
+def prozess_starten():
+    # Die Prozesse laufen bereits parallel, OpenCV soll nicht zusaetzlich Threads starten
+    cv2.setNumThreads(1)
+
+
+def abschnitt_auswerten(video, start, ende, zeitpunkte, parameter, messmodus, kamerakalibrierung):
+    """
+    Wertet die Bilder start..ende-1 des Videos aus (zeitpunkte: Aufnahmezeitpunkte dieser Bilder in s).
+    Gibt (Videobild, Durchmesser / mm) je gemessenem Durchmesser und die Anzahl der gelesenen Bilder zurueck.
+    """
+    cap = cv2.VideoCapture(video)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != start:
+        # Springen nicht moeglich, Bilder bis zum Anfang des Abschnitts ueberlesen
+        cap.release()
+        cap = cv2.VideoCapture(video)
+        for _ in range(start):
+            cap.grab()
+
+    bildverarbeitung = Bildverarbeitung.Bildverarbeitung(messmodus=messmodus, kamerakalibrierung=kamerakalibrierung)
+    videobilder = []
+    durchmesser = []
+    gelesen = 0
+    for i in range(start, ende):
+        ret, img = cap.read()
+        if not ret:
+            break
+        gelesen += 1
+        ergebnis = bildverarbeitung.verarbeiten(img, parameter, t=zeitpunkte[i-start])
+        for d in ergebnis.durchmesser:
+            videobilder.append(i)
+            durchmesser.append(d)
+    cap.release()
+    return np.array(videobilder, dtype=np.int64), np.array(durchmesser, dtype=np.float64), gelesen
+
+
+def nachauswerten(messordner, parameter, messmodus='kontur', kamerakalibrierung=None, prozesse=None):
+    """
+    Bestimmt den Durchmesser aus dem Video der Messung neu. Gibt ein DataFrame im Format von Durchmesser.txt,
+    die Anzahl der ausgewerteten Bilder und die Dauer des Videos in s zurueck.
+    """
+    messordner = Path(messordner)
+    video = str(messordner / 'Video.avi')
+    df_zeitstempel = pd.read_csv(messordner / 'Video_Zeitstempel.txt', sep=';')
+    # Aeltere Aufzeichnungen lassen bei vollen Sekunden die Mikrosekunden weg (gemischtes Format)
+    df_zeitstempel['Zeitpunkt Aufnahme'] = pd.to_datetime(df_zeitstempel['Zeitpunkt Aufnahme'], format='ISO8601')
+    cap = cv2.VideoCapture(video)
+    if not cap.isOpened():
+        raise FileNotFoundError(f'{video} kann nicht gelesen werden.')
+    anzahl = min(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), len(df_zeitstempel))
+    cap.release()
+
+    zeitpunkte = df_zeitstempel['Zeitpunkt Aufnahme'].to_numpy()
+    sekunden = (zeitpunkte - zeitpunkte[0]) / np.timedelta64(1, 's')
+
+    prozesse = prozesse or os.cpu_count()
+    videobilder = []
+    durchmesser = []
+    gelesen = 0
+    with ProcessPoolExecutor(max_workers=prozesse, initializer=prozess_starten) as executor:
+        futures = [executor.submit(abschnitt_auswerten, video, start, ende, sekunden[start:ende], parameter, messmodus, kamerakalibrierung)
+                   for start, ende in abschnitte_aufteilen(anzahl, prozesse)]
+        for future in futures:
+            b, d, n = future.result()
+            videobilder.append(b)
+            durchmesser.append(d)
+            gelesen += n
+
+    videobilder = np.concatenate(videobilder)
+    df_durchmesser = pd.DataFrame({'Zeitpunkt Messung': zeitpunkte[videobilder], 'Durchmesser / mm': np.concatenate(durchmesser)})
+
+    # Zyklus aus der urspruenglichen Durchmessermessung (naechster Messwert)
+    df_zyklus = None
+    if (messordner / 'Durchmesser.txt').exists():
+        df_zyklus = pd.read_csv(messordner / 'Durchmesser.txt', sep=';', parse_dates=['Zeitpunkt Messung'])[['Zeitpunkt Messung', 'Zyklus']]
+    if df_zyklus is not None and len(df_zyklus) > 0 and len(df_durchmesser) > 0:
+        df_durchmesser = pd.merge_asof(df_durchmesser, df_zyklus.sort_values('Zeitpunkt Messung'), on='Zeitpunkt Messung', direction='nearest')
+    else:
+        df_durchmesser['Zyklus'] = -1
+    return df_durchmesser, gelesen, sekunden[anzahl-1] if anzahl > 0 else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Durchmesser einer Messung aus dem aufgezeichneten Video neu bestimmen.')
+    parser.add_argument('messordner', help='Ordner der Messung mit Video.avi und Video_Zeitstempel.txt')
+    parser.add_argument('--hsv-min', type=int, nargs=3, metavar=('H', 'S', 'V'))
+    parser.add_argument('--hsv-max', type=int, nargs=3, metavar=('H', 'S', 'V'))
+    parser.add_argument('--min-area', type=int)
+    parser.add_argument('--messmodus', choices=Bildverarbeitung.MESSMODI)
+    parser.add_argument('--kamera', help='Name der Kamerakalibrierung (siehe Kamerakalibrierung.py)')
+    parser.add_argument('--prozesse', type=int, default=os.cpu_count(), help='Anzahl der parallelen Prozesse')
+    parser.add_argument('--ausgabe', default='Durchmesser_Nachauswertung.txt', help='Dateiname im Ordner der Messung')
+    parser.add_argument('--values', default='./values.ini', help='values.ini fuer Einstellungen, die nicht in Log.txt stehen')
+    args = parser.parse_args()
+
+    messordner = Path(args.messordner)
+    parameter = parameter_laden(args.values)
+    messmodus = einstellungen_aus_log(messordner / 'Log.txt', parameter) or 'kontur'
+    if args.hsv_min is not None:
+        parameter['hsv_min'] = args.hsv_min
+    if args.hsv_max is not None:
+        parameter['hsv_max'] = args.hsv_max
+    if args.min_area is not None:
+        parameter['min_area'] = args.min_area
+    messmodus = args.messmodus or messmodus
+    kamerakalibrierung = Kamerakalibrierung.laden(args.kamera) if args.kamera else None
+
+    print(f'HSV {parameter["hsv_min"]} - {parameter["hsv_max"]}, min. Flaeche {parameter["min_area"]}, Messmodus {messmodus}, '
+          f'{args.prozesse} Prozesse')
+    t0 = time.perf_counter()
+    df_durchmesser, bilder, dauer = nachauswerten(messordner, parameter, messmodus, kamerakalibrierung, args.prozesse)
+    rechenzeit = time.perf_counter() - t0
+    print(f'{bilder} Bilder ({dauer:.1f} s Video) in {rechenzeit:.1f} s ausgewertet ({bilder/rechenzeit:.0f} Bilder/s, '
+          f'{dauer/rechenzeit:.1f}-fache Echtzeit), {len(df_durchmesser)} Durchmesser gemessen.')
+
+    outfile = messordner / args.ausgabe
+    df_durchmesser.to_csv(outfile, sep=';', encoding='utf-8', index=False, header=True)
+    print(f'Speichere Durchmessermessung unter {outfile} ab.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+"""
+Binaeres Paketprotokoll zwischen dem Pi Pico (pi_pico/serial_read/main.py) und Worker_Druck.
+
+Der Pico sendet Pakete fester Groesse (PAKET_GROESSE Bytes, little endian):
+
+    sync     u16              SYNC (0x55AA), zum Wiederfinden des Paketanfangs
+    seq      u16              fortlaufende Paketnummer (laeuft bei 65535 ueber)
+    anzahl   u16              Anzahl gueltiger Messwerte im Paket (<= MAX_WERTE)
+    werte    u16[MAX_WERTE]   read_u16()-Rohwerte, unbenutzte Eintraege sind 0
+    zeiten   u32[MAX_WERTE]   ticks_us() des Pico zum jeweiligen Messwert (laeuft bei TICKS_PERIODE ueber)
+    crc      u16              CRC-16/CCITT (Startwert 0xFFFF) ueber seq, anzahl, werte und zeiten
+
+Ventilbefehle des Hosts (befehl_erzeugen): 'o<nr>\n' (oeffnen) bzw. 'c<nr>\n' (schliessen) mit einer Befehlsnummer
+0..65535. Der Pico schaltet das Ventil sofort beim Buchstaben und quittiert nach dem Zeilenende mit einem
+Quittungspaket (QUITTUNG_GROESSE Bytes) zwischen den Messwertpaketen:
+
+    sync     u16              SYNC_QUITTUNG (0x55AB)
+    nr       u16              Befehlsnummer
+    befehl   u8               ord('o') bzw. ord('c')
+    ventil   u8               Zustand des Ventils nach dem Befehl (1: offen)
+    zeit     u32              ticks_us() des Pico beim Schalten
+    crc      u16              CRC-16/CCITT ueber nr, befehl, ventil und zeit
+Ein einzelnes 'o' bzw. 'c' ohne Nummer schaltet weiterhin ohne Quittung.
+
+Auf Host-Seite werden alle vollstaendig empfangenen Pakete mit numpy.frombuffer auf einmal entpackt.
+Fehlende Paketnummern werden als verlorene Pakete gezaehlt, Pakete mit falscher CRC verworfen.
+Die Zeitstempel des Pico werden mit Uhrsynchronisation auf die Uhr des Hosts abgebildet.
+"""
+
+import binascii
+import re
+import struct
+from collections import deque
+import numpy as np
+
+
+SYNC = 0x55AA
+SYNC_BYTES = struct.pack('<H', SYNC)
+MAX_WERTE = 32
+TICKS_PERIODE = 2**30   # Ueberlaufperiode von utime.ticks_us() auf dem RP2040
+
+PAKET_DTYPE = np.dtype([('sync', '<u2'),
+                        ('seq', '<u2'),
+                        ('anzahl', '<u2'),
+                        ('werte', '<u2', (MAX_WERTE,)),
+                        ('zeiten', '<u4', (MAX_WERTE,)),
+                        ('crc', '<u2')])
+PAKET_GROESSE = PAKET_DTYPE.itemsize
+
+SYNC_QUITTUNG = 0x55AB
+SYNC_QUITTUNG_BYTES = struct.pack('<H', SYNC_QUITTUNG)
+QUITTUNG_DTYPE = np.dtype([('sync', '<u2'),
+                           ('nr', '<u2'),
+                           ('befehl', 'u1'),
+                           ('ventil', 'u1'),
+                           ('zeit', '<u4'),
+                           ('crc', '<u2')])
+QUITTUNG_GROESSE = QUITTUNG_DTYPE.itemsize
+
+# Anfang eines Messwert- oder Quittungspakets
+_SYNC_MUSTER = re.compile(re.escape(SYNC_BYTES) + b'|' + re.escape(SYNC_QUITTUNG_BYTES))
+
+
+def crc16(daten):
+    """
+    CRC-16/CCITT mit Startwert 0xFFFF (identisch zur Implementierung in der Pico-Firmware).
+    """
+    return binascii.crc_hqx(daten, 0xFFFF)
+
+
+def paket_erzeugen(seq, werte, zeiten):
+    """
+    Erzeugt ein Paket aus einer Paketnummer, bis zu MAX_WERTE Rohwerten und deren Zeitstempeln in us.
+    (Gegenstueck zur Firmware, z.B. fuer Tests oder einen simulierten Pico)
+    """
+    werte = np.asarray(werte, dtype='<u2')
+    zeiten = np.asarray(zeiten, dtype=np.int64) % TICKS_PERIODE
+    if len(werte) > MAX_WERTE:
+        raise ValueError(f'Ein Paket kann maximal {MAX_WERTE} Werte enthalten.')
+    if len(zeiten) != len(werte):
+        raise ValueError('Zu jedem Messwert muss genau ein Zeitstempel angegeben werden.')
+
+    paket = np.zeros(1, dtype=PAKET_DTYPE)
+    paket['sync'] = SYNC
+    paket['seq'] = seq & 0xFFFF
+    paket['anzahl'] = len(werte)
+    paket['werte'][0, :len(werte)] = werte
+    paket['zeiten'][0, :len(zeiten)] = zeiten
+    daten = bytearray(paket.tobytes())
+    struct.pack_into('<H', daten, PAKET_GROESSE-2, crc16(daten[2:-2]))
+    return bytes(daten)
+
+
+def befehl_erzeugen(befehl, nr):
+    """
+    Ventilbefehl b'o' bzw. b'c' mit Befehlsnummer, die der Pico quittiert.
+    """
+    return befehl + f'{nr & 0xFFFF}\n'.encode()
+
+
+def quittung_erzeugen(nr, befehl, ventil, zeit_us):
+    """
+    Erzeugt ein Quittungspaket (Gegenstueck zur Firmware, z.B. fuer einen simulierten Pico).
+    """
+    daten = bytearray(struct.pack('<HHBBIH', SYNC_QUITTUNG, nr & 0xFFFF, ord(befehl), int(ventil), int(zeit_us) % TICKS_PERIODE, 0))
+    struct.pack_into('<H', daten, QUITTUNG_GROESSE-2, crc16(daten[2:-2]))
+    return bytes(daten)
+
+
+class Paketdecoder:
+    """
+    Sammelt die von der seriellen Schnittstelle gelesenen Bytes und entpackt daraus die Messwerte.
+    """
+
+    def __init__(self):
+        self.puffer = bytearray()
+        self.letzte_seq = None
+        self.letzte_zeit = None   # letzter (entfalteter) Zeitstempel in us
+
+        # Zaehler fuer Diagnosezwecke
+        self.pakete = 0
+        self.verlorene_pakete = 0
+        self.crc_fehler = 0
+        self.verworfene_bytes = 0
+
+        # Empfangene Quittungen (Befehlsnummer, Befehl, Ventil offen, Zeitstempel des Pico in us ohne Ueberlaeufe),
+        # werden mit quittungen_abholen() geleert
+        self.quittungen = []
+
+
+    def verarbeiten(self, daten):
+        """
+        Haengt 'daten' an den Puffer an und gibt die Rohwerte aller vollstaendigen, gueltigen Pakete
+        in Empfangsreihenfolge als numpy-Array (uint16) zurueck, zusammen mit den zugehoerigen
+        Zeitstempeln des Pico in us (int64, ohne Ueberlaeufe).
+        """
+        self.puffer += daten
+        bloecke = []
+        zeiten = []
+
+        while True:
+            # Auf den naechsten Paketanfang synchronisieren
+            treffer = _SYNC_MUSTER.search(self.puffer)
+            if treffer is None:
+                # Ein einzelnes Byte am Ende koennte der Beginn des naechsten Sync-Wortes sein
+                rest = 1 if self.puffer[-1:] in (SYNC_BYTES[:1], SYNC_QUITTUNG_BYTES[:1]) else 0
+                self.verworfene_bytes += len(self.puffer) - rest
+                del self.puffer[:len(self.puffer)-rest]
+                break
+            start = treffer.start()
+            if start > 0:
+                self.verworfene_bytes += start
+                del self.puffer[:start]
+
+            if self.puffer[:2] == SYNC_QUITTUNG_BYTES:
+                if len(self.puffer) < QUITTUNG_GROESSE:
+                    break
+                self._quittung_entnehmen()
+                continue
+
+            anzahl_pakete = len(self.puffer) // PAKET_GROESSE
+            if anzahl_pakete == 0:
+                break
+
+            # Alle vollstaendigen Pakete auf einmal entpacken
+            # (Kopie per bytes(), da der bytearray-Puffer anschliessend verkleinert wird)
+            rohdaten = bytes(self.puffer[:anzahl_pakete*PAKET_GROESSE])
+            pakete = np.frombuffer(rohdaten, dtype=PAKET_DTYPE)
+            crc = np.fromiter((crc16(rohdaten[i*PAKET_GROESSE+2:(i+1)*PAKET_GROESSE-2]) for i in range(anzahl_pakete)),
+                              dtype=np.uint16, count=anzahl_pakete)
+            gueltig = (pakete['sync'] == SYNC) & (pakete['crc'] == crc) & (pakete['anzahl'] <= MAX_WERTE)
+
+            # Nur die zusammenhaengend gueltigen Pakete am Anfang uebernehmen
+            k = anzahl_pakete if gueltig.all() else int(np.argmin(gueltig))
+            if k > 0:
+                werte, t = self._werte_entnehmen(pakete[:k])
+                bloecke.append(werte)
+                zeiten.append(t)
+                del self.puffer[:k*PAKET_GROESSE]
+
+            if k < anzahl_pakete and self.puffer[:2] != SYNC_QUITTUNG_BYTES:
+                # Ungueltiges Paket (keine Quittung zwischen den Paketen): Sync-Wort ueberspringen und neu synchronisieren
+                self.crc_fehler += 1
+                self.verworfene_bytes += len(SYNC_BYTES)
+                del self.puffer[:len(SYNC_BYTES)]
+
+        if bloecke:
+            return np.concatenate(bloecke), np.concatenate(zeiten)
+        return np.empty(0, dtype=np.uint16), np.empty(0, dtype=np.int64)
+
+
+    def _quittung_entnehmen(self):
+        rohdaten = bytes(self.puffer[:QUITTUNG_GROESSE])
+        quittung = np.frombuffer(rohdaten, dtype=QUITTUNG_DTYPE)[0]
+        if quittung['crc'] != crc16(rohdaten[2:-2]):
+            self.crc_fehler += 1
+            self.verworfene_bytes += len(SYNC_QUITTUNG_BYTES)
+            del self.puffer[:len(SYNC_QUITTUNG_BYTES)]
+            return
+        del self.puffer[:QUITTUNG_GROESSE]
+
+        # Zeitstempel relativ zum letzten Messwert entfalten (die Quittung kann etwas vor oder nach diesem liegen)
+        zeit = int(quittung['zeit'])
+        if self.letzte_zeit is not None:
+            zeit = self.letzte_zeit + (zeit - self.letzte_zeit + TICKS_PERIODE//2) % TICKS_PERIODE - TICKS_PERIODE//2
+        self.quittungen.append((int(quittung['nr']), bytes([quittung['befehl']]), bool(quittung['ventil']), zeit))
+
+
+    def quittungen_abholen(self):
+        quittungen = self.quittungen
+        self.quittungen = []
+        return quittungen
+
+
+    def _werte_entnehmen(self, pakete):
+        seq = pakete['seq'].astype(np.int64)
+
+        # Luecken in den Paketnummern zaehlen (inkl. Ueberlauf bei 65535)
+        if self.letzte_seq is not None:
+            seq_folge = np.concatenate(([self.letzte_seq], seq))
+        else:
+            seq_folge = seq
+        self.verlorene_pakete += int(((np.diff(seq_folge) - 1) % 65536).sum())
+        self.letzte_seq = int(seq[-1])
+        self.pakete += len(pakete)
+
+        # Nur die gueltigen Eintraege (Index < anzahl) jedes Pakets uebernehmen
+        maske = np.arange(MAX_WERTE) < pakete['anzahl'][:, None]
+        werte = pakete['werte'][maske]
+        zeiten = pakete['zeiten'][maske].astype(np.int64)
+        if len(zeiten) == 0:
+            return werte, zeiten
+
+        # Ueberlaeufe von ticks_us() entfernen (Voraussetzung: Luecken < TICKS_PERIODE, also ca. 18 min)
+        if self.letzte_zeit is None:
+            self.letzte_zeit = int(zeiten[0])
+        schritte = np.diff(np.concatenate(([self.letzte_zeit % TICKS_PERIODE], zeiten))) % TICKS_PERIODE
+        zeiten = self.letzte_zeit + np.cumsum(schritte)
+        self.letzte_zeit = int(zeiten[-1])
+        return werte, zeiten
+
+
+class Uhrsynchronisation:
+    """
+    Online-Schaetzung von Versatz und Drift zwischen der Uhr des Pico und der Uhr des Hosts.
+
+    Fuer jeden Lesevorgang wird der Zeitstempel des zuletzt gemessenen Wertes (Pico) zusammen mit dem
+    Empfangszeitpunkt (Host) uebergeben. Die Differenz besteht aus Versatz + Drift*t und einer stets
+    positiven, schwankenden Uebertragungsverzoegerung (USB-Pufferung, GIL, ...).
+    Daher wird das Fenster der letzten Beobachtungen in Abschnitte geteilt und nur die Beobachtung mit
+    der kleinsten Differenz je Abschnitt fuer die Geradenanpassung verwendet (untere Einhuellende).
+    Der verbleibende Versatz entspricht der minimalen Uebertragungsverzoegerung.
+    """
+
+    def __init__(self, fenster=1024, abschnitte=16):
+        self.beobachtungen = deque(maxlen=fenster)
+        self.abschnitte = abschnitte
+        self.t0_geraet = None
+        self.versatz = None   # s
+        self.drift = 0.0      # s/s
+
+
+    def beobachtung(self, t_geraet, t_host):
+        """
+        t_geraet: Zeitstempel des Pico in s, t_host: Empfangszeitpunkt in s (z.B. time.time())
+        """
+        if self.t0_geraet is None:
+            self.t0_geraet = t_geraet
+        self.beobachtungen.append((t_geraet - self.t0_geraet, t_host - t_geraet))
+
+        b = np.array(self.beobachtungen)
+        if len(b) < 2*self.abschnitte:
+            self.versatz = b[:, 1].min()
+            self.drift = 0.0
+            return
+
+        # Minimum je Abschnitt bestimmen und Gerade durch diese Punkte legen
+        grenzen = np.linspace(0, len(b), self.abschnitte+1).astype(int)
+        idx = [i0 + np.argmin(b[i0:i1, 1]) for i0, i1 in zip(grenzen[:-1], grenzen[1:])]
+        self.drift, self.versatz = np.polyfit(b[idx, 0], b[idx, 1], 1)
+
+
+    def host_zeit(self, t_geraet):
+        """
+        Bildet Zeitstempel des Pico (s, Skalar oder numpy-Array) auf die Uhr des Hosts ab.
+        """
+        return t_geraet + self.versatz + self.drift*(t_geraet - self.t0_geraet)
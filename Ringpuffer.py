@@ -0,0 +1,220 @@
+"""
+Puffer fuer die Uebergabe von Daten zwischen Threads.
+
+Ringpuffer: Messwerte, die in einem Thread erzeugt (z.B. Worker_Druck) und in einem anderen Thread
+blockweise abgeholt werden (z.B. per QTimer in der GUI).
+Die Werte liegen spaltenweise in einem vorab angelegten numpy-Array. Die Sperre wird nur fuer das Kopieren
+eines Blocks gehalten. Ist der Puffer voll, werden die aeltesten, noch nicht gelesenen Werte ueberschrieben
+und als verworfen gezaehlt.
+
+Postfach: genau ein Platz, der neueste Inhalt gewinnt (z.B. Kamerabilder). Ist der Empfaenger langsamer als
+der Absender, werden nicht abgeholte Inhalte ueberschrieben und gezaehlt, der Speicherbedarf bleibt konstant.
+
+Letzter_Wert: der neueste Messwert mit Zeitpunkt, der (anders als beim Postfach) beliebig oft gelesen werden kann
+(z.B. Druck und Durchmesser fuer die Ventilsteuerung).
+
+Messreihe: alle Messwerte einer Messung spaltenweise in wachsenden numpy-Arrays (nur fuer einen Thread, z.B. die GUI).
+Zeitpunkte als int64 in ns seit Epoche (zeitpunkte_ns, lokalzeit). Beim Anhaengen wird die Kapazitaet bei Bedarf
+verdoppelt (amortisiert O(1) je Messwert), die Spalten werden ohne Kopie als Ansicht zurueckgegeben.
+"""
+
+import threading
+import time
+import numpy as np
+
+
+def zeitpunkte_ns(t):
+    """
+    Zeitpunkte in s seit Epoche (float) -> int64 in ns seit Epoche.
+    """
+    return np.round(np.asarray(t, dtype=np.float64)*1e9).astype(np.int64)
+
+
+def lokalzeit(t_ns):
+    """
+    Zeitpunkte in ns seit Epoche -> datetime64[ns] in lokaler Zeit ohne Zeitzone (wie datetime.fromtimestamp).
+    """
+    t_ns = np.asarray(t_ns, dtype=np.int64)
+    if t_ns.size == 0:
+        return t_ns.astype('datetime64[ns]')
+    versatz = [time.localtime(t_ns.flat[i] // 10**9).tm_gmtoff for i in (0, -1)]
+    if versatz[0] == versatz[1]:
+        versatz = versatz[0]
+    else:
+        # Zeitumstellung innerhalb der Zeitpunkte: Versatz je Zeitpunkt bestimmen
+        versatz = np.array([time.localtime(t // 10**9).tm_gmtoff for t in t_ns.flat]).reshape(t_ns.shape)
+    return (t_ns + np.asarray(versatz, dtype=np.int64)*10**9).astype('datetime64[ns]')
+
+
+class Ringpuffer:
+    def __init__(self, kapazitaet, spalten=2, dtype=np.float64):
+        self.kapazitaet = kapazitaet
+        self.daten = np.zeros((kapazitaet, spalten), dtype=dtype)
+        self.sperre = threading.Lock()
+
+        # fortlaufende Positionen (nicht modulo kapazitaet)
+        self.geschrieben = 0
+        self.gelesen = 0
+
+        # Zaehler fuer Diagnosezwecke
+        self.erzeugt = 0
+        self.verbraucht = 0
+        self.verworfen = 0
+
+
+    def __len__(self):
+        return self.geschrieben - self.gelesen
+
+
+    def schreiben(self, *spalten):
+        """
+        Haengt einen Block an, je Spalte ein Array gleicher Laenge.
+        """
+        block = np.column_stack(spalten)
+        n_gesamt = len(block)
+
+        # Von einem zu grossen Block passen nur die neuesten Werte in den Puffer
+        block = block[-self.kapazitaet:]
+        n = len(block)
+
+        with self.sperre:
+            start = (self.geschrieben + n_gesamt - n) % self.kapazitaet
+            ende = min(start + n, self.kapazitaet)
+            self.daten[start:ende] = block[:ende-start]
+            self.daten[:n-(ende-start)] = block[ende-start:]
+            self.geschrieben += n_gesamt
+            self.erzeugt += n_gesamt
+
+            # Ueberschriebene, noch nicht gelesene Werte verwerfen
+            ueberlauf = self.geschrieben - self.gelesen - self.kapazitaet
+            if ueberlauf > 0:
+                self.gelesen += ueberlauf
+                self.verworfen += ueberlauf
+
+
+    def lesen(self):
+        """
+        Gibt alle noch nicht gelesenen Werte als Kopie zurueck (je Spalte ein Array).
+        """
+        with self.sperre:
+            n = self.geschrieben - self.gelesen
+            start = self.gelesen % self.kapazitaet
+            ende = min(start + n, self.kapazitaet)
+            block = np.concatenate((self.daten[start:ende], self.daten[:n-(ende-start)]))
+            self.gelesen += n
+            self.verbraucht += n
+        return tuple(block.T)
+
+
+class Postfach:
+    def __init__(self):
+        self.bedingung = threading.Condition()
+        self.inhalt = None
+        self.neu = False
+
+        # Zaehler fuer Diagnosezwecke
+        self.abgelegt = 0
+        self.abgeholt = 0
+        self.ueberschrieben = 0
+
+
+    def ablegen(self, inhalt):
+        """
+        Legt 'inhalt' ab und gibt zurueck, ob dabei ein noch nicht abgeholter Inhalt ueberschrieben wurde.
+        """
+        with self.bedingung:
+            ueberschrieben = self.neu
+            if ueberschrieben:
+                self.ueberschrieben += 1
+            self.inhalt = inhalt
+            self.neu = True
+            self.abgelegt += 1
+            self.bedingung.notify()
+        return ueberschrieben
+
+
+    def abholen(self, timeout=0):
+        """
+        Gibt den neuesten, noch nicht abgeholten Inhalt zurueck oder None, falls innerhalb von 'timeout'
+        Sekunden (None: unbegrenzt) nichts abgelegt wurde.
+        """
+        with self.bedingung:
+            if timeout != 0:
+                self.bedingung.wait_for(lambda: self.neu, timeout)
+            if not self.neu:
+                return None
+            inhalt = self.inhalt
+            self.inhalt = None
+            self.neu = False
+            self.abgeholt += 1
+        return inhalt
+
+
+class Letzter_Wert:
+    def __init__(self):
+        # (Zeitpunkt, Wert, Nummer) oder None, solange noch kein Wert gesetzt wurde.
+        # Der Eintrag wird als Ganzes ersetzt, daher ist keine Sperre notwendig (nur ein schreibender Thread).
+        self.eintrag = None
+        self.nummer = 0
+
+
+    def setzen(self, zeitpunkt, wert):
+        """
+        Setzt den neuesten Wert. Die fortlaufende Nummer zeigt dem Leser, ob seit dem letzten Lesen ein neuer Wert kam.
+        """
+        self.nummer += 1
+        self.eintrag = (zeitpunkt, wert, self.nummer)
+
+
+    def lesen(self):
+        return self.eintrag
+
+
+class Messreihe:
+    def __init__(self, spalten, kapazitaet=1024):
+        """
+        spalten: {Name: dtype}, z.B. {'zeitpunkt': np.int64, 'druck': np.float64}
+        """
+        self.daten = {name: np.empty(kapazitaet, dtype=dtype) for name, dtype in spalten.items()}
+        self.anzahl = 0
+
+
+    def __len__(self):
+        return self.anzahl
+
+
+    def __getitem__(self, name):
+        """
+        Ansicht (keine Kopie) der bisherigen Werte einer Spalte. Gueltig bis zum naechsten Anhaengen.
+        """
+        return self.daten[name][:self.anzahl]
+
+
+    @property
+    def kapazitaet(self):
+        return len(next(iter(self.daten.values())))
+
+
+    @property
+    def nbytes(self):
+        return sum(spalte.nbytes for spalte in self.daten.values())
+
+
+    def anhaengen(self, **werte):
+        """
+        Haengt je Spalte einen Wert oder ein Array gleicher Laenge an.
+        """
+        n = len(np.atleast_1d(next(iter(werte.values()))))
+        if self.anzahl + n > self.kapazitaet:
+            kapazitaet = max(2*self.kapazitaet, self.anzahl + n)
+            for name, spalte in self.daten.items():
+                neu = np.empty(kapazitaet, dtype=spalte.dtype)
+                neu[:self.anzahl] = spalte[:self.anzahl]
+                self.daten[name] = neu
+        for name, wert in werte.items():
+            self.daten[name][self.anzahl:self.anzahl+n] = wert
+        self.anzahl += n
+
+
+    def leeren(self):
+        self.anzahl = 0
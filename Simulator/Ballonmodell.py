@@ -0,0 +1,65 @@
+"""
+Einfaches Modell eines Luftballons am Pruefstand.
+
+Bei geoeffnetem Magnetventil stroemt ein konstanter Volumenstrom in den Ballon, bei geschlossenem Ventil
+entweicht die Luft ueber eine Drossel (Volumenstrom ~ Wurzel des Drucks).
+Der Druck folgt aus dem Radius mit dem Gent-Materialmodell fuer eine duennwandige Kugel
+(wie calc_p_gent in Auswertung_tkinter.py), inkl. des typischen Druckmaximums bei kleinen Streckungen.
+"""
+
+import numpy as np
+
+
+class Ballonmodell:
+    def __init__(self, r0=25, t0=0.2, mu=0.7, Jm=70, zufluss=0.15, drossel=0.3):
+        self.r0 = r0                # Anfangsradius / mm
+        self.t0 = t0                # Anfangsdicke / mm
+        self.mu = mu                # Schubmodul / MPa
+        self.Jm = Jm                # Grenzwert der Gent-Streckung
+        self.zufluss = zufluss      # Volumenstrom bei geoeffnetem Ventil / (l/s)
+        self.drossel = drossel      # Ausfluss bei geschlossenem Ventil / (l/s/sqrt(mbar))
+
+        self.ventil_offen = False
+        self.volumen = self.volumen_aus_radius(r0)
+
+
+    @staticmethod
+    def volumen_aus_radius(r):
+        return 4/3*np.pi*(r/100)**3   # l (r in mm -> dm)
+
+
+    @property
+    def radius(self):
+        return 100*(3*self.volumen/(4*np.pi))**(1/3)
+
+
+    @property
+    def durchmesser(self):
+        return 2*self.radius
+
+
+    @property
+    def druck(self):
+        """
+        Druck in mbar nach dem Gent-Modell (Kesselformel fuer die duennwandige Kugel).
+        """
+        lmb = max(self.radius/self.r0, 1.0)
+        I1 = 2*lmb**2 + 1/lmb**4
+        sig_11 = (lmb**2 - 1/lmb**4) * self.mu*self.Jm/(self.Jm-I1+3)
+        t = self.t0/lmb**2
+        return sig_11*2*t/self.radius * 10000
+
+
+    def schritt(self, dt):
+        """
+        Fuehrt einen Zeitschritt dt (s) aus.
+        """
+        if self.ventil_offen:
+            self.volumen += self.zufluss*dt
+        else:
+            self.volumen -= self.drossel*np.sqrt(max(self.druck, 0))*dt
+            self.volumen = max(self.volumen, self.volumen_aus_radius(self.r0))
+
+        # Ballon platzt nicht, sondern bleibt kurz vor der Gent-Grenzstreckung stehen
+        lmb_max = 0.99*np.sqrt((self.Jm+3)/2)
+        self.volumen = min(self.volumen, self.volumen_aus_radius(lmb_max*self.r0))
@@ -0,0 +1,129 @@
+"""
+Ersatz fuer cv2.VideoCapture, um die Bildverarbeitung ohne Webcam zu betreiben.
+
+- quelle == 'sim':  Es wird ein gruener Ballon vor grauem Hintergrund samt Aruco-Marker (50mm, DICT_4X4_50, ID 42)
+                    gezeichnet. Der Durchmesser kommt per UDP vom Virtueller_Pico (Ballonmodell), ohne diesen
+                    schwingt er langsam zwischen 60mm und 200mm.
+- sonst:            Die Videodatei 'quelle' wird in Endlosschleife mit ihrer eigenen Bildrate wiedergegeben.
+
+Mit fps=0 werden die Bilder so schnell wie moeglich geliefert (Lasttest).
+"""
+
+import socket
+import struct
+import time
+import cv2
+import numpy as np
+from Simulator import UDP_PORT
+
+
+class Virtuelle_Kamera:
+    def __init__(self, quelle='sim', fps=None, massstab=2.0, udp_port=UDP_PORT):
+        self.quelle = quelle
+        self.width = 1280
+        self.height = 720
+        self.massstab = massstab   # Pixel je mm
+        self.offen = True
+
+        if quelle == 'sim':
+            self.cap = None
+            self.fps = 30 if fps is None else fps
+            self.durchmesser = None
+            self.t0 = time.monotonic()
+            self.hintergrund = None
+
+            # Durchmesser des Ballonmodells empfangen (nicht blockierend, es zaehlt nur das neueste Datagramm)
+            self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.udp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.udp.bind(('127.0.0.1', udp_port))
+            self.udp.setblocking(False)
+        else:
+            self.cap = cv2.VideoCapture(quelle)
+            self.offen = self.cap.isOpened()
+            self.fps = (self.cap.get(cv2.CAP_PROP_FPS) or 30) if fps is None else fps
+
+        self.t_naechstes_bild = time.monotonic()
+
+
+    def isOpened(self):
+        return self.offen
+
+
+    def set(self, prop, wert):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            self.width = int(wert)
+            self.hintergrund = None
+        elif prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            self.height = int(wert)
+            self.hintergrund = None
+        return True
+
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if self.cap is not None:
+            return self.cap.get(prop)
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        return 0
+
+
+    def read(self):
+        # Bildrate einhalten
+        if self.fps > 0:
+            warten = self.t_naechstes_bild - time.monotonic()
+            if warten > 0:
+                time.sleep(warten)
+            self.t_naechstes_bild = max(self.t_naechstes_bild + 1/self.fps, time.monotonic() - 1/self.fps)
+
+        if self.cap is not None:
+            ret, img = self.cap.read()
+            if not ret:
+                # Ende der Datei -> von vorne beginnen
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ret, img = self.cap.read()
+            return ret, img
+
+        return True, self.bild_zeichnen()
+
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+        else:
+            self.udp.close()
+        self.offen = False
+
+
+    def durchmesser_empfangen(self):
+        try:
+            while True:
+                daten = self.udp.recv(16)
+                _, self.durchmesser = struct.unpack('<dd', daten)
+        except (BlockingIOError, OSError):
+            pass
+
+        if self.durchmesser is None:
+            t = time.monotonic() - self.t0
+            return 130 - 70*np.cos(2*np.pi*t/20)
+        return self.durchmesser
+
+
+    def bild_zeichnen(self):
+        if self.hintergrund is None:
+            # Hintergrund mit Aruco-Marker (50mm Kantenlaenge zzgl. weissem Rand) einmalig erzeugen
+            self.hintergrund = np.full((self.height, self.width, 3), 200, dtype=np.uint8)
+            seite = int(50*self.massstab)
+            rand = seite // 8
+            marker = cv2.aruco.generateImageMarker(cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_50), 42, seite)
+            x0, y0 = self.width//16, self.height//16
+            self.hintergrund[y0-rand:y0+seite+rand, x0-rand:x0+seite+rand] = 255
+            self.hintergrund[y0:y0+seite, x0:x0+seite] = marker[:, :, None]
+
+        img = self.hintergrund.copy()
+        r = int(self.durchmesser_empfangen()/2*self.massstab)
+        cv2.circle(img, (self.width*5//8, self.height//2), r, (40, 160, 40), -1, cv2.LINE_AA)
+        return img
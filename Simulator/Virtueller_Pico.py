@@ -0,0 +1,169 @@
+"""
+Virtueller Pi Pico an einer Pseudo-Schnittstelle (pty, nur Linux/macOS).
+
+Der virtuelle Pico sendet die Druckmesswerte im binaeren Paketprotokoll (Pico_Protokoll.py) wie die Firmware
+in pi_pico/serial_read/main.py und versteht deren Befehle ('o', 'c', 'r<n>\\n', 'd<n>\\n') inkl. der quittierten
+Ventilbefehle ('o<n>\\n', 'c<n>\\n').
+Die Druecke werden entweder mit dem Ballonmodell erzeugt (das Magnetventil wirkt auf das Modell)
+oder aus einer aufgezeichneten Druck.txt wiedergegeben (Endlosschleife, Ventilbefehle werden nur protokolliert).
+Der aktuelle Durchmesser des Modells wird per UDP an die Virtuelle_Kamera gesendet.
+
+Aufruf (aus dem Hauptordner des Repos):
+    python -m Simulator.Virtueller_Pico [--rate 1000] [--druckdatei Messungen/.../Druck.txt]
+"""
+
+import argparse
+import os
+import select
+import socket
+import struct
+import time
+import numpy as np
+import pandas as pd
+import Kalibrierung
+import Pico_Protokoll
+from Simulator import UDP_PORT
+from Simulator.Ballonmodell import Ballonmodell
+
+
+SENDEINTERVALL = 0.1        # s, spaetestens nach dieser Zeit wird ein Paket gesendet (wie in der Firmware)
+
+
+class Virtueller_Pico:
+    def __init__(self, abtastrate=100, druckdatei=None, rauschen=20, udp_port=UDP_PORT):
+        self.abtastrate = abtastrate
+        self.dezimierung = 16
+        self.rauschen = rauschen    # Standardabweichung des ADC-Rauschens in Rohwerten
+
+        # Pseudo-Schnittstelle anlegen, die App oeffnet die Gegenseite (self.port) mit pyserial
+        # (die eigene Gegenseite bleibt geoeffnet, damit Lesen/Schreiben am Master ohne verbundene App nicht fehlschlaegt)
+        import tty   # nur Linux/macOS, daher erst hier (das Paket Simulator wird auch unter Windows importiert)
+        self.fd, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        os.set_blocking(self.fd, False)
+
+        self.modell = Ballonmodell()
+        self.kalibrierung = Kalibrierung.Druckkalibrierung.standard()
+        self.rng = np.random.default_rng()
+
+        # Aufgezeichnete Druecke (Zeit in s, Druck in mbar), falls eine Druck.txt wiedergegeben werden soll
+        self.aufzeichnung = None
+        if druckdatei:
+            df = pd.read_csv(druckdatei, sep=';', decimal='.', header=0, parse_dates=['Zeitpunkt Messung'])
+            t = (df['Zeitpunkt Messung'] - df['Zeitpunkt Messung'][0]).dt.total_seconds().to_numpy()
+            self.aufzeichnung = (t, df['Druck / mbar'].astype(float).to_numpy())
+
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp_ziel = ('127.0.0.1', udp_port)
+
+        self.befehl = ''
+        self.t_geschaltet = 0.0
+        self.seq = 0
+        self.t0 = time.monotonic()
+        self.t_naechster = 0.0   # Zeitpunkt (s seit t0) des naechsten zu erzeugenden Messwerts
+
+
+    def befehle_lesen(self):
+        try:
+            daten = os.read(self.fd, 1024).decode(errors='ignore')
+        except (BlockingIOError, OSError):
+            return
+
+        for ch in daten:
+            if ch in 'oc':
+                self.modell.ventil_offen = (ch == 'o')
+                self.t_geschaltet = time.monotonic() - self.t0
+                self.befehl = ch
+                print('Ventil offen' if ch == 'o' else 'Ventil geschlossen')
+            elif ch in 'rd':
+                self.befehl = ch
+            elif self.befehl and ch.isdigit():
+                self.befehl += ch
+            elif self.befehl and ch == '\n' and self.befehl[0] in 'oc':
+                # Quittung mit Befehlsnummer und Zeitpunkt des Schaltens
+                if len(self.befehl) > 1:
+                    quittung = Pico_Protokoll.quittung_erzeugen(int(self.befehl[1:]), self.befehl[0].encode(), self.modell.ventil_offen,
+                                                                int(self.t_geschaltet*1e6))
+                    try:
+                        os.write(self.fd, quittung)
+                    except (BlockingIOError, OSError):
+                        pass
+                self.befehl = ''
+            elif self.befehl and ch == '\n':
+                wert = int(self.befehl[1:] or 0)
+                if wert > 0:
+                    if self.befehl[0] == 'r':
+                        self.abtastrate = wert
+                    else:
+                        self.dezimierung = wert
+                    print(f'Abtastrate {self.abtastrate} Hz, Dezimierung {self.dezimierung}')
+                self.befehl = ''
+            else:
+                self.befehl = ''
+
+
+    def druecke_erzeugen(self, zeiten):
+        """
+        Druecke in mbar zu den Zeitpunkten 'zeiten' (s seit Start).
+        """
+        if self.aufzeichnung is not None:
+            t, p = self.aufzeichnung
+            return np.interp(zeiten % t[-1], t, p)
+
+        druecke = np.empty(len(zeiten))
+        for i in range(len(zeiten)):
+            self.modell.schritt(1/self.abtastrate)
+            druecke[i] = self.modell.druck
+        return druecke
+
+
+    def starten(self):
+        print(f'Virtueller Pi Pico an {self.port} (Abtastrate {self.abtastrate} Hz)')
+
+        while True:
+            self.befehle_lesen()
+
+            # alle seit dem letzten Durchlauf faelligen Messwerte erzeugen
+            t_jetzt = time.monotonic() - self.t0
+            if t_jetzt >= self.t_naechster:
+                n_faellig = int((t_jetzt - self.t_naechster)*self.abtastrate) + 1
+                zeiten = self.t_naechster + np.arange(n_faellig)/self.abtastrate
+                self.t_naechster += n_faellig/self.abtastrate
+                druecke = self.druecke_erzeugen(zeiten)
+                rohwerte = np.interp(druecke, self.kalibrierung.tabelle, np.arange(Kalibrierung.ROHWERT_MAX))
+                rohwerte += self.rng.normal(0, self.rauschen/np.sqrt(self.dezimierung), n_faellig)
+                rohwerte = np.clip(np.round(rohwerte), 0, Kalibrierung.ROHWERT_MAX-1)
+
+                for i in range(0, n_faellig, Pico_Protokoll.MAX_WERTE):
+                    paket = Pico_Protokoll.paket_erzeugen(self.seq, rohwerte[i:i+Pico_Protokoll.MAX_WERTE],
+                                                          (zeiten[i:i+Pico_Protokoll.MAX_WERTE]*1e6).astype(np.int64))
+                    try:
+                        os.write(self.fd, paket)
+                    except (BlockingIOError, OSError):
+                        pass   # niemand liest (App nicht verbunden) -> Paket geht verloren
+                    self.seq = (self.seq + 1) & 0xFFFF
+
+                self.udp.sendto(struct.pack('<dd', t_jetzt, self.modell.durchmesser), self.udp_ziel)
+
+            # Auf Befehle warten statt zu schlafen, damit das Ventil wie in der Firmware sofort geschaltet wird
+            select.select([self.fd], [], [], min(SENDEINTERVALL, Pico_Protokoll.MAX_WERTE/self.abtastrate))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Virtueller Pi Pico an einer Pseudo-Schnittstelle.')
+    parser.add_argument('--rate', type=int, default=100, help='Abtastrate in Hz (kann von der App per r<n> geaendert werden)')
+    parser.add_argument('--druckdatei', default=None, help='aufgezeichnete Druck.txt, die wiedergegeben werden soll')
+    parser.add_argument('--rauschen', type=float, default=20, help='ADC-Rauschen in Rohwerten')
+    parser.add_argument('--udp-port', type=int, default=UDP_PORT, help='UDP-Port fuer den Durchmesser (Virtuelle_Kamera)')
+    args = parser.parse_args()
+
+    pico = Virtueller_Pico(args.rate, args.druckdatei, args.rauschen, args.udp_port)
+    try:
+        pico.starten()
+    except KeyboardInterrupt:
+        print('Abbruch durch User')
+
+
+if __name__ == '__main__':
+    main()
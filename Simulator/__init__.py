@@ -0,0 +1,15 @@
+"""
+Simulierte Hardware, um die App ohne Pruefstand (Pi Pico, Webcam) betreiben und unter Last testen zu koennen.
+
+- Virtueller_Pico.py:   stellt einen Pi Pico an einer Pseudo-Schnittstelle (pty) bereit, der das binaere
+                        Paketprotokoll spricht und die Befehle 'o'/'c'/'r<n>'/'d<n>' versteht
+- Virtuelle_Kamera.py:  Ersatz fuer cv2.VideoCapture, spielt Videodateien ab oder zeichnet einen Ballon samt Aruco-Marker
+- Ballonmodell.py:      einfaches physikalisches Modell des Aufblasens/Entlueftens
+
+Beispiel (Linux):
+    python -m Simulator.Virtueller_Pico --rate 1000
+    -> ausgegebenen Port (z.B. /dev/pts/5) in values.ini unter 'port' und 'sim' unter 'videoquelle' eintragen
+"""
+
+
+UDP_PORT = 50007            # Port, ueber den der Virtuelle_Pico den Durchmesser an die Virtuelle_Kamera sendet
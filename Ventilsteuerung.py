@@ -0,0 +1,426 @@
+"""
+Steuerung des Magnetventils (Aufblasen und Entlueften je Zyklus), unabhaengig von Kamera und GUI.
+
+Worker_Druck und Worker_Bildverarbeitung legen den jeweils neuesten Druck bzw. Durchmesser mit dem Zeitpunkt der
+Messung in einem Ringpuffer.Letzter_Wert ab. Worker_Ventil ruft in einem eigenen Thread im festen Takt
+Ventilsteuerung.schritt auf, die GUI liest nur noch den Zustand (Zyklus fuer Durchmesser.txt).
+
+Ablauf je Zyklus:
+- 'aufblasen' (Ventil offen), bis 'anzahl_ueber_soll' neue Durchmessermessungen hintereinander den Solldurchmesser
+  des Zyklus erreichen oder (mit 'vorhersage') der vorhergesagte Durchmesser 'anzahl_prognose' mal hintereinander
+- 'entlueften' (Ventil zu), bis der Druck unter 'druck_entlueftet' faellt
+- 'warten' fuer 'verzoegerung_aufblasen' Sekunden, danach naechster Zyklus bzw. 'fertig' nach dem letzten Zyklus
+Vor dem ersten (tarierten) Druckwert ('tarieren') bleibt das Ventil geschlossen.
+
+Watchdog: Ist beim Aufblasen der letzte Druckwert oder das zuletzt verarbeitete Kamerabild aelter als 'timeout' Sekunden
+(z.B. Kamera, Bildverarbeitung oder Pi Pico ausgefallen), wird das Ventil sofort geschlossen und erst wieder geoeffnet,
+wenn beide wieder aktuell sind. Das Kamerabild wird dafuer unabhaengig vom Ergebnis gemeldet (Lebenszeichen), denn
+einen Durchmesser gibt es erst, wenn der Ballon gross genug ist, um erkannt zu werden. Solange im aktuellen Zyklus
+noch kein Ballon erkannt wurde, wird daher weiter aufgeblasen. Geht ein bereits erkannter Ballon verloren (kein
+Durchmesser fuer 'timeout' Sekunden trotz aktueller Kamerabilder), schliesst der Watchdog das Ventil ebenfalls.
+
+Jede Entscheidung wird mit Zeitpunkt, Verspaetung des Taktes, den verwendeten Messwerten und deren Alter
+in 'protokoll' festgehalten (Ventil.txt im Ordner der Messung) und geloggt.
+
+Vorhersage: Durchmesser und Druck steigen beim Aufblasen weiter, bis das Ventil tatsaechlich geschlossen ist.
+Daher werden dD/dt und dp/dt per linearer Regression ueber die letzten 'fenster_steigung' Sekunden geschaetzt und der
+Durchmesser fuer den Zeitpunkt jetzt + Vorhalt vorhergesagt (ausgehend vom Zeitpunkt der Aufnahme, das Alter des Kamerabildes
+ist also enthalten). Der Vorhalt ist die gemessene Latenz der Ventilbefehle bis zum Schalten ('aktorlatenz') plus ein
+Nachlauf, der aus dem Ueberschwingen der bisherigen Zyklen gelernt wird (Ballon waechst nach dem Schalten noch etwas).
+Je Zyklus werden Spitze, Ueberschwingen und Vorhersage geloggt (zyklen_statistik).
+
+Die Befehle an das Ventil werden ueber Ventilbefehle quittiert gesendet (Befehlsnummer, Zeitpunkt des Schaltens auf dem
+Pico, Wiederholung bei fehlender Quittung). Daraus ergibt sich je Befehl die Latenz von der Entscheidung bis zum
+Schalten (Ventilbefehle.txt und Histogramm im Log), die das Ueberschwingen ueber den Solldurchmesser bestimmt.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+import numpy as np
+import Pico_Protokoll
+
+
+ZUSTAENDE = ('tarieren', 'aufblasen', 'entlueften', 'warten', 'fertig')
+
+PROTOKOLL_SPALTEN = ('Zeitpunkt', 'Zustand', 'Zyklus', 'Befehl', 'Druck / mbar', 'Alter Druck / ms',
+                     'Durchmesser / mm', 'Alter Durchmesser / ms', 'dD/dt / (mm/s)', 'dp/dt / (mbar/s)', 'Prognose / mm',
+                     'Vorhalt / ms', 'Verspaetung Takt / ms', 'Grund')
+
+BEFEHL_SPALTEN = ('Nr', 'Befehl', 'Zeitpunkt Entscheidung', 'Latenz geschaltet / ms', 'Latenz quittiert / ms', 'Wiederholungen')
+
+# Klassengrenzen des Latenzhistogramms in ms (die unterste Klasse faengt auch Unsicherheiten der Uhrsynchronisation auf)
+HISTOGRAMM_GRENZEN = (-np.inf, 1, 2, 5, 10, 20, 50, 100, 200, 500, np.inf)
+
+
+class Ventilbefehle:
+    """
+    Quittierte Ventilbefehle (siehe Pico_Protokoll.befehl_erzeugen).
+    Jeder Befehl erhaelt eine fortlaufende Nummer. Bleibt die Quittung laenger als 'timeout' Sekunden aus, wird der
+    Befehl wiederholt, solange er der neueste ist (die Befehle setzen einen absoluten Zustand, Wiederholen ist unschaedlich).
+    senden() und pruefen() laufen im Thread der Ventilsteuerung, quittung() im Worker_Druck.
+
+    Latenzen je Befehl (ab der Entscheidung in senden()):
+    - geschaltet: Zeitpunkt des Schaltens auf dem Pico, per Uhrsynchronisation auf die Uhr des PCs abgebildet
+      (enthaelt dadurch zusaetzlich die minimale Uebertragungsdauer Pico -> PC)
+    - quittiert: Empfang der Quittung im Worker_Druck
+    """
+
+    def __init__(self, schreiben, timeout=0.2, max_wiederholungen=5):
+        self.schreiben = schreiben   # Funktion, die Bytes an den Pi Pico sendet (z.B. ser.write)
+        self.timeout = timeout   # s
+        self.max_wiederholungen = max_wiederholungen   # danach wird ein Fehler geloggt (es wird trotzdem weiter wiederholt)
+        self.sperre = threading.Lock()
+        self.logger = logging.getLogger('./')
+
+        self.nr = 0
+        self.befehle = {}   # Nr -> [Nr, Befehl, Zeitpunkt Entscheidung, geschaltet, quittiert, Wiederholungen] (siehe BEFEHL_SPALTEN)
+        self.offen = None   # (Nr, Befehl, Zeitpunkt des letzten Versuchs) des neuesten, noch nicht quittierten Befehls
+
+        # Zaehler fuer Diagnosezwecke
+        self.wiederholungen = 0
+        self.doppelte_quittungen = 0
+
+
+    def senden(self, befehl):
+        """
+        Sendet b'o' bzw. b'c' mit neuer Befehlsnummer und gibt diese zurueck.
+        """
+        t = time.time()
+        with self.sperre:
+            self.nr += 1
+            nr = self.nr
+            self.befehle[nr] = [nr, befehl.decode(), t, np.nan, np.nan, 0]
+            self.offen = (nr, befehl, t)
+        self.schreiben(Pico_Protokoll.befehl_erzeugen(befehl, nr))
+        return nr
+
+
+    def quittung(self, nr, t_geschaltet, t_quittiert):
+        """
+        Quittung des Pico (Befehlsnummer modulo 65536, Zeitpunkte in s seit Epoche, t_geschaltet ggf. NaN).
+        """
+        with self.sperre:
+            # Die Befehlsnummer wird im Protokoll mit 16 Bit uebertragen
+            nr = self.nr - ((self.nr - nr) & 0xFFFF)
+            eintrag = self.befehle.get(nr)
+            if eintrag is None or not np.isnan(eintrag[4]):
+                self.doppelte_quittungen += 1   # z.B. Quittung eines wiederholten Befehls
+                return
+            eintrag[3] = t_geschaltet - eintrag[2]
+            eintrag[4] = t_quittiert - eintrag[2]
+            if self.offen is not None and self.offen[0] == nr:
+                self.offen = None
+
+
+    def pruefen(self, t):
+        """
+        Wiederholt den neuesten Befehl, falls seine Quittung laenger als 'timeout' ausbleibt. Gibt zurueck, ob er noch offen ist.
+        """
+        with self.sperre:
+            if self.offen is None:
+                return False
+            nr, befehl, t_versuch = self.offen
+            if t - t_versuch < self.timeout:
+                return True
+            self.offen = (nr, befehl, t)
+            eintrag = self.befehle[nr]
+            eintrag[5] += 1
+            wiederholungen = eintrag[5]
+            self.wiederholungen += 1
+
+        if wiederholungen == 1:
+            self.logger.warning(f'Ventilbefehl {befehl.decode()} (Nr. {nr}) nach {self.timeout*1000:.0f} ms nicht quittiert, wird wiederholt.')
+        elif wiederholungen == self.max_wiederholungen:
+            self.logger.error(f'Ventilbefehl {befehl.decode()} (Nr. {nr}) nach {wiederholungen} Wiederholungen nicht quittiert, '
+                              f'Verbindung zum Pi Pico pruefen!')
+        self.schreiben(Pico_Protokoll.befehl_erzeugen(befehl, nr))
+        return True
+
+
+    def latenz(self, befehl=b'c', anzahl=5):
+        """
+        Median der Latenz Entscheidung -> geschaltet der letzten 'anzahl' quittierten Befehle 'befehl' in s (None: noch keine).
+        """
+        with self.sperre:
+            latenzen = [eintrag[3] for eintrag in self.befehle.values() if eintrag[1] == befehl.decode() and not np.isnan(eintrag[3])]
+        return float(np.median(latenzen[-anzahl:])) if latenzen else None
+
+
+    def spalten(self):
+        with self.sperre:
+            return [list(eintrag) for eintrag in self.befehle.values()]
+
+
+    def histogramm(self):
+        """
+        Latenzen Entscheidung -> geschaltet je Klasse (HISTOGRAMM_GRENZEN) als Text fuer das Log.
+        """
+        latenzen = np.array([eintrag[3] for eintrag in self.spalten()])*1000
+        gueltig = latenzen[~np.isnan(latenzen)]
+        if len(gueltig) == 0:
+            return f'{len(latenzen)} Befehle, keine quittiert'
+        anzahl, _ = np.histogram(gueltig, HISTOGRAMM_GRENZEN)
+        klassen = ', '.join(f'<{b:g} ms: {n}' if np.isinf(a) else f'>{a:g} ms: {n}' if np.isinf(b) else f'{a:g}-{b:g} ms: {n}'
+                            for a, b, n in zip(HISTOGRAMM_GRENZEN[:-1], HISTOGRAMM_GRENZEN[1:], anzahl) if n > 0)
+        return (f'{len(gueltig)} von {len(latenzen)} Befehlen quittiert, Median {np.median(gueltig):.1f} ms, '
+                f'max. {gueltig.max():.1f} ms, {self.wiederholungen} Wiederholungen [{klassen}]')
+
+
+class Ventilsteuerung:
+    def __init__(self, zyklen_durchmesser, ventil, verzoegerung_aufblasen=2, druck_entlueftet=5, anzahl_ueber_soll=4, timeout=0.5,
+                 vorhersage=True, aktorlatenz=None, vorhalt_standard=0.05, anzahl_prognose=2, fenster_steigung=0.4, lernrate=0.5):
+        self.zyklen_durchmesser = zyklen_durchmesser
+        self.ventil = ventil   # Funktion, die einen Befehl an den Pi Pico sendet (b'o': oeffnen, b'c': schliessen)
+        self.verzoegerung_aufblasen = verzoegerung_aufblasen   # s
+        self.druck_entlueftet = druck_entlueftet   # mbar
+        self.anzahl_ueber_soll = anzahl_ueber_soll
+        self.timeout = timeout   # s
+        self.logger = logging.getLogger('./')
+
+        # Vorhersage: 'aktorlatenz' ist eine Funktion, die die gemessene Latenz bis zum Schalten in s liefert
+        # (z.B. Ventilbefehle.latenz, None: noch nicht gemessen -> 'vorhalt_standard')
+        self.vorhersage = vorhersage
+        self.aktorlatenz = aktorlatenz
+        self.vorhalt_standard = vorhalt_standard   # s
+        self.anzahl_prognose = anzahl_prognose
+        self.fenster_steigung = fenster_steigung   # s
+        self.lernrate = lernrate
+        self.nachlauf = 0.0   # s, aus dem Ueberschwingen der bisherigen Zyklen gelernt
+
+        self.zustand = 'tarieren'
+        self.zyklus = 0
+        self.ventil_offen = False
+        self.watchdog = False
+        self.ballon_erkannt = None   # im aktuellen Zyklus: None (noch nicht gemeldet), False (nicht erkannt), True (erkannt)
+        self.ueber_soll = 0
+        self.prognose_ueber_soll = 0
+        self.nummer_druck = 0
+        self.nummer_durchmesser = 0
+        self.t_entlueftet = None
+
+        # Neue Messwerte (Zeitpunkt, Wert) fuer die Steigungen
+        self.verlauf_druck = deque(maxlen=256)
+        self.verlauf_durchmesser = deque(maxlen=256)
+
+        # Zeitpunkt, Messwerte, Vorhersage und Verspaetung des aktuellen Taktes (fuer das Protokoll)
+        self.t = 0
+        self.druck = None
+        self.durchmesser = None
+        self.steigung_druck = np.nan        # mbar/s
+        self.steigung_durchmesser = np.nan  # mm/s
+        self.prognose = np.nan              # mm
+        self.vorhalt = np.nan               # s
+        self.verspaetung = 0
+
+        # Entscheidungen (siehe PROTOKOLL_SPALTEN), Statistik je Zyklus und Zaehler fuer Diagnosezwecke
+        self.protokoll = []
+        self.zyklen_statistik = []
+        self.aktueller_zyklus = None
+        self.schritte = 0
+        self.verspaetung_max = 0
+        self.watchdog_ausloesungen = 0
+
+
+    def zyklus_ausgabe(self):
+        """
+        Zyklus fuer Durchmesser.txt: waehrend Aufblasen und Entlueften der aktuelle Zyklus, danach -1.
+        """
+        return self.zyklus if self.zustand in ('tarieren', 'aufblasen', 'entlueften') else -1
+
+
+    @staticmethod
+    def steigung(verlauf, t_min):
+        """
+        Lineare Regression ueber die Werte ab t_min: (Steigung pro s, Wert der Geraden und Zeitpunkt beim letzten Wert)
+        oder None bei weniger als 3 Werten.
+        """
+        werte = np.array([wert for wert in verlauf if wert[0] >= t_min])
+        if len(werte) < 3:
+            return None
+        t_letzter = werte[-1, 0]
+        steigung, wert = np.polyfit(werte[:, 0] - t_letzter, werte[:, 1], 1)
+        return steigung, wert, t_letzter
+
+
+    def vorhersagen(self, t):
+        """
+        Schaetzt dD/dt und dp/dt und sagt den Durchmesser fuer den Zeitpunkt t + Vorhalt voraus.
+        """
+        aktorlatenz = self.aktorlatenz() if self.aktorlatenz is not None else None
+        self.vorhalt = max(0.0, (self.vorhalt_standard if aktorlatenz is None else aktorlatenz) + self.nachlauf)
+
+        ergebnis = self.steigung(self.verlauf_druck, t - self.fenster_steigung)
+        self.steigung_druck = ergebnis[0] if ergebnis is not None else np.nan
+        ergebnis = self.steigung(self.verlauf_durchmesser, t - self.fenster_steigung)
+        if ergebnis is None:
+            self.steigung_durchmesser = self.prognose = np.nan
+            return
+        self.steigung_durchmesser, wert, t_letzter = ergebnis
+        self.prognose = wert + self.steigung_durchmesser*(t + self.vorhalt - t_letzter)
+
+
+    def schritt(self, t, druck, durchmesser, verspaetung=0, bild=None):
+        """
+        Ein Takt der Steuerung. t: jetzt in s seit Epoche, druck und durchmesser: Ringpuffer.Letzter_Wert.lesen(),
+        verspaetung: Abweichung vom geplanten Zeitpunkt des Taktes in s, bild: Ringpuffer.Letzter_Wert.lesen() des zuletzt
+        verarbeiteten Kamerabildes (auch ohne erkannten Ballon, None: wie durchmesser).
+        """
+        self.schritte += 1
+        self.verspaetung_max = max(self.verspaetung_max, verspaetung)
+        self.t, self.druck, self.durchmesser, self.verspaetung = t, druck, durchmesser, verspaetung
+        alter_druck = t - druck[0] if druck is not None else np.inf
+        alter_durchmesser = t - durchmesser[0] if durchmesser is not None else np.inf
+        alter_bild = t - bild[0] if bild is not None else alter_durchmesser
+
+        # Neue Messwerte sammeln (die Steuerung laeuft schneller als Kamera und Druckmessung)
+        neuer_druck = druck is not None and druck[2] != self.nummer_druck
+        if neuer_druck:
+            self.nummer_druck = druck[2]
+            self.verlauf_druck.append(druck[:2])
+        neuer_durchmesser = durchmesser is not None and durchmesser[2] != self.nummer_durchmesser
+        if neuer_durchmesser:
+            self.nummer_durchmesser = durchmesser[2]
+            self.verlauf_durchmesser.append(durchmesser[:2])
+
+        if self.zustand == 'tarieren':
+            # Worker_Druck gibt die Druckwerte erst nach der Tarierung weiter
+            if druck is not None:
+                self.ballon_erkannt = None
+                self.entscheiden('aufblasen', 'Nullpunkt tariert, Zyklus 0 starten', b'o')
+
+        elif self.zustand == 'aufblasen':
+            if neuer_durchmesser:
+                self.ballon_erkannt = True
+
+            if alter_druck > self.timeout or alter_bild > self.timeout:
+                grund = f'Watchdog: keine aktuellen Messwerte (Timeout {self.timeout*1000:.0f} ms)'
+            elif self.ballon_erkannt and alter_durchmesser > self.timeout:
+                grund = f'Watchdog: Ballon nicht mehr erkannt (Timeout {self.timeout*1000:.0f} ms)'
+            else:
+                grund = None
+            if grund is not None:
+                if not self.watchdog:
+                    self.watchdog = True
+                    self.watchdog_ausloesungen += 1
+                    self.entscheiden('aufblasen', grund, b'c', logging.WARNING)
+                return
+            if self.watchdog:
+                self.watchdog = False
+                self.entscheiden('aufblasen', 'Watchdog: Messwerte wieder aktuell', b'o')
+
+            # Ein flacher Ballon wird noch nicht erkannt: ohne Durchmesser weiter aufblasen
+            if not self.ballon_erkannt:
+                if self.ballon_erkannt is None:
+                    self.ballon_erkannt = False
+                    self.entscheiden('aufblasen', 'Noch kein Ballon erkannt, weiter aufblasen')
+                return
+
+            soll = self.zyklen_durchmesser[self.zyklus]
+            if neuer_durchmesser:
+                self.vorhersagen(t)
+                self.ueber_soll = self.ueber_soll + 1 if durchmesser[1] >= soll else 0
+                self.prognose_ueber_soll = self.prognose_ueber_soll + 1 if self.prognose >= soll else 0
+
+            if self.ueber_soll >= self.anzahl_ueber_soll:
+                grund = f'Solldurchmesser {soll} mm {self.anzahl_ueber_soll}x hintereinander erreicht'
+            elif self.vorhersage and self.prognose_ueber_soll >= self.anzahl_prognose:
+                grund = f'Prognose {self.prognose:.1f} mm in {self.vorhalt*1000:.0f} ms erreicht Solldurchmesser {soll} mm'
+            else:
+                return
+            self.ueber_soll = 0
+            self.prognose_ueber_soll = 0
+            self.aktueller_zyklus = {'zyklus': self.zyklus, 'soll': soll, 't_zu': t, 'durchmesser_zu': durchmesser[1],
+                                     'prognose': self.prognose, 'steigung_durchmesser': self.steigung_durchmesser,
+                                     'steigung_druck': self.steigung_druck, 'vorhalt': self.vorhalt, 'nachlauf': self.nachlauf,
+                                     'durchmesser': [durchmesser[:2]], 'druck_max': druck[1]}
+            self.entscheiden('entlueften', grund, b'c')
+
+        elif self.zustand == 'entlueften':
+            # Spitze des Durchmessers und des Drucks nach dem Schliessen fuer die Statistik erfassen
+            if self.aktueller_zyklus is not None:
+                if neuer_durchmesser:
+                    self.aktueller_zyklus['durchmesser'].append(durchmesser[:2])
+                if neuer_druck:
+                    self.aktueller_zyklus['druck_max'] = max(self.aktueller_zyklus['druck_max'], druck[1])
+
+            if alter_druck <= self.timeout and druck[1] < self.druck_entlueftet:
+                self.t_entlueftet = t
+                self.entscheiden('warten', f'Druck unter {self.druck_entlueftet} mbar')
+                self.zyklus_auswerten()
+
+        elif self.zustand == 'warten':
+            if t - self.t_entlueftet >= self.verzoegerung_aufblasen and alter_druck <= self.timeout and druck[1] < self.druck_entlueftet:
+                if self.zyklus < len(self.zyklen_durchmesser)-1:
+                    self.zyklus += 1
+                    self.ballon_erkannt = None
+                    self.entscheiden('aufblasen', f'Zyklus {self.zyklus} starten', b'o')
+                else:
+                    self.entscheiden('fertig', 'Alle Zyklen durchlaufen')
+
+
+    def zyklus_auswerten(self):
+        """
+        Spitze und Ueberschwingen des abgeschlossenen Zyklus loggen und den Nachlauf nachfuehren.
+        """
+        statistik = self.aktueller_zyklus
+        self.aktueller_zyklus = None
+        if statistik is None:
+            return
+
+        # Spitze aus dem gleitenden Mittel ueber 3 Messungen (das Maximum der Einzelwerte wuerde durch das Rauschen ueberschaetzt)
+        werte = np.array(statistik.pop('durchmesser'))
+        geglaettet = np.convolve(werte[:, 1], np.ones(3)/3, 'valid') if len(werte) >= 3 else werte[:, 1]
+        i_max = int(np.argmax(geglaettet))
+        statistik['spitze'] = geglaettet[i_max]
+        statistik['t_spitze'] = werte[i_max + (1 if len(werte) >= 3 else 0), 0] - statistik['t_zu']
+        statistik['ueberschwingen'] = statistik['spitze'] - statistik['soll']
+        self.zyklen_statistik.append(statistik)
+
+        self.logger.info(f'Ventilsteuerung Zyklus {statistik["zyklus"]}: Soll {statistik["soll"]} mm, Spitze {statistik["spitze"]:.1f} mm '
+                         f'(Ueberschwingen {statistik["ueberschwingen"]:+.1f} mm), aufgenommen {statistik["t_spitze"]*1000:+.0f} ms relativ zur Entscheidung; '
+                         f'Entscheidung bei {statistik["durchmesser_zu"]:.1f} mm, Prognose {statistik["prognose"]:.1f} mm, '
+                         f'dD/dt {statistik["steigung_durchmesser"]:.1f} mm/s, dp/dt {statistik["steigung_druck"]:.1f} mbar/s, '
+                         f'Vorhalt {statistik["vorhalt"]*1000:.0f} ms (davon Nachlauf {statistik["nachlauf"]*1000:.0f} ms), '
+                         f'max. Druck {statistik["druck_max"]:.1f} mbar')
+
+        # Nachlauf so nachfuehren, dass die Spitze im naechsten Zyklus auf dem Solldurchmesser liegt
+        if self.vorhersage and statistik['steigung_durchmesser'] > 0:
+            self.nachlauf = float(np.clip(self.nachlauf + self.lernrate*statistik['ueberschwingen']/statistik['steigung_durchmesser'],
+                                          -0.5, 1.0))
+
+
+    def zusammenfassung(self):
+        if not self.zyklen_statistik:
+            return 'keine abgeschlossenen Zyklen'
+        ueberschwingen = np.array([statistik['ueberschwingen'] for statistik in self.zyklen_statistik])
+        return (f'{len(ueberschwingen)} Zyklen, Ueberschwingen Mittel {ueberschwingen.mean():+.2f} mm, '
+                f'max. {ueberschwingen[np.argmax(np.abs(ueberschwingen))]:+.2f} mm, Nachlauf zuletzt {self.nachlauf*1000:.0f} ms')
+
+
+    def beenden(self, t):
+        """
+        Schliesst das Ventil am Ende der Messung.
+        """
+        self.t, self.verspaetung = t, 0
+        if self.ventil_offen:
+            self.entscheiden(self.zustand, 'Messung beendet', b'c')
+
+
+    def entscheiden(self, zustand, grund, befehl=None, level=logging.INFO):
+        if befehl is not None:
+            self.ventil(befehl)
+            self.ventil_offen = (befehl == b'o')
+        self.zustand = zustand
+
+        p, alter_p = (self.druck[1], (self.t-self.druck[0])*1000) if self.druck is not None else (np.nan, np.nan)
+        d, alter_d = (self.durchmesser[1], (self.t-self.durchmesser[0])*1000) if self.durchmesser is not None else (np.nan, np.nan)
+        befehl = befehl.decode() if befehl is not None else ''
+        self.protokoll.append((self.t, zustand, self.zyklus, befehl, p, alter_p, d, alter_d, self.steigung_durchmesser,
+                               self.steigung_druck, self.prognose, self.vorhalt*1000, self.verspaetung*1000, grund))
+
+        aktion = {'o': 'Ventil oeffnen, ', 'c': 'Ventil schliessen, ', '': ''}[befehl]
+        self.logger.log(level, f'Ventilsteuerung: {grund} -> {aktion}{zustand} (Druck {p:.1f} mbar, {alter_p:.0f} ms alt, '
+                               f'dp/dt {self.steigung_druck:.1f} mbar/s; Durchmesser {d:.1f} mm, {alter_d:.0f} ms alt, '
+                               f'dD/dt {self.steigung_durchmesser:.1f} mm/s; Takt {self.verspaetung*1000:.1f} ms verspaetet)')
@@ -0,0 +1,115 @@
+"""
+Aufzeichnung des Kamerabildes waehrend einer Messung (Video.avi und Video_Zeitstempel.txt im Ordner der Messung).
+
+Modi (values.ini, 'videoaufzeichnung'):
+- 'aus':  keine Aufzeichnung
+- 'roh':  jedes aufgenommene Kamerabild (im Worker_Video, also auch Bilder, die nicht verarbeitet wurden)
+- 'roi':  jedes verarbeitete Kamerabild, ausserhalb des Suchfensters der Bildverarbeitung geschwaerzt
+          (gleiche Bildgroesse und Koordinaten wie das Kamerabild, die schwarzen Flaechen kosten kaum Speicherplatz)
+
+Die Bilder werden in einem eigenen Thread (MJPG) geschrieben. Die Warteschlange dorthin ist begrenzt:
+Kommt die Festplatte nicht hinterher, werden Bilder verworfen und gezaehlt, Aufnahme und Bildverarbeitung warten nie.
+Zu jedem geschriebenen Bild werden Bildnummer und Zeitpunkt der Aufnahme in Video_Zeitstempel.txt gespeichert
+(immer mit Mikrosekunden, damit das Format fuer pandas einheitlich ist).
+"""
+
+import logging
+import queue
+import threading
+from datetime import datetime
+import cv2
+import numpy as np
+
+
+MODI = ('aus', 'roh', 'roi')
+
+
+class Videoaufzeichnung:
+    def __init__(self, outdir, modus='roh', fps=30, max_warteschlange=30):
+        if modus not in MODI[1:]:
+            raise ValueError(f'Unbekannter Modus {modus} fuer die Videoaufzeichnung, moeglich sind {MODI[1:]}')
+        self.modus = modus
+        self.outfile_video = outdir + 'Video.avi'
+        self.outfile_zeitstempel = outdir + 'Video_Zeitstempel.txt'
+        self.fps = fps
+        self.warteschlange = queue.Queue(maxsize=max_warteschlange)
+        self.logger = logging.getLogger('./')
+
+        # Zaehler fuer Diagnosezwecke: verworfen (Warteschlange voll, aus den aufnehmenden Threads, daher mit Lock),
+        # nicht_geschrieben (nur im Schreib-Thread, nach einem Fehler beim Oeffnen von Video.avi)
+        self.angenommen = 0
+        self.geschrieben = 0
+        self.verworfen = 0
+        self.nicht_geschrieben = 0
+        self.fehler_oeffnen = False
+        self.lock = threading.Lock()
+
+        self.thread = threading.Thread(target=self.schreiben, name='Videoaufzeichnung', daemon=True)
+        self.thread.start()
+
+
+    def aufnehmen(self, kamerabild, fenster=None):
+        """
+        Uebergibt ein Kamerabild (Bildverarbeitung.Kamerabild) an den Schreib-Thread, ohne zu warten.
+        fenster: Suchfenster (x0, y0, x1, y1) fuer den Modus 'roi'. Gibt zurueck, ob das Bild angenommen wurde.
+        """
+        try:
+            self.warteschlange.put_nowait((kamerabild, fenster))
+        except queue.Full:
+            with self.lock:
+                self.verworfen += 1
+                erstes = self.verworfen == 1
+            if erstes:
+                self.logger.warning('Videoaufzeichnung: Festplatte zu langsam, es werden Bilder verworfen.')
+            return False
+        with self.lock:
+            self.angenommen += 1
+        return True
+
+
+    def beenden(self):
+        """
+        Schreibt die noch wartenden Bilder und schliesst die Dateien.
+        """
+        self.warteschlange.put(None)
+        self.thread.join()
+
+
+    def schreiben(self):
+        writer = None
+        with open(self.outfile_zeitstempel, 'w', encoding='utf-8') as f:
+            f.write('Videobild;Bildnummer;Zeitpunkt Aufnahme\n')
+            while True:
+                eintrag = self.warteschlange.get()
+                if eintrag is None:
+                    break
+                if self.fehler_oeffnen:
+                    # Nach einem Fehler die Warteschlange weiter leeren, damit beenden() nicht haengt
+                    self.nicht_geschrieben += 1
+                    continue
+                kamerabild, fenster = eintrag
+                bild = kamerabild.bild
+
+                if self.modus == 'roi' and fenster is not None:
+                    x0, y0, x1, y1 = fenster
+                    roi = np.zeros_like(bild)
+                    roi[y0:y1, x0:x1] = bild[y0:y1, x0:x1]
+                    bild = roi
+
+                if writer is None:
+                    # Bildgroesse erst mit dem ersten Bild bekannt
+                    h, w = bild.shape[:2]
+                    writer = cv2.VideoWriter(self.outfile_video, cv2.VideoWriter_fourcc(*'MJPG'), self.fps, (w, h))
+                    if not writer.isOpened():
+                        self.logger.error(f'Videoaufzeichnung: {self.outfile_video} kann nicht geschrieben werden.')
+                        self.fehler_oeffnen = True
+                        self.nicht_geschrieben += 1
+                        continue
+
+                writer.write(bild)
+                zeitpunkt = datetime.fromtimestamp(kamerabild.zeitpunkt).isoformat(sep=' ', timespec='microseconds')
+                f.write(f'{self.geschrieben};{kamerabild.index};{zeitpunkt}\n')
+                self.geschrieben += 1
+
+        if writer is not None:
+            writer.release()
@@ -1,38 +1,230 @@
 import sys
 import select
+import struct
 import _thread
-from machine import ADC, Pin
-from utime import sleep_ms
+from array import array
+from machine import ADC, Pin, Timer
+from utime import sleep_ms, ticks_ms, ticks_us, ticks_add, ticks_diff
 
 # https://stackoverflow.com/questions/74390514/serial-communication-with-raspberry-pi-pico-and-python
 # https://forums.raspberrypi.com/viewtopic.php?t=300474
 # https://docs.micropython.org/en/latest/library/select.html
+# https://docs.micropython.org/en/latest/reference/isr_rules.html
 
 sensor = ADC(26)                 # GP26 -> A0
 mv = Pin(9, Pin.OUT, value=0)    # GP9  -> Magnetventil
 led = Pin(25, Pin.OUT, value=0)  # GP25 -> Onboard LED  (DEBUG)
 
+# Binaeres Paketprotokoll (muss zu Pico_Protokoll.py auf dem Host passen!)
+# Paket: sync u16 | seq u16 | anzahl u16 | werte u16[MAX_WERTE] | zeiten u32[MAX_WERTE] | crc u16   (little endian)
+SYNC = 0x55AA
+MAX_WERTE = 32
+PAKET_GROESSE = 6 + 2*MAX_WERTE + 4*MAX_WERTE + 2
+ZEITEN_OFFSET = 6 + 2*MAX_WERTE
+
+# Quittung eines Ventilbefehls: sync u16 | nr u16 | befehl u8 | ventil u8 | zeit u32 | crc u16   (little endian)
+SYNC_QUITTUNG = 0x55AB
+QUITTUNG_GROESSE = 12
+
+SENDEINTERVALL_MS = 100   # spaetestens nach dieser Zeit wird ein (ggf. nur teilweise gefuelltes) Paket gesendet
+
+# Abtastung: Der Timer liest den ADC mit abtastrate*dezimierung Hz aus,
+# jeweils 'dezimierung' Rohwerte werden gemittelt und als ein Messwert in den Ringpuffer geschrieben.
+# Beide Werte koennen ueber die serielle Schnittstelle geaendert werden (siehe lesen()).
+abtastrate = 100          # Messwerte pro Sekunde (nach der Dezimierung)
+dezimierung = 16          # Anzahl gemittelter ADC-Wandlungen je Messwert
+MAX_ADC_RATE = 20000      # maximale Interruptfrequenz des Timers in Hz
+
+RING_GROESSE = 1024       # Zweierpotenz, damit der Index per Bitmaske umlaufen kann
+ring = array('H', bytes(2*RING_GROESSE))
+ring_zeit = array('L', bytes(4*RING_GROESSE))   # ticks_us() je Messwert
+ring_schreiben = 0        # wird nur im Timer-Interrupt erhoeht
+ZAEHLER_MASKE = 0x3FFFFFFF  # Schreib-/Lesezaehler laufen hier ueber, damit im Interrupt keine langen Integer entstehen
+ring_ueberlaeufe = 0
+
+_summe = 0
+_zaehler = 0
+_fenster_halbe_us = 0      # halbe Dauer eines Mittelungsfensters, der Zeitstempel bezieht sich auf dessen Mitte
+neue_konfiguration = None  # (abtastrate, dezimierung), wird vom Hauptprogramm uebernommen
+
+# Quittungen der Ventilbefehle: werden im Thread lesen() abgelegt und vom Hauptprogramm gesendet,
+# damit nur ein Thread auf die serielle Schnittstelle schreibt (Ringpuffer mit festen Arrays, ohne Sperre)
+Q_GROESSE = 8             # Zweierpotenz
+q_nr = array('H', bytes(2*Q_GROESSE))
+q_befehl = bytearray(Q_GROESSE)
+q_zeit = array('L', bytes(4*Q_GROESSE))
+q_schreiben = 0           # wird nur in lesen() erhoeht
+
+# CRC-16/CCITT (Polynom 0x1021, Startwert 0xFFFF), entspricht binascii.crc_hqx(daten, 0xFFFF) auf dem Host
+_crc_tabelle = []
+for i in range(256):
+    crc = i << 8
+    for _ in range(8):
+        crc = ((crc << 1) ^ 0x1021) if (crc & 0x8000) else (crc << 1)
+    _crc_tabelle.append(crc & 0xFFFF)
+
+
+def crc16(daten):
+    crc = 0xFFFF
+    for b in daten:
+        crc = ((crc << 8) & 0xFFFF) ^ _crc_tabelle[(crc >> 8) ^ b]
+    return crc
+
+
+def abtasten(timer):
+    """
+    Timer-Interrupt: eine ADC-Wandlung aufsummieren und nach 'dezimierung' Wandlungen den Mittelwert ablegen.
+    Im (harten) Interrupt darf kein Speicher angelegt werden, daher nur Integer-Arithmetik auf globalen Variablen.
+    """
+    global _summe, _zaehler, ring_schreiben
+    _summe += sensor.read_u16()   # read analog input (will come as an unsigned 16-bit integer, which ranges from 0-65535 !)
+    _zaehler += 1
+    if _zaehler >= dezimierung:
+        # read_u16() liefert 12-bit-Werte um 4 Bit nach links geschoben,
+        # durch die Mittelung werden die unteren Bits mit zusaetzlicher Aufloesung gefuellt
+        ring[ring_schreiben & (RING_GROESSE-1)] = _summe // _zaehler
+        ring_zeit[ring_schreiben & (RING_GROESSE-1)] = ticks_add(ticks_us(), -_fenster_halbe_us)
+        ring_schreiben = (ring_schreiben + 1) & ZAEHLER_MASKE
+        _summe = 0
+        _zaehler = 0
+
+
+def timer_starten():
+    global _fenster_halbe_us
+    _fenster_halbe_us = (dezimierung - 1) * 500000 // (abtastrate*dezimierung)
+    timer.init(mode=Timer.PERIODIC, freq=abtastrate*dezimierung, callback=abtasten)
+
+
 def lesen():
     """
     Funktion, die in separatem Thread ausgefuehrt werden soll.
+
+    Befehle:
+        'o'          Magnetventil oeffnen
+        'c'          Magnetventil schliessen
+        'o<n>\\n'     Magnetventil oeffnen und mit Befehlsnummer n quittieren
+        'c<n>\\n'     Magnetventil schliessen und mit Befehlsnummer n quittieren
+        'r<n>\\n'     Abtastrate auf n Messwerte pro Sekunde setzen
+        'd<n>\\n'     Dezimierung auf n ADC-Wandlungen je Messwert setzen
+    Das Ventil wird sofort beim Buchstaben geschaltet, die Quittung enthaelt den Zeitpunkt des Schaltens.
     """
+    global neue_konfiguration, q_schreiben
+
     spoll = select.poll()
     spoll.register(sys.stdin, select.POLLIN)
 
+    befehl = ''
+    t_geschaltet = 0
     while True:
         res = spoll.poll()
         ch = res[0][0].read(1)
         if (ch == 'o'):
             led.on()   # debug
             mv.on()
+            t_geschaltet = ticks_us()
+            befehl = ch
         elif (ch == 'c'):
             led.off()  # debug
             mv.off()
+            t_geschaltet = ticks_us()
+            befehl = ch
+        elif (ch == 'r' or ch == 'd'):
+            befehl = ch
+        elif befehl and ch.isdigit():
+            befehl += ch
+        elif befehl and ch == '\n':
+            try:
+                wert = int(befehl[1:])
+            except ValueError:
+                wert = -1
+            if befehl[0] == 'o' or befehl[0] == 'c':
+                if wert >= 0:
+                    i = q_schreiben & (Q_GROESSE-1)
+                    q_nr[i] = wert & 0xFFFF
+                    q_befehl[i] = ord(befehl[0])
+                    q_zeit[i] = t_geschaltet
+                    q_schreiben = (q_schreiben + 1) & ZAEHLER_MASKE
+                befehl = ''
+                continue
+            # eine noch nicht uebernommene Konfiguration als Basis verwenden, damit 'r' und 'd' direkt nacheinander gesendet werden koennen
+            rate, dez = neue_konfiguration or (abtastrate, dezimierung)
+            if befehl[0] == 'r':
+                rate = wert
+            else:
+                dez = wert
+            # Die Konfiguration wird vom Hauptprogramm uebernommen, da der Timer nicht aus diesem Thread umkonfiguriert werden soll
+            if rate > 0 and dez > 0 and rate*dez <= MAX_ADC_RATE:
+                neue_konfiguration = (rate, dez)
+            befehl = ''
+        else:
+            befehl = ''
+
+def quittungen_senden():
+    """
+    Sendet die in lesen() abgelegten Quittungen (nur zwischen zwei Messwertpaketen, also nie mitten in einem Paket).
+    """
+    global q_lesen
+    while q_lesen != q_schreiben:
+        i = q_lesen & (Q_GROESSE-1)
+        struct.pack_into('<HHBBI', quittung, 0, SYNC_QUITTUNG, q_nr[i], q_befehl[i], mv.value(), q_zeit[i])
+        struct.pack_into('<H', quittung, QUITTUNG_GROESSE-2, crc16(quittung_mv[2:QUITTUNG_GROESSE-2]))
+        sys.stdout.buffer.write(quittung)
+        q_lesen = (q_lesen + 1) & ZAEHLER_MASKE
 
 # Funktion, die in separatem Thread neben dem Hauptprogramm gestartet wird
 _thread.start_new_thread(lesen, ())
 
+# Timer fuer die Abtastung starten
+timer = Timer()
+timer_starten()
+
 # Hauptprogramm
+paket = bytearray(PAKET_GROESSE)
+paket_mv = memoryview(paket)
+quittung = bytearray(QUITTUNG_GROESSE)
+quittung_mv = memoryview(quittung)
+q_lesen = 0
+seq = 0
+ring_lesen = 0
+
 while True:
-    print(sensor.read_u16())    # read analog input (will come as an unsigned 16-bit integer, which ranges from 0-65535 !)
-    sleep_ms(100)               # sleep x ms
\ No newline at end of file
+    # ggf. neue Abtastrate/Dezimierung uebernehmen
+    if neue_konfiguration is not None:
+        timer.deinit()
+        abtastrate, dezimierung = neue_konfiguration
+        neue_konfiguration = None
+        _summe = 0
+        _zaehler = 0
+        timer_starten()
+
+    # Paket mit Messwerten aus dem Ringpuffer fuellen, bis es voll ist oder das Sendeintervall abgelaufen ist
+    t0 = ticks_ms()
+    anzahl = 0
+    while anzahl < MAX_WERTE and ticks_diff(ticks_ms(), t0) < SENDEINTERVALL_MS:
+        quittungen_senden()
+        verfuegbar = (ring_schreiben - ring_lesen) & ZAEHLER_MASKE
+        if verfuegbar > RING_GROESSE:
+            # Ringpuffer wurde ueberschrieben: auf die aeltesten noch vorhandenen Werte springen
+            ring_ueberlaeufe += verfuegbar - RING_GROESSE
+            ring_lesen = (ring_schreiben - RING_GROESSE) & ZAEHLER_MASKE
+        elif verfuegbar == 0:
+            sleep_ms(1)
+            continue
+        struct.pack_into('<H', paket, 6+2*anzahl, ring[ring_lesen & (RING_GROESSE-1)])
+        struct.pack_into('<I', paket, ZEITEN_OFFSET+4*anzahl, ring_zeit[ring_lesen & (RING_GROESSE-1)])
+        ring_lesen = (ring_lesen + 1) & ZAEHLER_MASKE
+        anzahl += 1
+
+    if anzahl == 0:
+        continue
+
+    # unbenutzte Eintraege nullen, Kopf und CRC eintragen und Paket binaer senden
+    for i in range(6+2*anzahl, ZEITEN_OFFSET):
+        paket[i] = 0
+    for i in range(ZEITEN_OFFSET+4*anzahl, PAKET_GROESSE-2):
+        paket[i] = 0
+    struct.pack_into('<HHH', paket, 0, SYNC, seq, anzahl)
+    struct.pack_into('<H', paket, PAKET_GROESSE-2, crc16(paket_mv[2:PAKET_GROESSE-2]))
+    sys.stdout.buffer.write(paket)
+
+    seq = (seq + 1) & 0xFFFF